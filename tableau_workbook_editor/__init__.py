@@ -2,14 +2,44 @@
 from __future__ import annotations
 
 from pathlib import Path
-from typing import Optional
+from typing import TYPE_CHECKING, Optional
 
-from .core.twb_model import Workbook
+if TYPE_CHECKING:  # pragma: no cover
+    from .core.aio import AsyncWorkbook
+    from .core.cache import MetadataCache
+    from .core.scanner import WorkbookSummary
+    from .core.twb_model import Workbook
 
-__all__ = ["Workbook", "open_workbook"]
+__all__ = ["AsyncWorkbook", "Workbook", "WorkbookSummary", "open_workbook"]
 
 
-def open_workbook(path: str | Path) -> Workbook:
-    """Open *path* and return a :class:`Workbook` instance."""
+def __getattr__(name: str) -> object:
+    # Imported on first use so that ``import tableau_workbook_editor`` (and the
+    # CLI) does not pay for lxml and the workbook model up front.
+    if name == "Workbook":
+        from .core.twb_model import Workbook
 
-    return Workbook.open(path)
+        return Workbook
+    if name == "WorkbookSummary":
+        from .core.scanner import WorkbookSummary
+
+        return WorkbookSummary
+    if name == "AsyncWorkbook":
+        from .core.aio import AsyncWorkbook
+
+        return AsyncWorkbook
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+def open_workbook(path: str | Path, mode: str = "full", cache: Optional["MetadataCache"] = None) -> Workbook | WorkbookSummary:
+    """Open *path* and return a :class:`Workbook` instance.
+
+    Pass ``mode="scan"`` for a read-only :class:`WorkbookSummary` gathered by
+    streaming the XML, which keeps memory bounded on very large workbooks.
+    Passing a :class:`~tableau_workbook_editor.core.cache.MetadataCache` as
+    *cache* reuses the summary of unchanged workbooks in scan mode.
+    """
+
+    from .core.reader import open_workbook as _open_workbook
+
+    return _open_workbook(Path(path), mode=mode, cache=cache)
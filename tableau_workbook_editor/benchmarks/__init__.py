@@ -0,0 +1 @@
+"""Synthetic workbook generator and performance benchmarks."""
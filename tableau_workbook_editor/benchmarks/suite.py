@@ -0,0 +1,319 @@
+"""Time and memory benchmarks for the core workbook operations.
+
+Run ``python -m tableau_workbook_editor.benchmarks.suite --scale small`` to
+measure the current tree and compare it against ``baselines.json``. Use
+``--update-baseline`` to record new reference numbers.
+"""
+from __future__ import annotations
+
+import argparse
+import ctypes
+import gc
+import json
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import asdict, dataclass
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional
+
+from ..core import twbx_utils
+from ..core.reader import open_workbook
+from . import synthetic
+
+BASELINE_PATH = Path(__file__).with_name("baselines.json")
+#: A case regresses when it is this many times slower (or larger) than its baseline.
+DEFAULT_TOLERANCE = 1.5
+# Times below this many seconds are too noisy to compare.
+_MIN_COMPARABLE_SECONDS = 0.005
+# Memory below this many bytes is within page and allocator noise.
+_MIN_COMPARABLE_BYTES = 1024 * 1024
+_PROC_STATUS = Path("/proc/self/status")
+_CLEAR_REFS = Path("/proc/self/clear_refs")
+
+
+@dataclass
+class BenchmarkContext:
+    twb: Path
+    twbx: Path
+    scratch: Path
+
+
+@dataclass
+class BenchmarkCase:
+    """``setup`` runs untimed before every repetition; only ``run`` is measured."""
+
+    name: str
+    setup: Callable[[BenchmarkContext], Any]
+    run: Callable[[BenchmarkContext, Any], None]
+
+
+@dataclass
+class BenchmarkResult:
+    name: str
+    seconds: float
+    #: Memory the run needed on top of what its setup left allocated.
+    peak_bytes: Optional[int] = None
+
+
+def _load(ctx: BenchmarkContext) -> Any:
+    return open_workbook(ctx.twb)
+
+
+def _renamed(ctx: BenchmarkContext) -> Any:
+    wb = open_workbook(ctx.twb)
+    wb.rename_field(datasource=synthetic.datasource_name(0), old=synthetic.field_name(1), new="Renamed")
+    return wb
+
+
+def _rename_many(ctx: BenchmarkContext, wb: Any) -> None:
+    ds = wb.index.datasource(synthetic.datasource_name(0))
+    captions = [column.get("caption") for column in ds.findall("column")]
+    wb.rename_fields(datasource=synthetic.datasource_name(0), mapping={caption: f"{caption} (new)" for caption in captions[:50]})
+
+
+def _check_layouts(ctx: BenchmarkContext, wb: Any) -> None:
+    for name in wb.list_dashboards():
+        wb.zone_tree(name).check()
+
+
+def _move_zones(ctx: BenchmarkContext, wb: Any) -> None:
+    # The deepest zones of the last dashboard, one move_zone call each.
+    name = wb.list_dashboards()[-1]
+    zone_ids = [zone.get("id") for zone in wb.zone_tree(name)][-200:]
+    for offset, zone_id in enumerate(zone_ids):
+        wb.move_zone(dashboard=name, zone_id=zone_id, x=offset)
+    wb.zone_tree(name).hit_test(600, 400)
+
+
+def _merge_inputs(ctx: BenchmarkContext) -> Any:
+    theirs = open_workbook(ctx.twb)
+    theirs.set_connection(datasource=synthetic.datasource_name(0), server="merged-host")
+    return _renamed(ctx), open_workbook(ctx.twb), theirs
+
+
+CASES: List[BenchmarkCase] = [
+    BenchmarkCase("open_workbook", lambda ctx: None, lambda ctx, _: open_workbook(ctx.twb)),
+    BenchmarkCase("open_workbook_scan", lambda ctx: None, lambda ctx, _: open_workbook(ctx.twb, mode="scan")),
+    BenchmarkCase("save", _renamed, lambda ctx, wb: wb.save(path=ctx.scratch / "saved.twb")),
+    BenchmarkCase("save_splice", _renamed, lambda ctx, wb: wb.save(path=ctx.scratch / "saved.twb", splice=True)),
+    BenchmarkCase(
+        "rename_field",
+        _load,
+        lambda ctx, wb: wb.rename_field(datasource=synthetic.datasource_name(0), old=synthetic.field_name(1), new="Renamed"),
+    ),
+    BenchmarkCase("rename_fields_50", _load, _rename_many),
+    BenchmarkCase("validate", _load, lambda ctx, wb: wb.validate()),
+    BenchmarkCase("diff", _renamed, lambda ctx, wb: wb.diff()),
+    BenchmarkCase("lineage", _load, lambda ctx, wb: wb.lineage.topological_order()),
+    BenchmarkCase(
+        "rewrite_connections",
+        _load,
+        lambda ctx, wb: wb.rewrite_connections(
+            [
+                {"attribute": "server", "pattern": r"^db(\d)\.example\.com$", "replacement": r"pg\1.example.net"},
+                {"attribute": "port", "pattern": "^5432$", "replacement": "6432"},
+            ]
+        ),
+    ),
+    BenchmarkCase("layout_check", _load, _check_layouts),
+    BenchmarkCase("move_zones_200", _load, _move_zones),
+    BenchmarkCase("merge", _merge_inputs, lambda ctx, inputs: inputs[0].merge(inputs[1], inputs[2])),
+    BenchmarkCase("extract_twbx", lambda ctx: None, lambda ctx, _: twbx_utils.extract_twbx(ctx.twbx)),
+    BenchmarkCase(
+        "pack_twbx",
+        lambda ctx: twbx_utils.extract_twbx(ctx.twbx),
+        lambda ctx, package: twbx_utils.pack_twbx(ctx.scratch / "packed.twbx", package),
+    ),
+]
+
+
+#: Startup cases: the cumulative ``python -X importtime`` time of each module.
+IMPORT_CASES: Dict[str, str] = {
+    "import_package": "tableau_workbook_editor",
+    "import_cli": "tableau_workbook_editor.cli",
+}
+
+
+def import_seconds(module: str) -> float:
+    """Return the cumulative time ``python -X importtime`` reports for importing *module*."""
+
+    completed = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"], capture_output=True, text=True, check=True
+    )
+    for line in reversed(completed.stderr.splitlines()):
+        # import time: self [us] | cumulative | imported package
+        fields = [field.strip() for field in line.split("|")]
+        if len(fields) == 3 and fields[2] == module:
+            return int(fields[1]) / 1_000_000
+    raise RuntimeError(f"python -X importtime did not report {module}")
+
+
+def prepare(directory: Path, spec: synthetic.SyntheticSpec) -> BenchmarkContext:
+    scratch = directory / "scratch"
+    scratch.mkdir(parents=True, exist_ok=True)
+    return BenchmarkContext(
+        twb=synthetic.write_workbook(directory / "bench.twb", spec),
+        twbx=synthetic.write_workbook(directory / "bench.twbx", spec),
+        scratch=scratch,
+    )
+
+
+def time_case(case: BenchmarkCase, ctx: BenchmarkContext, repeat: int) -> float:
+    """Return the best wall-clock time of *repeat* runs."""
+
+    best = float("inf")
+    for _ in range(repeat):
+        state = case.setup(ctx)
+        start = time.perf_counter()
+        case.run(ctx, state)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def _proc_memory(field: str) -> int:
+    for line in _PROC_STATUS.read_text().splitlines():
+        key, _, value = line.partition(":")
+        if key == field:
+            return int(value.split()[0]) * 1024
+    raise KeyError(field)
+
+
+def _reset_peak_rss() -> bool:
+    """Reset the process RSS high-water mark (``VmHWM``) to the current RSS; Linux only."""
+
+    try:
+        _CLEAR_REFS.write_text("5")
+    except OSError:
+        return False
+    return True
+
+
+def _release_free_memory() -> None:
+    gc.collect()
+    try:
+        # Hand memory freed during setup back to the OS so that the run's
+        # allocations show up as RSS growth instead of reusing it.
+        ctypes.CDLL(None).malloc_trim(0)
+    except (OSError, AttributeError):  # not glibc
+        pass
+
+
+def _measure_memory(case_name: str, ctx: BenchmarkContext) -> int:
+    # Runs in a fresh worker process. lxml allocates outside Python's
+    # allocator, so on Linux the growth of RSS over the run is measured, with
+    # the high-water mark reset after setup so that opening the workbook does
+    # not hide the run's peak. Elsewhere only Python allocations are traced.
+    case = next(case for case in CASES if case.name == case_name)
+    state = case.setup(ctx)
+    _release_free_memory()
+    if _reset_peak_rss():
+        before = _proc_memory("VmRSS")
+        case.run(ctx, state)
+        return max(_proc_memory("VmHWM") - before, 0)
+    tracemalloc.start()
+    try:
+        case.run(ctx, state)
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+def memory_case(case: BenchmarkCase, ctx: BenchmarkContext) -> int:
+    with ProcessPoolExecutor(max_workers=1) as pool:
+        return pool.submit(_measure_memory, case.name, ctx).result()
+
+
+def run_suite(
+    spec: synthetic.SyntheticSpec,
+    *,
+    repeat: int = 3,
+    measure_memory: bool = True,
+    cases: Optional[List[str]] = None,
+) -> Dict[str, BenchmarkResult]:
+    selected = [case for case in CASES if cases is None or case.name in cases]
+    results: Dict[str, BenchmarkResult] = {}
+    for name, module in IMPORT_CASES.items():
+        if cases is None or name in cases:
+            results[name] = BenchmarkResult(name, min(import_seconds(module) for _ in range(repeat)))
+    if not selected:
+        return results
+    with tempfile.TemporaryDirectory(prefix="tbe-bench-") as tmp:
+        ctx = prepare(Path(tmp), spec)
+        for case in selected:
+            seconds = time_case(case, ctx, repeat)
+            peak = memory_case(case, ctx) if measure_memory else None
+            results[case.name] = BenchmarkResult(case.name, seconds, peak)
+    return results
+
+
+def compare(
+    results: Dict[str, BenchmarkResult],
+    baseline: Dict[str, Dict[str, Any]],
+    tolerance: float = DEFAULT_TOLERANCE,
+) -> List[str]:
+    """Return a description of every result that regressed against *baseline*."""
+
+    regressions: List[str] = []
+    for name, result in results.items():
+        reference = baseline.get(name)
+        if reference is None:
+            continue
+        seconds = reference.get("seconds")
+        if seconds and max(seconds, result.seconds) >= _MIN_COMPARABLE_SECONDS and result.seconds > seconds * tolerance:
+            regressions.append(f"{name}: {result.seconds:.4f}s vs baseline {seconds:.4f}s")
+        peak = reference.get("peak_bytes")
+        if (
+            peak is not None
+            and result.peak_bytes is not None
+            and max(peak, result.peak_bytes) >= _MIN_COMPARABLE_BYTES
+            and result.peak_bytes > peak * tolerance
+        ):
+            regressions.append(f"{name}: peak {result.peak_bytes} bytes vs baseline {peak} bytes")
+    return regressions
+
+
+def load_baselines(path: Path = BASELINE_PATH) -> Dict[str, Dict[str, Dict[str, Any]]]:
+    if not path.exists():
+        return {}
+    return json.loads(path.read_text(encoding="utf-8"))
+
+
+def save_baselines(baselines: Dict[str, Dict[str, Dict[str, Any]]], path: Path = BASELINE_PATH) -> None:
+    path.write_text(json.dumps(baselines, indent=2, sort_keys=True) + "\n", encoding="utf-8")
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--scale", choices=sorted(synthetic.SCALES), default="small")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--case", action="append", dest="cases", help="Run only this case (repeatable)")
+    parser.add_argument("--no-memory", action="store_true", help="Skip the per-case memory measurement")
+    parser.add_argument("--baseline", type=Path, default=BASELINE_PATH)
+    parser.add_argument("--tolerance", type=float, default=DEFAULT_TOLERANCE)
+    parser.add_argument("--update-baseline", action="store_true")
+    args = parser.parse_args(argv)
+
+    results = run_suite(synthetic.SCALES[args.scale], repeat=args.repeat, measure_memory=not args.no_memory, cases=args.cases)
+    for result in results.values():
+        peak = f"{result.peak_bytes / 1024 / 1024:8.1f} MiB" if result.peak_bytes is not None else "       n/a"
+        print(f"{result.name:<20} {result.seconds * 1000:10.2f} ms {peak}")
+
+    baselines = load_baselines(args.baseline)
+    if args.update_baseline:
+        scale = baselines.setdefault(args.scale, {})
+        scale.update({name: {k: v for k, v in asdict(result).items() if k != "name"} for name, result in results.items()})
+        save_baselines(baselines, args.baseline)
+        print(f"Baseline for '{args.scale}' written to {args.baseline}")
+        return 0
+    regressions = compare(results, baselines.get(args.scale, {}), args.tolerance)
+    for regression in regressions:
+        print(f"REGRESSION {regression}")
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":  # pragma: no cover
+    raise SystemExit(main())
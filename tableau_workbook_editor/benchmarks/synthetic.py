@@ -0,0 +1,205 @@
+"""Generate realistic synthetic Tableau workbooks at configurable scale."""
+from __future__ import annotations
+
+import random
+from dataclasses import dataclass, replace
+from pathlib import Path
+from typing import Dict, List
+from zipfile import ZIP_DEFLATED, ZIP_STORED, ZipFile, ZipInfo
+
+from ..core.xml_utils import Element, dump_xml, etree
+
+_CHUNK = 1024 * 1024
+
+
+@dataclass(frozen=True)
+class SyntheticSpec:
+    """Shape of a generated workbook."""
+
+    datasources: int = 2
+    columns: int = 20
+    calculations: int = 10
+    worksheets: int = 10
+    refs_per_worksheet: int = 20
+    dashboards: int = 2
+    zone_depth: int = 3
+    zones_per_container: int = 3
+    parameters: int = 3
+    actions: int = 4
+    extract_bytes: int = 0
+    seed: int = 0
+
+    def scaled(self, **changes: int) -> "SyntheticSpec":
+        return replace(self, **changes)
+
+
+SCALES: Dict[str, SyntheticSpec] = {
+    "tiny": SyntheticSpec(datasources=1, columns=8, calculations=4, worksheets=3, refs_per_worksheet=5, dashboards=1, zone_depth=2, zones_per_container=2),
+    "small": SyntheticSpec(),
+    "medium": SyntheticSpec(
+        datasources=10, columns=100, calculations=100, worksheets=200, refs_per_worksheet=60, dashboards=20, zone_depth=4, actions=100, extract_bytes=16 * _CHUNK
+    ),
+    "large": SyntheticSpec(
+        datasources=40, columns=300, calculations=500, worksheets=600, refs_per_worksheet=150, dashboards=60, zone_depth=5, zones_per_container=4, parameters=50, actions=500, extract_bytes=256 * _CHUNK
+    ),
+}
+
+
+def datasource_name(index: int) -> str:
+    return f"ds{index}"
+
+
+def field_name(index: int) -> str:
+    return f"Field {index}"
+
+
+def calc_name(index: int) -> str:
+    return f"Calc {index}"
+
+
+def worksheet_name(index: int) -> str:
+    return f"Sheet {index}"
+
+
+def _sub(parent: Element, tag: str, **attrs: str) -> Element:
+    element = etree.SubElement(parent, tag)
+    for key, value in attrs.items():
+        element.set(key.rstrip("_").replace("_", "-"), value)
+    return element
+
+
+def _formula(rng: random.Random, spec: SyntheticSpec, index: int) -> str:
+    left = field_name(rng.randrange(spec.columns))
+    right = field_name(rng.randrange(spec.columns))
+    if index and rng.random() < 0.5:
+        # Chain onto an earlier calculation so dependency graphs have depth.
+        return f"[{calc_name(rng.randrange(index))}] + SUM([{left}])"
+    if rng.random() < 0.3:
+        return f"{{FIXED [{left}] : SUM([{right}])}}"
+    if rng.random() < 0.3:
+        return f"IF SUM([{left}]) > 0 THEN SUM([{right}]) / SUM([{left}]) ELSE 0 END"
+    return f"SUM([{left}]) - SUM([{right}])"
+
+
+def _zone_tree(parent: Element, rng: random.Random, spec: SyntheticSpec, counter: List[int], depth: int, box: tuple[int, int, int, int]) -> None:
+    x, y, w, h = box
+    count = spec.zones_per_container
+    horizontal = depth % 2 == 0
+    for child in range(count):
+        counter[0] += 1
+        if horizontal:
+            cw, ch = w // count, h
+            cx, cy = x + child * cw, y
+        else:
+            cw, ch = w, h // count
+            cx, cy = x, y + child * ch
+        geometry = {"x": str(cx), "y": str(cy), "w": str(cw), "h": str(ch)}
+        if depth + 1 >= spec.zone_depth:
+            sheet = worksheet_name(rng.randrange(spec.worksheets))
+            _sub(parent, "zone", id=f"z{counter[0]}", type_="worksheet", worksheet=sheet, **geometry)
+        else:
+            container = _sub(parent, "zone", id=f"z{counter[0]}", type_="layout-flow", **geometry)
+            _zone_tree(container, rng, spec, counter, depth + 1, (cx, cy, cw, ch))
+
+
+def build_workbook(spec: SyntheticSpec) -> Element:
+    """Return the root ``<workbook>`` element described by *spec*."""
+
+    rng = random.Random(spec.seed)
+    root = etree.Element("workbook")
+    _sub(root, "version", value="2021.1")
+
+    datasources_node = _sub(root, "datasources")
+    for ds_index in range(spec.datasources):
+        ds = _sub(datasources_node, "datasource", name=datasource_name(ds_index), caption=f"Datasource {ds_index}")
+        for col in range(spec.columns):
+            role = "measure" if col % 3 else "dimension"
+            datatype = "real" if role == "measure" else "string"
+            _sub(ds, "column", name=f"[{field_name(col)}]", caption=field_name(col), datatype=datatype, role=role)
+        for calc in range(spec.calculations):
+            column = _sub(ds, "column", name=f"[{calc_name(calc)}]", caption=calc_name(calc), datatype="real", role="measure")
+            _sub(column, "calculation", class_="tableau", formula=_formula(rng, spec, calc))
+        _sub(
+            ds,
+            "connection",
+            class_="sqlproxy",
+            server=f"db{ds_index % 4}.example.com",
+            dbname="warehouse",
+            schema="analytics",
+            table=f"table_{ds_index}",
+            port="5432",
+            username="reporting",
+        )
+        dependencies = _sub(ds, "datasource-dependencies")
+        for col in range(min(spec.columns, 10)):
+            _sub(dependencies, "column", ref=f"[{field_name(col)}]")
+
+    worksheets_node = _sub(root, "worksheets")
+    for sheet in range(spec.worksheets):
+        worksheet = _sub(worksheets_node, "worksheet", name=worksheet_name(sheet))
+        table = _sub(worksheet, "table")
+        ds = datasource_name(sheet % max(spec.datasources, 1))
+        _sub(table, "datasource", name=ds)
+        view = _sub(table, "view")
+        columns = _sub(view, "columns")
+        for ref in range(spec.refs_per_worksheet):
+            target = field_name(rng.randrange(spec.columns))
+            if ref % 4 == 0:
+                _sub(columns, "filter", column=f"[{ds}].[{target}]")
+            else:
+                _sub(columns, "column", ref=f"[{target}]")
+        if spec.calculations:
+            _sub(view, "calculation", formula=f"SUM([{calc_name(rng.randrange(spec.calculations))}])")
+
+    dashboards_node = _sub(root, "dashboards")
+    counter = [0]
+    for dash in range(spec.dashboards):
+        dashboard = _sub(dashboards_node, "dashboard", name=f"Dashboard {dash}")
+        _sub(dashboard, "size", maxwidth="1200", maxheight="800")
+        zones = _sub(dashboard, "zones")
+        counter[0] += 1
+        layout = _sub(zones, "zone", id=f"z{counter[0]}", type_="layout-basic", x="0", y="0", w="1200", h="800")
+        _zone_tree(layout, rng, spec, counter, 0, (0, 0, 1200, 800))
+
+    actions_node = _sub(root, "actions")
+    for action in range(spec.actions):
+        source = worksheet_name(rng.randrange(spec.worksheets))
+        target = worksheet_name(rng.randrange(spec.worksheets))
+        caption = field_name(rng.randrange(spec.columns))
+        _sub(actions_node, "action", type_="filter", name=f"Action{action}", source=source, target=target, mapping=f"{caption}={caption}")
+
+    parameters_node = _sub(root, "parameters")
+    for param in range(spec.parameters):
+        parameter = _sub(parameters_node, "parameter", name=f"Param {param}", datatype="string", current_value="A")
+        values = _sub(parameter, "values")
+        for value in ("A", "B", "C"):
+            _sub(values, "value").text = value
+    return root
+
+
+def write_workbook(path: Path, spec: SyntheticSpec) -> Path:
+    """Write a synthetic ``.twb`` or ``.twbx`` (chosen by suffix) to *path*."""
+
+    xml_bytes = dump_xml(build_workbook(spec))
+    path.parent.mkdir(parents=True, exist_ok=True)
+    if path.suffix.lower() == ".twb":
+        path.write_bytes(xml_bytes)
+        return path
+    rng = random.Random(spec.seed)
+    with ZipFile(path, "w") as zf:
+        zf.writestr(f"{path.stem}.twb", xml_bytes, compress_type=ZIP_DEFLATED)
+        zf.writestr("Image/logo.png", rng.randbytes(2048), compress_type=ZIP_STORED)
+        if spec.extract_bytes:
+            for ds_index in range(max(spec.datasources, 1)):
+                info = ZipInfo(f"Data/Extracts/{datasource_name(ds_index)}.hyper")
+                info.compress_type = ZIP_DEFLATED
+                size = spec.extract_bytes // max(spec.datasources, 1)
+                with zf.open(info, "w", force_zip64=True) as member:
+                    written = 0
+                    while written < size:
+                        # Half random, half repetitive: roughly how extracts compress.
+                        block = min(_CHUNK, size - written)
+                        noise = rng.randbytes(block // 2)
+                        member.write(noise + b"\0" * (block - len(noise)))
+                        written += block
+    return path
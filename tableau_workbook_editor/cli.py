@@ -1,29 +1,163 @@
 """Command line interface for :mod:`tableau_workbook_editor`."""
 from __future__ import annotations
 
+import json
+import re
+from functools import lru_cache
 from pathlib import Path
-from typing import Dict, Optional
+from typing import Any, Dict, Optional, Tuple
 
 import click
-from rich.console import Console
-from rich.table import Table
-from rich.tree import Tree
 
-from .core.reader import open_workbook
+# rich and the workbook model are imported by the commands that use them, so
+# scripted calls such as ``tbe --json list`` start quickly.
 
-console = Console()
+# Rich markup used by status messages, stripped in --plain and --json output.
+_STYLE_MARKUP = re.compile(r"\[/?(?:bold|green|red|yellow|cyan)\]")
+_INSPECT_SECTIONS = (
+    ("Worksheets", "worksheets"),
+    ("Dashboards", "dashboards"),
+    ("Datasources", "datasources"),
+    ("Parameters", "parameters"),
+)
+
+
+@lru_cache(maxsize=None)
+def _console():
+    from rich.console import Console
+
+    return Console()
+
+
+def _output_mode() -> str:
+    """Return ``"json"``, ``"plain"`` or ``"rich"`` from the top-level options."""
+
+    context = click.get_current_context(silent=True)
+    params = context.find_root().params if context is not None else {}
+    if params.get("json_output"):
+        return "json"
+    if params.get("plain"):
+        return "plain"
+    return "rich"
+
+
+def _print(message: str) -> None:
+    mode = _output_mode()
+    if mode == "rich":
+        _console().print(message)
+    else:
+        # Status messages go to stderr in JSON mode so stdout stays parseable.
+        click.echo(_STYLE_MARKUP.sub("", message), err=mode == "json")
+
+
+def _literal(text: str) -> str:
+    """Escape *text* so that rich prints brackets in it verbatim."""
+
+    if _output_mode() != "rich":
+        return text
+    from rich.markup import escape
+
+    return escape(text)
+
+
+def _print_json(data: Any) -> None:
+    click.echo(json.dumps(data, indent=2))
 
 
 def _load_workbook(path: Path):
+    from .core.reader import open_workbook
+
     return open_workbook(path)
 
 
+def _scan_workbook(path: Path, *, use_cache: bool = True):
+    from .core.reader import open_workbook
+
+    if not use_cache:
+        return open_workbook(path, mode="scan")
+    from .core.cache import MetadataCache
+
+    cache = MetadataCache()
+    try:
+        return open_workbook(path, mode="scan", cache=cache)
+    finally:
+        cache.close()
+
+
+def cache_option(func):
+    return click.option(
+        "--no-cache", "no_cache", is_flag=True, default=False, help="Re-read the workbook instead of using the metadata cache"
+    )(func)
+
+
 def _save_workbook(workbook, *, target: Optional[Path], dry_run: bool, package_assets: bool) -> None:
     workbook.save(path=target, dry_run=dry_run, package_assets=package_assets)
     if dry_run:
-        console.print("[yellow]Dry run complete - no files written[/yellow]")
+        _print("[yellow]Dry run complete - no files written[/yellow]")
     else:
-        console.print(f"[green]Saved workbook to {target or workbook.source.path}[/green]")
+        _print(f"[green]Saved workbook to {target or workbook.source.path}[/green]")
+
+
+def _daemon_client():
+    """Return a client for a running ``tbe serve``, unless ``--no-daemon`` was given."""
+
+    context = click.get_current_context(silent=True)
+    if context is not None and context.find_root().params.get("no_daemon"):
+        return None
+    from .core.server import connect
+
+    return connect()
+
+
+def _run_mutation(
+    workbook: Path,
+    method: str,
+    arguments: Dict[str, object],
+    *,
+    target: Optional[Path],
+    dry_run: bool,
+    package_assets: bool,
+    backup: bool,
+) -> None:
+    """Apply one Workbook mutation and save, through the server when one is running."""
+
+    client = _daemon_client()
+    if client is None:
+        wb = _load_workbook(workbook)
+        _maybe_backup(wb, backup)
+        getattr(wb, method)(**arguments)
+        _save_workbook(wb, target=target, dry_run=dry_run, package_assets=package_assets)
+        return
+    _forward_operations(client, workbook, [{"op": method, **arguments}], target=target, dry_run=dry_run, package_assets=package_assets, backup=backup)
+
+
+def _forward_operations(client, workbook: Path, ops, *, target: Optional[Path], dry_run: bool, package_assets: bool, backup: bool) -> int:
+    from .core.server import ServerError
+
+    with client:
+        try:
+            result = client.call(
+                "run",
+                path=str(workbook.expanduser().resolve()),
+                operations=ops,
+                target=None if target is None else str(target.expanduser().resolve()),
+                dry_run=dry_run,
+                package_assets=package_assets,
+                backup=backup,
+            )
+        except ServerError as exc:
+            raise click.ClickException(str(exc)) from exc
+    _print_forwarded_save(result, dry_run)
+    return result["count"]
+
+
+def _print_forwarded_save(result: Dict[str, Any], dry_run: bool) -> None:
+    if result["backup"]:
+        _print(f"[cyan]Backup written to {result['backup']}[/cyan]")
+    if dry_run:
+        _print("[yellow]Dry run complete - no files written[/yellow]")
+    else:
+        _print(f"[green]Saved workbook to {result['path']}[/green]")
 
 
 def _maybe_backup(workbook, enabled: bool) -> None:
@@ -32,7 +166,11 @@ def _maybe_backup(workbook, enabled: bool) -> None:
     source = workbook.source.path
     backup_path = source.with_suffix(source.suffix + ".bak")
     backup_path.write_bytes(source.read_bytes())
-    console.print(f"[cyan]Backup written to {backup_path}[/cyan]")
+    _print(f"[cyan]Backup written to {backup_path}[/cyan]")
+
+
+def catalog_option(func):
+    return click.option("--db", "database", type=click.Path(path_type=Path), help="Catalog database (default: ~/.cache/tbe/catalog.sqlite3)")(func)
 
 
 def mutation_options(func):
@@ -48,53 +186,72 @@ def mutation_options(func):
 
 @click.group()
 @click.version_option()
-def main() -> None:
+@click.option("--no-daemon", is_flag=True, default=False, help="Do not forward edits to a running 'tbe serve'")
+@click.option("--json", "json_output", is_flag=True, default=False, help="Print results as JSON (status messages go to stderr)")
+@click.option("--plain", is_flag=True, default=False, help="Print plain text without colours, trees or tables")
+def main(no_daemon: bool, json_output: bool, plain: bool) -> None:
     """Tableau workbook editing tools."""
 
 
 @main.command()
 @click.argument("workbook", type=click.Path(path_type=Path, exists=True))
-def inspect(workbook: Path) -> None:
+@cache_option
+def inspect(workbook: Path, no_cache: bool) -> None:
     """Print a summary of the workbook."""
 
-    wb = _load_workbook(workbook)
+    wb = _scan_workbook(workbook, use_cache=not no_cache)
+    data = {
+        "worksheets": wb.list_worksheets(),
+        "dashboards": wb.list_dashboards(),
+        "datasources": wb.list_datasources(),
+        "parameters": wb.list_parameters(),
+    }
+    mode = _output_mode()
+    if mode == "json":
+        _print_json(data)
+        return
+    if mode == "plain":
+        click.echo(f"Workbook: {workbook.name}")
+        for title, key in _INSPECT_SECTIONS:
+            click.echo(title)
+            for name in data[key]:
+                click.echo(f"  {name}")
+        return
+    from rich.tree import Tree
+
     tree = Tree(f"Workbook: {workbook.name}")
-    sheets = tree.add("Worksheets")
-    for sheet in wb.list_worksheets():
-        sheets.add(sheet)
-    dashboards_branch = tree.add("Dashboards")
-    for dash in wb.list_dashboards():
-        dashboards_branch.add(dash)
-    datasources_branch = tree.add("Datasources")
-    for ds in wb.list_datasources():
-        datasources_branch.add(ds)
-    params_branch = tree.add("Parameters")
-    for param in wb.list_parameters():
-        params_branch.add(param)
-    console.print(tree)
+    for title, key in _INSPECT_SECTIONS:
+        branch = tree.add(title)
+        for name in data[key]:
+            branch.add(name)
+    _console().print(tree)
 
 
 @main.command()
 @click.argument("workbook", type=click.Path(path_type=Path, exists=True))
 @click.option("--out", "out_path", type=click.Path(path_type=Path))
-def export_json(workbook: Path, out_path: Optional[Path]) -> None:
+@cache_option
+def export_json(workbook: Path, out_path: Optional[Path], no_cache: bool) -> None:
     """Export workbook metadata as JSON."""
 
-    import json
-
-    wb = _load_workbook(workbook)
+    wb = _scan_workbook(workbook, use_cache=not no_cache)
     data = {
         "worksheets": wb.list_worksheets(),
         "dashboards": wb.list_dashboards(),
         "datasources": wb.list_datasources(),
         "parameters": wb.list_parameters(),
+        "columns": {ds: wb.list_columns(ds) for ds in wb.list_datasources()},
+        "actions": wb.list_actions(),
     }
     payload = json.dumps(data, indent=2)
     if out_path is None:
-        console.print(payload)
+        if _output_mode() == "rich":
+            _console().print(payload)
+        else:
+            click.echo(payload)
     else:
         out_path.write_text(payload)
-        console.print(f"[green]Metadata exported to {out_path}")
+        _print(f"[green]Metadata exported to {out_path}")
 
 
 @main.command()
@@ -103,24 +260,209 @@ def export_json(workbook: Path, out_path: Optional[Path]) -> None:
 @click.option("--dashboards", "list_dashboards_flag", is_flag=True, help="List dashboards")
 @click.option("--datasources", "list_datasources_flag", is_flag=True, help="List datasources")
 @click.option("--parameters", "list_parameters_flag", is_flag=True, help="List parameters")
-def list(workbook: Path, list_sheets: bool, list_dashboards_flag: bool, list_datasources_flag: bool, list_parameters_flag: bool) -> None:
+@cache_option
+def list(
+    workbook: Path,
+    list_sheets: bool,
+    list_dashboards_flag: bool,
+    list_datasources_flag: bool,
+    list_parameters_flag: bool,
+    no_cache: bool,
+) -> None:
     """List workbook components."""
 
-    wb = _load_workbook(workbook)
-    table = Table("Type", "Name")
+    wb = _scan_workbook(workbook, use_cache=not no_cache)
+    rows = []
     if list_sheets:
-        for name in wb.list_worksheets():
-            table.add_row("worksheet", name)
+        rows.extend(("worksheet", name) for name in wb.list_worksheets())
     if list_dashboards_flag:
-        for name in wb.list_dashboards():
-            table.add_row("dashboard", name)
+        rows.extend(("dashboard", name) for name in wb.list_dashboards())
     if list_datasources_flag:
-        for name in wb.list_datasources():
-            table.add_row("datasource", name)
+        rows.extend(("datasource", name) for name in wb.list_datasources())
     if list_parameters_flag:
-        for name in wb.list_parameters():
-            table.add_row("parameter", name)
-    console.print(table)
+        rows.extend(("parameter", name) for name in wb.list_parameters())
+    mode = _output_mode()
+    if mode == "json":
+        _print_json([{"type": kind, "name": name} for kind, name in rows])
+        return
+    if mode == "plain":
+        for kind, name in rows:
+            click.echo(f"{kind}\t{name}")
+        return
+    from rich.table import Table
+
+    table = Table("Type", "Name")
+    for kind, name in rows:
+        table.add_row(kind, name)
+    _console().print(table)
+
+
+@main.command()
+@click.argument("workbook", type=click.Path(path_type=Path, exists=True))
+@click.option("--format", "output_format", type=click.Choice(["text", "json"]), default=None, help="Output format (default: text, or json with --json)")
+def validate(workbook: Path, output_format: Optional[str]) -> None:
+    """Check the workbook for broken references; exits with status 1 on errors."""
+
+    report = _load_workbook(workbook).validate()
+    if (output_format or ("json" if _output_mode() == "json" else "text")) == "json":
+        _print_json(report.to_dict())
+    else:
+        for issue in report.issues:
+            colour = "red" if issue.severity == "error" else "yellow"
+            _print(f"[{colour}]{issue.severity}[/{colour}] {issue.rule}: {_literal(issue.message)}\n    at {_literal(issue.path)}")
+        errors, warnings = len(report.errors), len(report.warnings)
+        _print(f"{errors} error(s), {warnings} warning(s)" if report.issues else "[green]No issues found[/green]")
+    if not report.ok:
+        raise SystemExit(1)
+
+
+@main.group("layout")
+def layout_group() -> None:
+    """Inspect dashboard zone layouts."""
+
+
+@layout_group.command("check")
+@click.argument("workbook", type=click.Path(path_type=Path, exists=True))
+@click.option("--dashboard", "dashboards", multiple=True, help="Only check this dashboard (repeatable)")
+@click.option("--at", "point", type=(int, int), default=None, metavar="X Y", help="Also list the zones containing this point")
+@click.option("--format", "output_format", type=click.Choice(["text", "json"]), default=None, help="Output format (default: text, or json with --json)")
+def layout_check_cmd(workbook: Path, dashboards: Tuple[str, ...], point: Optional[Tuple[int, int]], output_format: Optional[str]) -> None:
+    """Report overlapping, out-of-bounds and invalid zones, including nested ones; exits with status 1 on issues."""
+
+    wb = _load_workbook(workbook)
+    results = []
+    try:
+        for name in dashboards or wb.list_dashboards():
+            tree = wb.zone_tree(name)
+            hits = [zone.get("id") or "" for zone in tree.hit_test(*point)] if point is not None else None
+            results.append((name, len(tree), tree.check(), hits))
+    except ValueError as exc:
+        raise click.ClickException(str(exc)) from exc
+    issues = [issue for _, _, found, _ in results for issue in found]
+    if (output_format or ("json" if _output_mode() == "json" else "text")) == "json":
+        payload = []
+        for name, count, found, hits in results:
+            entry: Dict[str, Any] = {"dashboard": name, "zones": count, "issues": [issue.to_dict() for issue in found]}
+            if hits is not None:
+                entry["hits"] = hits
+            payload.append(entry)
+        _print_json(payload)
+    else:
+        for name, count, found, hits in results:
+            for issue in found:
+                _print(f"[red]{issue.kind}[/red] {_literal(issue.describe())}")
+            if hits is not None:
+                _print(f"{_literal(name)}: zones at {point[0]},{point[1]}: {_literal(' > '.join(hits)) or 'none'}")
+        zones = sum(count for _, count, _, _ in results)
+        _print(f"{len(issues)} issue(s) in {zones} zone(s) across {len(results)} dashboard(s)" if issues else f"[green]No issues found in {zones} zone(s)[/green]")
+    if issues:
+        raise SystemExit(1)
+
+
+@main.command("diff")
+@click.argument("before", type=click.Path(path_type=Path, exists=True))
+@click.argument("after", type=click.Path(path_type=Path, exists=True))
+@click.option("--format", "output_format", type=click.Choice(["text", "json"]), default=None, help="Output format (default: text, or json with --json)")
+def diff_cmd(before: Path, after: Path, output_format: Optional[str]) -> None:
+    """Show the structural changes from BEFORE to AFTER."""
+
+    from .core.diffs import summarize
+
+    changes = _load_workbook(after).changes(_load_workbook(before)) or []
+    if (output_format or ("json" if _output_mode() == "json" else "text")) == "json":
+        _print_json({"changes": [change.to_dict() for change in changes], "summary": summarize(changes)})
+        return
+    colours = {"added": "green", "removed": "red"}
+    for change in changes:
+        colour = colours.get(change.kind, "yellow")
+        _print(f"[{colour}]{_literal(change.describe())}[/{colour}]")
+    counts = summarize(changes)
+    _print(", ".join(f"{count} {kind}" for kind, count in counts.items() if count) if changes else "[green]No differences[/green]")
+
+
+@main.command("lineage")
+@click.argument("workbook", type=click.Path(path_type=Path, exists=True))
+@click.option("--field", "field_name", help="Field to trace, such as '[Profit]' or '[Orders].[Profit]'")
+@click.option("--datasource", help="Datasource of an unqualified --field")
+@click.option("--upstream", is_flag=True, default=False, help="Show what the field depends on instead of what depends on it")
+@click.option("--format", "output_format", type=click.Choice(["text", "json"]), default=None, help="Output format (default: text, or json with --json)")
+def lineage_cmd(workbook: Path, field_name: Optional[str], datasource: Optional[str], upstream: bool, output_format: Optional[str]) -> None:
+    """Show what uses a field, or check the calculations for cycles; exits with status 1 on cycles."""
+
+    from .core.lineage import node_label
+
+    graph = _load_workbook(workbook).lineage
+    as_json = (output_format or ("json" if _output_mode() == "json" else "text")) == "json"
+    if field_name is None:
+        cycles = graph.cycles()
+        if as_json:
+            _print_json({"nodes": {node_label(node): kind for node, kind in graph.kinds.items()}, "cycles": cycles})
+        else:
+            for cycle in cycles:
+                _print(f"[red]cycle[/red] {_literal(' -> '.join(cycle))}")
+            counts: Dict[str, int] = {}
+            for kind in graph.kinds.values():
+                counts[kind] = counts.get(kind, 0) + 1
+            _print(", ".join(f"{counts[kind]} {kind}" for kind in sorted(counts)) + ("" if cycles else ", [green]no cycles[/green]"))
+        if cycles:
+            raise SystemExit(1)
+        return
+    nodes = graph.resolve(field_name, datasource)
+    if not nodes:
+        raise click.ClickException(f"Field '{field_name}' not found")
+    traces = [(node, [*graph.walk(node, downstream=not upstream)]) for node in nodes]
+    if as_json:
+        _print_json(
+            [
+                {
+                    "field": node,
+                    "kind": graph.kinds[node],
+                    "upstream" if upstream else "downstream": [
+                        {"node": node_label(found), "kind": graph.kinds[found], "distance": distance} for found, distance in walked
+                    ],
+                }
+                for node, walked in traces
+            ]
+        )
+        return
+    for node, walked in traces:
+        _print(f"{_literal(node)} ({graph.kinds[node]})")
+        for found, distance in walked:
+            _print(f"{'  ' * distance}{graph.kinds[found]} {_literal(node_label(found))}")
+        if not walked:
+            _print(f"  nothing {'upstream' if upstream else 'downstream'}")
+
+
+@main.command("merge")
+@click.argument("base", type=click.Path(path_type=Path, exists=True))
+@click.argument("ours", type=click.Path(path_type=Path, exists=True))
+@click.argument("theirs", type=click.Path(path_type=Path, exists=True))
+@click.option("-o", "--output", "target_path", type=click.Path(path_type=Path), help="Where to write the result (default: OURS)")
+@click.option("--dry-run", is_flag=True, default=False)
+@click.option("--package-assets", is_flag=True, default=False, help="Write the result as a packaged workbook")
+@click.option("--format", "output_format", type=click.Choice(["text", "json"]), default=None, help="Output format (default: text, or json with --json)")
+def merge_cmd(
+    base: Path, ours: Path, theirs: Path, target_path: Optional[Path], dry_run: bool, package_assets: bool, output_format: Optional[str]
+) -> None:
+    """Merge the changes THEIRS made to BASE into OURS; exits with status 1 on conflicts.
+
+    Conflicting edits keep the OURS version and are listed.
+    """
+
+    wb = _load_workbook(ours)
+    result = wb.merge(_load_workbook(base), _load_workbook(theirs))
+    if (output_format or ("json" if _output_mode() == "json" else "text")) == "json":
+        wb.save(path=target_path, dry_run=dry_run, package_assets=package_assets)
+        _print_json(result.to_dict())
+    else:
+        for conflict in result.conflicts:
+            _print(f"[red]conflict[/red] {conflict.kind}: {_literal(conflict.describe())}")
+        for old, new in result.renumbered.items():
+            _print(f"[cyan]Renumbered zone {_literal(old)} from theirs to {_literal(new)}[/cyan]")
+        _print(f"Applied {result.applied} change(s), {len(result.conflicts)} conflict(s)")
+        _save_workbook(wb, target=target_path, dry_run=dry_run, package_assets=package_assets)
+    if not result.ok:
+        raise SystemExit(1)
 
 
 @main.command("rename-field")
@@ -129,10 +471,38 @@ def list(workbook: Path, list_sheets: bool, list_dashboards_flag: bool, list_dat
 @click.option("--from", "from_name", required=True)
 @click.option("--to", required=True)
 def rename_field_cmd(workbook: Path, target_path: Optional[Path], dry_run: bool, package_assets: bool, backup: bool, datasource: str, from_name: str, to: str) -> None:
-    wb = _load_workbook(workbook)
-    _maybe_backup(wb, backup)
-    wb.rename_field(datasource=datasource, old=from_name, new=to)
-    _save_workbook(wb, target=target_path, dry_run=dry_run, package_assets=package_assets)
+    arguments = {"datasource": datasource, "old": from_name, "new": to}
+    _run_mutation(workbook, "rename_field", arguments, target=target_path, dry_run=dry_run, package_assets=package_assets, backup=backup)
+
+
+@main.command("rename-fields")
+@mutation_options
+@click.option("--datasource", required=True)
+@click.option("--map", "map_path", required=True, type=click.Path(path_type=Path, exists=True), help="CSV file of old,new field names")
+def rename_fields_cmd(workbook: Path, target_path: Optional[Path], dry_run: bool, package_assets: bool, backup: bool, datasource: str, map_path: Path) -> None:
+    mapping = _read_rename_map(map_path)
+    arguments = {"datasource": datasource, "mapping": mapping}
+    _run_mutation(workbook, "rename_fields", arguments, target=target_path, dry_run=dry_run, package_assets=package_assets, backup=backup)
+    _print(f"Renamed {len(mapping)} field(s) in datasource '{datasource}'")
+
+
+def _read_rename_map(path: Path) -> Dict[str, str]:
+    import csv
+
+    mapping: Dict[str, str] = {}
+    with path.open(newline="", encoding="utf-8-sig") as handle:
+        for number, row in enumerate(csv.reader(handle), start=1):
+            if not row or not "".join(row).strip():
+                continue
+            if len(row) != 2:
+                raise click.BadParameter(f"line {number}: expected two columns (old,new)", param_hint="--map")
+            old, new = (value.strip() for value in row)
+            if number == 1 and (old.lower(), new.lower()) in {("old", "new"), ("from", "to")}:
+                continue
+            if old in mapping:
+                raise click.BadParameter(f"line {number}: field '{old}' is renamed twice", param_hint="--map")
+            mapping[old] = new
+    return mapping
 
 
 @main.command("add-calc")
@@ -142,10 +512,8 @@ def rename_field_cmd(workbook: Path, target_path: Optional[Path], dry_run: bool,
 @click.option("--formula", required=True)
 @click.option("--type", "data_type", default="string")
 def add_calc_cmd(workbook: Path, target_path: Optional[Path], dry_run: bool, package_assets: bool, backup: bool, datasource: str, name: str, formula: str, data_type: str) -> None:
-    wb = _load_workbook(workbook)
-    _maybe_backup(wb, backup)
-    wb.add_calculation(datasource=datasource, name=name, formula=formula, data_type=data_type)
-    _save_workbook(wb, target=target_path, dry_run=dry_run, package_assets=package_assets)
+    arguments = {"datasource": datasource, "name": name, "formula": formula, "data_type": data_type}
+    _run_mutation(workbook, "add_calculation", arguments, target=target_path, dry_run=dry_run, package_assets=package_assets, backup=backup)
 
 
 @main.command("set-parameter")
@@ -156,10 +524,14 @@ def add_calc_cmd(workbook: Path, target_path: Optional[Path], dry_run: bool, pac
 @click.option("--allow", "allowable_values", multiple=True)
 @click.option("--display-format")
 def set_parameter_cmd(workbook: Path, target_path: Optional[Path], dry_run: bool, package_assets: bool, backup: bool, name: str, data_type: str, value: str, allowable_values: tuple[str, ...], display_format: Optional[str]) -> None:
-    wb = _load_workbook(workbook)
-    _maybe_backup(wb, backup)
-    wb.set_parameter(name=name, data_type=data_type, value=value, allowable_values=list(allowable_values) or None, display_format=display_format)
-    _save_workbook(wb, target=target_path, dry_run=dry_run, package_assets=package_assets)
+    arguments = {
+        "name": name,
+        "data_type": data_type,
+        "value": value,
+        "allowable_values": list(allowable_values) or None,
+        "display_format": display_format,
+    }
+    _run_mutation(workbook, "set_parameter", arguments, target=target_path, dry_run=dry_run, package_assets=package_assets, backup=backup)
 
 
 @main.command("add-sheet-to-dashboard")
@@ -170,10 +542,8 @@ def set_parameter_cmd(workbook: Path, target_path: Optional[Path], dry_run: bool
 @click.option("--container", default="")
 @click.option("--index", type=int, default=-1)
 def add_sheet_to_dashboard_cmd(workbook: Path, target_path: Optional[Path], dry_run: bool, package_assets: bool, backup: bool, dashboard: str, sheet: str, floating: bool, container: str, index: int) -> None:
-    wb = _load_workbook(workbook)
-    _maybe_backup(wb, backup)
-    wb.add_sheet_to_dashboard(dashboard=dashboard, sheet=sheet, floating=floating, container=container, index=index)
-    _save_workbook(wb, target=target_path, dry_run=dry_run, package_assets=package_assets)
+    arguments = {"dashboard": dashboard, "sheet": sheet, "floating": floating, "container": container, "index": index}
+    _run_mutation(workbook, "add_sheet_to_dashboard", arguments, target=target_path, dry_run=dry_run, package_assets=package_assets, backup=backup)
 
 
 @main.command("move-zone")
@@ -185,10 +555,8 @@ def add_sheet_to_dashboard_cmd(workbook: Path, target_path: Optional[Path], dry_
 @click.option("--w", type=int)
 @click.option("--h", type=int)
 def move_zone_cmd(workbook: Path, target_path: Optional[Path], dry_run: bool, package_assets: bool, backup: bool, dashboard: str, zone_id: str, x: Optional[int], y: Optional[int], w: Optional[int], h: Optional[int]) -> None:
-    wb = _load_workbook(workbook)
-    _maybe_backup(wb, backup)
-    wb.move_zone(dashboard=dashboard, zone_id=zone_id, x=x, y=y, w=w, h=h)
-    _save_workbook(wb, target=target_path, dry_run=dry_run, package_assets=package_assets)
+    arguments = {"dashboard": dashboard, "zone_id": zone_id, "x": x, "y": y, "w": w, "h": h}
+    _run_mutation(workbook, "move_zone", arguments, target=target_path, dry_run=dry_run, package_assets=package_assets, backup=backup)
 
 
 @main.command("add-filter-action")
@@ -197,8 +565,6 @@ def move_zone_cmd(workbook: Path, target_path: Optional[Path], dry_run: bool, pa
 @click.option("--target", "target_sheet", required=True)
 @click.option("--mapping", required=False, default="")
 def add_filter_action_cmd(workbook: Path, target_path: Optional[Path], dry_run: bool, package_assets: bool, backup: bool, source: str, target_sheet: str, mapping: str) -> None:
-    wb = _load_workbook(workbook)
-    _maybe_backup(wb, backup)
     mapping_dict: Dict[str, str] = {}
     if mapping:
         for pair in mapping.split(";"):
@@ -206,8 +572,8 @@ def add_filter_action_cmd(workbook: Path, target_path: Optional[Path], dry_run:
                 continue
             left, _, right = pair.partition("=")
             mapping_dict[left.strip()] = right.strip()
-    wb.add_filter_action(source=source, target=target_sheet, mapping=mapping_dict)
-    _save_workbook(wb, target=target_path, dry_run=dry_run, package_assets=package_assets)
+    arguments = {"source": source, "target": target_sheet, "mapping": mapping_dict}
+    _run_mutation(workbook, "add_filter_action", arguments, target=target_path, dry_run=dry_run, package_assets=package_assets, backup=backup)
 
 
 @main.command("set-connection")
@@ -218,12 +584,355 @@ def add_filter_action_cmd(workbook: Path, target_path: Optional[Path], dry_run:
 @click.option("--schema")
 @click.option("--table")
 def set_connection_cmd(workbook: Path, target_path: Optional[Path], dry_run: bool, package_assets: bool, backup: bool, datasource: str, server: Optional[str], db: Optional[str], schema: Optional[str], table: Optional[str]) -> None:
+    arguments = {"datasource": datasource, "server": server, "db": db, "schema": schema, "table": table}
+    _run_mutation(workbook, "set_connection", arguments, target=target_path, dry_run=dry_run, package_assets=package_assets, backup=backup)
+
+
+@main.command("rewrite-connections")
+@mutation_options
+@click.option("--rules", "rules_path", required=True, type=click.Path(path_type=Path, exists=True, dir_okay=False), help="JSON or YAML rule file")
+def rewrite_connections_cmd(workbook: Path, target_path: Optional[Path], dry_run: bool, package_assets: bool, backup: bool, rules_path: Path) -> None:
+    """Rewrite connection attributes of every datasource with regex rules.
+
+    The rules file holds a list of rules (or a mapping with a ``rules`` list);
+    each rule has an ``attribute``, a ``pattern`` and a ``replacement``, and
+    optionally a ``datasource`` name pattern and a connection ``class``.
+    """
+
+    from .core.connections import load_rules
+
+    try:
+        rules = load_rules(rules_path)
+    except ValueError as exc:
+        raise click.ClickException(str(exc)) from exc
+    client = _daemon_client()
+    if client is None:
+        wb = _load_workbook(workbook)
+        report = wb.rewrite_connections(rules).to_dict()
+        _print_rewrite_report(report)
+        if report["changed"] or target_path is not None:
+            _maybe_backup(wb, backup)
+            _save_workbook(wb, target=target_path, dry_run=dry_run, package_assets=package_assets)
+        return
+    from .core.server import ServerError
+
+    path = str(workbook.expanduser().resolve())
+    with client:
+        try:
+            report = client.call("call", path=path, method="rewrite_connections", arguments={"rules": [rule.to_dict() for rule in rules]})
+            _print_rewrite_report(report)
+            if not report["changed"] and target_path is None:
+                return
+            result = client.call(
+                "save",
+                path=path,
+                target=None if target_path is None else str(target_path.expanduser().resolve()),
+                dry_run=dry_run,
+                package_assets=package_assets,
+                backup=backup,
+            )
+        except ServerError as exc:
+            raise click.ClickException(str(exc)) from exc
+    _print_forwarded_save(result, dry_run)
+
+
+def _print_rewrite_report(report: Dict[str, Any]) -> None:
+    if _output_mode() == "json":
+        _print_json(report)
+        return
+    for datasource, changes in report["datasources"].items():
+        _print(f"[bold]{_literal(datasource)}[/bold]")
+        for change in changes:
+            _print(f"  {change['element']} {change['attribute']}: {_literal(change['before'])} -> {_literal(change['after'])}")
+    _print(f"{report['changed']} change(s) in {len(report['datasources'])} datasource(s), {report['visited']} connection(s) visited")
+    if not report["changed"]:
+        _print("[yellow]No connections matched[/yellow]")
+
+
+@main.command("apply")
+@mutation_options
+@click.argument("ops_path", metavar="OPS", type=click.Path(path_type=Path, exists=True))
+def apply_cmd(workbook: Path, target_path: Optional[Path], dry_run: bool, package_assets: bool, backup: bool, ops_path: Path) -> None:
+    """Apply a JSON/YAML list of operations and save once."""
+
+    from .core.operations import OperationError, load_operations
+
+    try:
+        ops = load_operations(ops_path)
+    except (OperationError, ValueError) as exc:
+        raise click.ClickException(str(exc)) from exc
+    client = _daemon_client()
+    if client is not None:
+        payload = [{"op": op.method, **op.arguments} for op in ops]
+        count = _forward_operations(
+            client, workbook, payload, target=target_path, dry_run=dry_run, package_assets=package_assets, backup=backup
+        )
+        _print(f"Applied {count} operation(s)")
+        return
     wb = _load_workbook(workbook)
+    try:
+        count = wb.apply(ops)
+    except OperationError as exc:
+        raise click.ClickException(f"{exc} - no files written") from exc
     _maybe_backup(wb, backup)
-    wb.set_connection(datasource=datasource, server=server, db=db, schema=schema, table=table)
+    _print(f"Applied {count} operation(s)")
     _save_workbook(wb, target=target_path, dry_run=dry_run, package_assets=package_assets)
 
 
+@main.command("batch")
+@click.argument("operation")
+@click.option("--glob", "patterns", multiple=True, required=True, help="Workbook glob pattern; '**' recurses (repeatable)")
+@click.option("--jobs", type=click.IntRange(min=1), default=None, help="Worker processes (default: one per CPU)")
+@click.option("--arg", "raw_args", multiple=True, help="key=value argument for the operation; values starting with [, { or \" are parsed as JSON")
+@click.option("--ops", "ops_path", type=click.Path(path_type=Path, exists=True), help="Operations file for the 'apply' operation")
+@click.option("--report", "report_path", type=click.Path(path_type=Path), help="Write per-file results as JSON lines")
+@click.option("--dry-run", is_flag=True, default=False)
+@click.option("--backup", is_flag=True, default=False)
+@click.option("--package-assets", is_flag=True, default=False, help="Write the results as packaged workbooks")
+def batch_cmd(operation: str, patterns: tuple[str, ...], jobs: Optional[int], raw_args: tuple[str, ...], ops_path: Optional[Path], report_path: Optional[Path], dry_run: bool, backup: bool, package_assets: bool) -> None:
+    """Run OPERATION (a mutation command, 'apply', 'inspect', 'list', 'export-json' or 'validate') across many workbooks."""
+
+    from .core.fleet import expand_paths, run_batch
+    from .core.operations import OperationError
+
+    arguments: Dict[str, object] = {}
+    for raw in raw_args:
+        key, sep, value = raw.partition("=")
+        if not sep:
+            raise click.BadParameter(f"expected key=value, got '{raw}'", param_hint="--arg")
+        arguments[key.strip()] = _parse_arg_value(value)
+    if operation == "apply":
+        if ops_path is None:
+            raise click.BadParameter("the 'apply' operation requires --ops", param_hint="--ops")
+        from .core.operations import load_operations
+
+        try:
+            arguments["operations"] = [{"op": op.method, **op.arguments} for op in load_operations(ops_path)]
+        except ValueError as exc:
+            raise click.ClickException(str(exc)) from exc
+    paths = expand_paths(patterns)
+    if not paths:
+        raise click.ClickException("No workbooks matched the given patterns")
+    try:
+        results = run_batch(paths, operation, arguments, jobs=jobs, dry_run=dry_run, backup=backup, package_assets=package_assets)
+    except OperationError as exc:
+        raise click.ClickException(str(exc)) from exc
+    report = report_path.open("w", encoding="utf-8") if report_path is not None else None
+    failures = 0
+    try:
+        for done, result in enumerate(results, start=1):
+            if report is not None:
+                report.write(result.to_json() + "\n")
+                report.flush()
+            if _output_mode() == "json":
+                click.echo(result.to_json())
+            if result.ok:
+                _print(f"[{done}/{len(paths)}] [green]ok[/green] {result.path} ({result.duration:.2f}s)")
+            else:
+                failures += 1
+                _print(f"[{done}/{len(paths)}] [red]failed[/red] {result.path}: {result.error}")
+    finally:
+        if report is not None:
+            report.close()
+    _print(f"{len(paths) - failures} succeeded, {failures} failed")
+    if failures:
+        raise SystemExit(1)
+
+
+def _parse_arg_value(value: str) -> object:
+    # Only lists, mappings and quoted strings are JSON; everything else stays a
+    # string and the operation converts it to the type its argument expects.
+    if value[:1] not in ("[", "{", '"'):
+        return value
+    try:
+        return json.loads(value)
+    except ValueError:
+        return value
+
+
+@main.group("catalog")
+def catalog_group() -> None:
+    """Index the workbooks under a directory and search them."""
+
+
+@catalog_group.command("build")
+@click.argument("directory", type=click.Path(path_type=Path, exists=True, file_okay=False))
+@catalog_option
+@click.option("--jobs", type=click.IntRange(min=1), default=None, help="Worker processes (default: one per CPU)")
+def catalog_build_cmd(directory: Path, database: Optional[Path], jobs: Optional[int]) -> None:
+    """Index new and changed workbooks under DIRECTORY and drop deleted ones."""
+
+    import sqlite3
+
+    from .core.catalog import Catalog
+
+    try:
+        with Catalog(database) as catalog:
+            stats = catalog.build(directory, jobs=jobs)
+    except sqlite3.Error as exc:
+        raise click.ClickException(f"Catalog error: {exc}") from exc
+    if _output_mode() == "json":
+        _print_json(stats.to_dict())
+        return
+    for path, error in stats.failed:
+        _print(f"[red]failed[/red] {_literal(path)}: {_literal(error)}")
+    _print(f"{stats.indexed} indexed, {stats.unchanged} unchanged, {stats.removed} removed, {len(stats.failed)} failed")
+
+
+@catalog_group.command("search")
+@click.argument("query")
+@catalog_option
+@click.option("--kind", help="Only return datasource, connection, column, calculation, worksheet, dashboard or parameter items")
+@click.option("--limit", type=int, default=50, show_default=True)
+def catalog_search_cmd(query: str, database: Optional[Path], kind: Optional[str], limit: int) -> None:
+    """Find the workbooks whose fields, formulas, connections or sheets mention QUERY."""
+
+    import sqlite3
+
+    from .core.catalog import Catalog
+
+    try:
+        with Catalog(database) as catalog:
+            hits = catalog.search(query, kind=kind, limit=limit)
+    except ValueError as exc:
+        raise click.BadParameter(str(exc), param_hint="--kind") from exc
+    except sqlite3.Error as exc:
+        raise click.ClickException(f"Catalog error: {exc}") from exc
+    mode = _output_mode()
+    if mode == "json":
+        _print_json([hit.to_dict() for hit in hits])
+        return
+    if mode == "plain":
+        for hit in hits:
+            click.echo("\t".join((hit.path, hit.kind, hit.datasource, hit.name, hit.detail)))
+        return
+    from rich.table import Table
+
+    table = Table("Workbook", "Kind", "Datasource", "Name", "Detail")
+    for hit in hits:
+        table.add_row(*(_literal(value) for value in (hit.path, hit.kind, hit.datasource, hit.name, hit.detail)))
+    _console().print(table)
+
+
+@main.group("extracts")
+def extracts_group() -> None:
+    """List, export and replace the extracts inside a packaged workbook."""
+
+
+def _size_label(size: int) -> str:
+    return f"{size / (1024 * 1024):.1f} MiB" if size >= 1024 * 1024 else f"{size} B"
+
+
+@extracts_group.command("list")
+@click.argument("workbook", type=click.Path(path_type=Path, exists=True, dir_okay=False))
+@click.option("--checksum", is_flag=True, default=False, help="Stream each extract to compute its SHA-256")
+def extracts_list_cmd(workbook: Path, checksum: bool) -> None:
+    """List the extracts stored in WORKBOOK."""
+
+    from zipfile import BadZipFile
+
+    from .core.hyper_utils import list_extracts
+
+    try:
+        extracts = list_extracts(workbook, checksum=checksum)
+    except BadZipFile as exc:
+        raise click.ClickException(f"{workbook} is not a packaged workbook: {exc}") from exc
+    mode = _output_mode()
+    if mode == "json":
+        _print_json([info.to_dict() for info in extracts])
+        return
+    if mode == "plain":
+        for info in extracts:
+            click.echo("\t".join((info.member or "", str(info.size), str(info.compressed_size), info.sha256 or "")))
+        return
+    from rich.table import Table
+
+    table = Table("Extract", "Size", "Stored", *(["SHA-256"] if checksum else []))
+    for info in extracts:
+        row = [_literal(info.member or ""), _size_label(info.size), _size_label(info.compressed_size or 0)]
+        table.add_row(*row, *([info.sha256 or ""] if checksum else []))
+    _console().print(table)
+
+
+@extracts_group.command("export")
+@click.argument("workbook", type=click.Path(path_type=Path, exists=True, dir_okay=False))
+@click.argument("names", nargs=-1)
+@click.option("-o", "--output", type=click.Path(path_type=Path, file_okay=False), default=Path("."), show_default=True, help="Directory to write the extracts to")
+def extracts_export_cmd(workbook: Path, names: Tuple[str, ...], output: Path) -> None:
+    """Write extracts from WORKBOOK to files (all of them unless NAMES are given)."""
+
+    from zipfile import BadZipFile
+
+    from .core.hyper_utils import export_extract, list_extracts
+
+    output.mkdir(parents=True, exist_ok=True)
+    try:
+        members = names or [info.member or "" for info in list_extracts(workbook)]
+        exported = [export_extract(workbook, name, output) for name in members]
+    except ValueError as exc:
+        raise click.ClickException(str(exc)) from exc
+    except BadZipFile as exc:
+        raise click.ClickException(f"{workbook} is not a packaged workbook: {exc}") from exc
+    if _output_mode() == "json":
+        _print_json([info.to_dict() for info in exported])
+        return
+    for info in exported:
+        _print(f"[green]Exported[/green] {_literal(info.member or '')} to {_literal(str(info.path))} ({_size_label(info.size)}, sha256 {info.sha256})")
+
+
+@extracts_group.command("replace")
+@click.argument("workbook", type=click.Path(path_type=Path, exists=True, dir_okay=False))
+@click.argument("name")
+@click.argument("source", type=click.Path(path_type=Path, exists=True, dir_okay=False))
+@click.option("--as", "target_path", type=click.Path(path_type=Path), help="Write the result to this file instead")
+@click.option("--dry-run", is_flag=True, default=False)
+def extracts_replace_cmd(workbook: Path, name: str, source: Path, target_path: Optional[Path], dry_run: bool) -> None:
+    """Replace the extract NAME in WORKBOOK with the file SOURCE.
+
+    Other members are copied without being recompressed.
+    """
+
+    from zipfile import BadZipFile
+
+    from .core.hyper_utils import describe_hyper, find_extract, replace_extract
+
+    try:
+        if dry_run:
+            member = find_extract(workbook, name)
+            info = describe_hyper(source, checksum=True)
+            assert info is not None
+            info.member = member
+        else:
+            info = replace_extract(workbook, name, source, target=target_path)
+    except ValueError as exc:
+        raise click.ClickException(str(exc)) from exc
+    except BadZipFile as exc:
+        raise click.ClickException(f"{workbook} is not a packaged workbook: {exc}") from exc
+    if _output_mode() == "json":
+        _print_json({**info.to_dict(), "dry_run": dry_run})
+        return
+    verb = "Would replace" if dry_run else "Replaced"
+    _print(f"[green]{verb}[/green] {_literal(info.member or '')} ({_size_label(info.size)}, sha256 {info.sha256})")
+
+
+@main.command("serve")
+@click.option("--socket", "socket_path", type=click.Path(path_type=Path), help="Unix socket to listen on (default: $TBE_SOCKET or ~/.cache/tbe/serve.sock)")
+@click.option("--max-memory", type=int, default=512, show_default=True, help="Estimated MiB of parsed workbooks to keep")
+def serve_cmd(socket_path: Optional[Path], max_memory: int) -> None:
+    """Keep parsed workbooks in memory and serve edits over a Unix socket."""
+
+    from .core.server import default_socket_path, serve
+
+    path = socket_path or default_socket_path()
+    _print(f"Serving on {path} (Ctrl+C to stop)")
+    try:
+        serve(path, max_bytes=max_memory * 1024 * 1024)
+    except RuntimeError as exc:
+        raise click.ClickException(str(exc)) from exc
+    except KeyboardInterrupt:
+        pass
+
+
 @main.command("save")
 @mutation_options
 def save_cmd(workbook: Path, target_path: Optional[Path], dry_run: bool, package_assets: bool, backup: bool) -> None:
@@ -13,6 +13,19 @@ def list_actions(root: Element) -> List[Element]:
     return list(xpath(root, ACTIONS_XPATH))
 
 
+def action_label(action: Element) -> str:
+    """Return the name of *action*, or a description for unnamed actions."""
+
+    label = action.get("name") or action.get("caption")
+    if label:
+        return label
+    return f"{action.get('type') or 'action'}: {action.get('source') or '?'} -> {action.get('target') or '?'}"
+
+
+def list_action_names(root: Element) -> List[str]:
+    return [action_label(action) for action in list_actions(root)]
+
+
 def ensure_actions_parent(root: Element) -> Element:
     actions_parent = root.find("actions")
     if actions_parent is None:
@@ -0,0 +1,242 @@
+"""Asyncio wrappers that keep blocking workbook work off the event loop.
+
+:class:`AsyncWorkbook` runs parsing, operations, serialisation and the zip
+writes and atomic replace of a save on an executor, one step at a time, so a
+large workbook never stalls the loop. An :class:`AsyncRunner` owns the
+executors and a limit on how many workbooks may be open at once: every
+:class:`AsyncWorkbook` holds one slot from :meth:`AsyncWorkbook.open` until it
+is closed, and further opens wait for a free slot. :func:`run_operations` runs
+a whole open/apply/save cycle as a single step, on the runner's process pool
+when it has one, so CPU-bound edits do not contend for the GIL.
+
+Cancelling a task cancels the step it is waiting for if that step has not
+started yet. A step that is already running cannot be interrupted; the
+cancelled task waits for it to finish before giving up its slot, so the limit
+keeps bounding memory, and the workbook is left as that step left it.
+"""
+from __future__ import annotations
+
+import asyncio
+from concurrent.futures import Executor, ThreadPoolExecutor
+from contextlib import asynccontextmanager
+from pathlib import Path
+from typing import TYPE_CHECKING, Any, AsyncIterator, Callable, Iterable, Mapping, Optional, TypeVar
+
+from . import fleet
+
+if TYPE_CHECKING:  # pragma: no cover
+    from .twb_model import Workbook
+    from .twbx_utils import CompressionPolicy
+    from .validators import ValidationReport
+
+#: Default number of workbooks an :class:`AsyncRunner` keeps open at once.
+DEFAULT_LIMIT = 4
+
+T = TypeVar("T")
+
+
+class AsyncRunner:
+    """Executors and an open-workbook limit shared by :class:`AsyncWorkbook` instances.
+
+    Steps run on *executor*, or on a thread pool owned by the runner when it is
+    not given. *process_executor* (for example a
+    :class:`~concurrent.futures.ProcessPoolExecutor`) is used by
+    :func:`run_operations`; without one those run on *executor* too. A runner
+    serves one event loop at a time.
+    """
+
+    def __init__(self, executor: Optional[Executor] = None, *, limit: int = DEFAULT_LIMIT, process_executor: Optional[Executor] = None) -> None:
+        if limit < 1:
+            raise ValueError(f"limit must be at least 1, got {limit}")
+        self._owned = executor is None
+        self.executor: Executor = executor if executor is not None else ThreadPoolExecutor(max_workers=limit, thread_name_prefix="tbe-async")
+        self.process_executor = process_executor
+        self.limit = limit
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._slots: Optional[asyncio.Semaphore] = None
+
+    async def __aenter__(self) -> "AsyncRunner":
+        return self
+
+    async def __aexit__(self, *exc_info: object) -> None:
+        self.close()
+
+    def close(self) -> None:
+        """Shut down the thread pool the runner created; steps already running still finish."""
+
+        if self._owned:
+            self.executor.shutdown(wait=False, cancel_futures=True)
+
+    async def acquire(self) -> None:
+        """Wait for one of the :attr:`limit` slots."""
+
+        await self._semaphore().acquire()
+
+    def release(self) -> None:
+        self._semaphore().release()
+
+    @asynccontextmanager
+    async def slot(self) -> AsyncIterator[None]:
+        await self.acquire()
+        try:
+            yield
+        finally:
+            self.release()
+
+    async def run(self, func: Callable[..., T], /, *args: Any, **kwargs: Any) -> T:
+        """Return ``func(*args, **kwargs)`` computed on :attr:`executor`."""
+
+        return await _run_step(self.executor, func, *args, **kwargs)
+
+    async def run_cpu(self, func: Callable[..., T], /, *args: Any, **kwargs: Any) -> T:
+        """Like :meth:`run`, but on :attr:`process_executor` when there is one.
+
+        *func*, its arguments and its result must be picklable.
+        """
+
+        return await _run_step(self.process_executor or self.executor, func, *args, **kwargs)
+
+    def _semaphore(self) -> asyncio.Semaphore:
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop or self._slots is None:
+            # Semaphores belong to the loop that first waits on them.
+            self._loop, self._slots = loop, asyncio.Semaphore(self.limit)
+        return self._slots
+
+
+_default_runner: Optional[AsyncRunner] = None
+
+
+def default_runner() -> AsyncRunner:
+    """Return the shared runner used when none is passed (a thread pool, :data:`DEFAULT_LIMIT` slots)."""
+
+    global _default_runner
+    if _default_runner is None:
+        _default_runner = AsyncRunner()
+    return _default_runner
+
+
+async def _run_step(executor: Executor, func: Callable[..., T], /, *args: Any, **kwargs: Any) -> T:
+    future = executor.submit(func, *args, **kwargs)
+    try:
+        return await asyncio.wrap_future(future)
+    except asyncio.CancelledError:
+        if not future.cancel():
+            # Already running: wait for it so the caller's slot is not reused early.
+            await asyncio.wait([asyncio.wrap_future(future)])
+        raise
+
+
+class AsyncWorkbook:
+    """Awaitable facade over a :class:`~tableau_workbook_editor.core.twb_model.Workbook`.
+
+    Use :meth:`open` rather than the constructor, and close the workbook (or
+    use it as an ``async with`` block) to free its runner slot. Steps on one
+    workbook run one after another; different workbooks run concurrently.
+    """
+
+    def __init__(self, workbook: "Workbook", runner: AsyncRunner) -> None:
+        self.workbook = workbook
+        self.runner = runner
+        self._lock = asyncio.Lock()
+        self._closed = False
+
+    @classmethod
+    async def open(cls, path: str | Path, *, runner: Optional[AsyncRunner] = None) -> "AsyncWorkbook":
+        """Parse the workbook at *path* once the runner has a free slot."""
+
+        runner = runner or default_runner()
+        await runner.acquire()
+        try:
+            workbook = await runner.run(_open, Path(path))
+        except BaseException:
+            runner.release()
+            raise
+        return cls(workbook, runner)
+
+    async def __aenter__(self) -> "AsyncWorkbook":
+        return self
+
+    async def __aexit__(self, *exc_info: object) -> None:
+        self.close()
+
+    @property
+    def closed(self) -> bool:
+        return self._closed
+
+    def close(self) -> None:
+        """Release the runner slot; the workbook can no longer be used through this wrapper."""
+
+        if not self._closed:
+            self._closed = True
+            self.runner.release()
+
+    async def apply(self, ops: Iterable[Mapping[str, Any]]) -> int:
+        """Run :meth:`Workbook.apply` on the executor."""
+
+        return await self._step(self.workbook.apply, [*ops])
+
+    async def call(self, method: str, /, *args: Any, **kwargs: Any) -> Any:
+        """Run any other Workbook method, e.g. ``await wb.call("rename_field", ...)``."""
+
+        return await self._step(getattr(self.workbook, method), *args, **kwargs)
+
+    async def validate(self) -> "ValidationReport":
+        return await self._step(self.workbook.validate)
+
+    async def save(
+        self,
+        *,
+        path: Optional[str | Path] = None,
+        package_assets: bool = False,
+        target_version: Optional[str] = None,
+        dry_run: bool = False,
+        splice: bool = False,
+        compression: Optional["CompressionPolicy"] = None,
+    ) -> Optional[Path]:
+        """Serialise and write the workbook like :meth:`Workbook.save`.
+
+        Serialisation and writing are separate steps, so cancelling between
+        them leaves the file on disk untouched.
+        """
+
+        xml_bytes = await self._step(self.workbook.serialize, target_version=target_version, splice=splice)
+        if dry_run:
+            return None
+        return await self._step(self.workbook.write_bytes, xml_bytes, path=path, package_assets=package_assets, compression=compression)
+
+    async def _step(self, func: Callable[..., T], /, *args: Any, **kwargs: Any) -> T:
+        if self._closed:
+            raise RuntimeError("AsyncWorkbook is closed")
+        async with self._lock:
+            return await self.runner.run(func, *args, **kwargs)
+
+
+def _open(path: Path) -> "Workbook":
+    from .reader import open_workbook
+
+    return open_workbook(path)
+
+
+async def run_operations(
+    path: str | Path,
+    ops: Iterable[Mapping[str, Any]],
+    *,
+    runner: Optional[AsyncRunner] = None,
+    dry_run: bool = False,
+    package_assets: bool = False,
+) -> fleet.BatchResult:
+    """Open the workbook at *path*, apply *ops* and save it, as one step.
+
+    The step runs on the runner's process executor when it has one; only the
+    path, the operations and the :class:`~tableau_workbook_editor.core.fleet.BatchResult`
+    cross the process boundary. Malformed operations raise
+    :class:`~tableau_workbook_editor.core.operations.OperationError` before
+    anything runs; failures while applying or saving are reported in the result.
+    """
+
+    runner = runner or default_runner()
+    arguments = {"operations": [dict(op) for op in ops]}
+    fleet.check_operation("apply", arguments)
+    async with runner.slot():
+        return await runner.run_cpu(fleet.process_workbook, str(path), "apply", arguments, dry_run=dry_run, package_assets=package_assets)
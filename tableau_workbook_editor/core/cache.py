@@ -0,0 +1,201 @@
+"""On-disk cache of workbook metadata for read-only commands.
+
+A :class:`MetadataCache` stores the :class:`~tableau_workbook_editor.core.scanner.WorkbookSummary`
+of every workbook it has seen in a SQLite database. Entries are found by
+path and validated by file size and modification time. When those no longer
+match (or the path is new), the file's SHA-256 is compared against the stored
+digests, so touched, copied or moved workbooks are still answered without
+parsing. The database is kept below ``max_bytes`` by evicting the least
+recently used entries.
+
+The cache is best effort: any SQLite or filesystem error makes it behave as
+if it were empty, and callers fall back to scanning the workbook.
+"""
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+import sqlite3
+import time
+from pathlib import Path
+from typing import Optional, Tuple
+
+from .scanner import WorkbookSummary, scan_workbook
+
+CACHE_DIR_ENV = "TBE_CACHE_DIR"
+DATABASE_NAME = "metadata.sqlite3"
+#: Total size of cached payloads kept before least recently used entries are evicted.
+DEFAULT_MAX_BYTES = 64 * 1024 * 1024
+# Bump when the cached payload layout changes; older entries are discarded.
+SCHEMA_VERSION = 1
+_HASH_CHUNK = 1024 * 1024
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS entries (
+    path TEXT PRIMARY KEY,
+    size INTEGER NOT NULL,
+    mtime_ns INTEGER NOT NULL,
+    digest TEXT NOT NULL,
+    payload TEXT NOT NULL,
+    payload_size INTEGER NOT NULL,
+    accessed REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS entries_digest ON entries (digest);
+CREATE INDEX IF NOT EXISTS entries_accessed ON entries (accessed);
+"""
+
+
+def default_cache_dir() -> Path:
+    """Return ``$TBE_CACHE_DIR``, else ``$XDG_CACHE_HOME/tbe``, else ``~/.cache/tbe``."""
+
+    configured = os.environ.get(CACHE_DIR_ENV)
+    if configured:
+        return Path(configured).expanduser()
+    xdg = os.environ.get("XDG_CACHE_HOME")
+    base = Path(xdg).expanduser() if xdg else Path.home() / ".cache"
+    return base / "tbe"
+
+
+def file_digest(path: Path) -> str:
+    digest = hashlib.sha256()
+    with path.open("rb") as stream:
+        for chunk in iter(lambda: stream.read(_HASH_CHUNK), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class MetadataCache:
+    """SQLite-backed cache of :class:`WorkbookSummary` objects."""
+
+    def __init__(self, directory: Optional[Path] = None, *, max_bytes: int = DEFAULT_MAX_BYTES) -> None:
+        self.directory = directory if directory is not None else default_cache_dir()
+        self.max_bytes = max_bytes
+        self._connection: Optional[sqlite3.Connection] = None
+        self._disabled = False
+
+    @property
+    def database(self) -> Path:
+        return self.directory / DATABASE_NAME
+
+    # ------------------------------------------------------------------
+    def summary(self, path: Path) -> WorkbookSummary:
+        """Return the summary of *path* from the cache, scanning and storing it on a miss."""
+
+        path = path.expanduser().resolve()
+        cached, digest = self._lookup(path)
+        if cached is not None:
+            return cached
+        summary = scan_workbook(path)
+        self.put(path, summary, digest=digest)
+        return summary
+
+    def get(self, path: Path) -> Optional[WorkbookSummary]:
+        return self._lookup(path.expanduser().resolve())[0]
+
+    def put(self, path: Path, summary: WorkbookSummary, *, digest: Optional[str] = None) -> None:
+        path = path.expanduser().resolve()
+        connection = self._connect()
+        if connection is None:
+            return
+        try:
+            stat = path.stat()
+            digest = digest or file_digest(path)
+            payload = json.dumps(summary.to_dict(), separators=(",", ":"))
+            with connection:
+                connection.execute(
+                    "INSERT OR REPLACE INTO entries VALUES (?, ?, ?, ?, ?, ?, ?)",
+                    (str(path), stat.st_size, stat.st_mtime_ns, digest, payload, len(payload), time.time()),
+                )
+                self._evict(connection)
+        except (sqlite3.Error, OSError):
+            self._disable()
+
+    def clear(self) -> None:
+        connection = self._connect()
+        if connection is None:
+            return
+        try:
+            with connection:
+                connection.execute("DELETE FROM entries")
+        except sqlite3.Error:
+            self._disable()
+
+    def close(self) -> None:
+        if self._connection is not None:
+            self._connection.close()
+            self._connection = None
+
+    # ------------------------------------------------------------------
+    def _lookup(self, path: Path) -> Tuple[Optional[WorkbookSummary], Optional[str]]:
+        """Return ``(summary, digest)``; the digest is returned when it had to be computed."""
+
+        connection = self._connect()
+        if connection is None:
+            return None, None
+        try:
+            stat = path.stat()
+            row = connection.execute("SELECT size, mtime_ns, payload FROM entries WHERE path = ?", (str(path),)).fetchone()
+            if row is not None and row[0] == stat.st_size and row[1] == stat.st_mtime_ns:
+                self._touch(connection, path)
+                return self._decode(path, row[2]), None
+            digest = file_digest(path)
+            row = connection.execute(
+                "SELECT payload FROM entries WHERE digest = ? AND size = ? ORDER BY accessed DESC LIMIT 1", (digest, stat.st_size)
+            ).fetchone()
+            if row is None:
+                return None, digest
+            summary = self._decode(path, row[0])
+            with connection:
+                connection.execute(
+                    "INSERT OR REPLACE INTO entries VALUES (?, ?, ?, ?, ?, ?, ?)",
+                    (str(path), stat.st_size, stat.st_mtime_ns, digest, row[0], len(row[0]), time.time()),
+                )
+            return summary, digest
+        except (sqlite3.Error, OSError, ValueError, TypeError):
+            self._disable()
+            return None, None
+
+    def _touch(self, connection: sqlite3.Connection, path: Path) -> None:
+        with connection:
+            connection.execute("UPDATE entries SET accessed = ? WHERE path = ?", (time.time(), str(path)))
+
+    @staticmethod
+    def _decode(path: Path, payload: str) -> WorkbookSummary:
+        return WorkbookSummary.from_dict(path, json.loads(payload))
+
+    def _evict(self, connection: sqlite3.Connection) -> None:
+        (total,) = connection.execute("SELECT COALESCE(SUM(payload_size), 0) FROM entries").fetchone()
+        if total <= self.max_bytes:
+            return
+        doomed = []
+        for path, size in connection.execute("SELECT path, payload_size FROM entries ORDER BY accessed"):
+            if total <= self.max_bytes:
+                break
+            doomed.append((path,))
+            total -= size
+        connection.executemany("DELETE FROM entries WHERE path = ?", doomed)
+
+    def _connect(self) -> Optional[sqlite3.Connection]:
+        if self._disabled:
+            return None
+        if self._connection is not None:
+            return self._connection
+        try:
+            self.directory.mkdir(parents=True, exist_ok=True)
+            connection = sqlite3.connect(self.database, timeout=5.0)
+            connection.execute("PRAGMA journal_mode=WAL")
+            (version,) = connection.execute("PRAGMA user_version").fetchone()
+            if version != SCHEMA_VERSION:
+                connection.executescript("DROP TABLE IF EXISTS entries;")
+                connection.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+            connection.executescript(_SCHEMA)
+        except (sqlite3.Error, OSError):
+            self._disable()
+            return None
+        self._connection = connection
+        return connection
+
+    def _disable(self) -> None:
+        self.close()
+        self._disabled = True
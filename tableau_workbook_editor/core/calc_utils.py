@@ -1,56 +1,617 @@
-"""Utilities for working with Tableau calculations."""
+"""Utilities for working with Tableau calculations.
+
+Formulas are tokenised and parsed into a small AST by :func:`parse_calculation`.
+Parsing is memoised in a bounded LRU cache keyed by the formula text, so
+workbooks with many identical calculations parse each distinct formula once
+and linting, reference extraction and renames all share that parse.
+"""
 from __future__ import annotations
 
-from dataclasses import dataclass
-from typing import Iterable, Set
+import re
+from dataclasses import dataclass, field
+from functools import lru_cache
+from typing import Iterator, List, Mapping, Optional, Set, Tuple
 
+#: Maximum number of distinct formulas kept by the parse cache.
+PARSE_CACHE_SIZE = 4096
 
-KNOWN_FUNCTIONS: Set[str] = {
-    "sum",
-    "avg",
-    "min",
-    "max",
-    "lookup",
-    "running_sum",
-    "zn",
+KEYWORDS: Set[str] = {
     "if",
     "then",
     "else",
     "elseif",
     "end",
+    "case",
+    "when",
+    "and",
+    "or",
+    "not",
+    "in",
+    "true",
+    "false",
+    "null",
+    "fixed",
+    "include",
+    "exclude",
+}
+
+KNOWN_FUNCTIONS: Set[str] = {
+    # aggregates
+    "sum", "avg", "min", "max", "count", "countd", "median", "attr", "stdev", "stdevp", "var", "varp",
+    "percentile", "collect", "corr", "covar", "covarp",
+    # logical
+    "iif", "ifnull", "isnull", "zn", "isdate",
+    # number
+    "abs", "acos", "asin", "atan", "atan2", "ceiling", "cos", "cot", "degrees", "div", "exp", "floor",
+    "hexbinx", "hexbiny", "ln", "log", "pi", "power", "radians", "round", "sign", "sin", "sqrt", "square",
+    "tan",
+    # string
+    "ascii", "char", "contains", "endswith", "find", "findnth", "left", "len", "lower", "ltrim", "mid",
+    "proper", "regexp_extract", "regexp_extract_nth", "regexp_match", "regexp_replace", "replace", "right",
+    "rtrim", "space", "split", "startswith", "trim", "upper",
+    # date
+    "dateadd", "datediff", "datename", "dateparse", "datepart", "datetrunc", "day", "isoquarter", "isoweek",
+    "isoweekday", "isoyear", "makedate", "makedatetime", "maketime", "month", "now", "quarter", "today",
+    "week", "year",
+    # type conversion
+    "date", "datetime", "float", "int", "str", "makepoint", "makeline", "buffer", "distance",
+    # user
+    "fullname", "ismemberof", "username", "userdomain", "isfullname", "isusername",
+    # table calculations
+    "first", "index", "last", "lookup", "previous_value", "rank", "rank_dense", "rank_modified",
+    "rank_percentile", "rank_unique", "running_avg", "running_count", "running_max", "running_min",
+    "running_sum", "size", "total", "window_avg", "window_corr", "window_count", "window_covar",
+    "window_covarp", "window_max", "window_median", "window_min", "window_percentile", "window_stdev",
+    "window_stdevp", "window_sum", "window_var", "window_varp",
+    # pass-through
+    "rawsql_bool", "rawsql_date", "rawsql_datetime", "rawsql_int", "rawsql_real", "rawsql_str",
+    "rawsqlagg_bool", "rawsqlagg_date", "rawsqlagg_datetime", "rawsqlagg_int", "rawsqlagg_real",
+    "rawsqlagg_str",
+    # analytics extensions
+    "script_bool", "script_int", "script_real", "script_str", "model_percentile", "model_quantile",
+}  # fmt: skip
+
+_TOKEN_PATTERN = re.compile(
+    r"""
+     (?P<whitespace>\s+)
+    |(?P<comment>//[^\n]*|/\*.*?\*/)
+    |(?P<field>\[(?:[^\]]|\]\])*\])
+    |(?P<string>'(?:[^']|'')*'|"(?:[^"]|"")*")
+    |(?P<date>\#[^#\n]*\#)
+    |(?P<number>(?:\d+\.?\d*|\.\d+)(?:[eE][+-]?\d+)?)
+    |(?P<ident>[A-Za-z_][A-Za-z0-9_]*)
+    |(?P<op><=|>=|<>|!=|==|&&|\|\||[-+*/%^=<>!])
+    |(?P<punct>[(),{}:.])
+    """,
+    re.DOTALL | re.VERBOSE,
+)
+
+# Messages for characters that cannot start a token.
+_UNTERMINATED = {
+    "[": "Unbalanced field brackets",
+    "]": "Unbalanced field brackets",
+    "'": "Unterminated string literal",
+    '"': "Unterminated string literal",
+    "#": "Unterminated date literal",
 }
 
 
+class CalculationSyntaxError(ValueError):
+    """Raised when a formula cannot be tokenised or parsed."""
+
+    def __init__(self, message: str, position: int) -> None:
+        super().__init__(message)
+        self.message = message
+        self.position = position
+
+
+@dataclass(frozen=True)
+class Token:
+    kind: str
+    value: str
+    start: int
+    end: int
+
+
+def tokenize(formula: str) -> List[Token]:
+    """Split *formula* into tokens, dropping whitespace but keeping comments."""
+
+    tokens: List[Token] = []
+    position = 0
+    length = len(formula)
+    while position < length:
+        match = _TOKEN_PATTERN.match(formula, position)
+        if match is None:
+            char = formula[position]
+            raise CalculationSyntaxError(_UNTERMINATED.get(char, f"Unexpected character '{char}'"), position)
+        kind = match.lastgroup or ""
+        if kind == "op" and formula.startswith("/*", position):
+            raise CalculationSyntaxError("Unterminated comment", position)
+        if kind != "whitespace":
+            tokens.append(Token(kind, match.group(0), match.start(), match.end()))
+        position = match.end()
+    return tokens
+
+
+# ----------------------------------------------------------------------
+# AST
+
+
+@dataclass(frozen=True)
+class Node:
+    start: int
+    end: int
+
+    def children(self) -> Tuple["Node", ...]:
+        return ()
+
+
+@dataclass(frozen=True)
+class Literal(Node):
+    kind: str
+    value: str
+
+
+@dataclass(frozen=True)
+class FieldRef(Node):
+    """A field reference; ``name`` is always bracketed (``[Profit]``).
+
+    ``name_start``/``name_end`` locate the field name in the formula (without
+    the qualifier) and ``bracketed`` is ``False`` for bare names like ``Sales``.
+    """
+
+    name: str
+    qualifier: Optional[str]
+    name_start: int
+    name_end: int
+    bracketed: bool = True
+
+    @property
+    def qualified_name(self) -> str:
+        return f"{self.qualifier}.{self.name}" if self.qualifier else self.name
+
+
+@dataclass(frozen=True)
+class FunctionCall(Node):
+    name: str
+    args: Tuple[Node, ...]
+
+    def children(self) -> Tuple[Node, ...]:
+        return self.args
+
+
+@dataclass(frozen=True)
+class UnaryOp(Node):
+    op: str
+    operand: Node
+
+    def children(self) -> Tuple[Node, ...]:
+        return (self.operand,)
+
+
+@dataclass(frozen=True)
+class BinaryOp(Node):
+    op: str
+    left: Node
+    right: Node
+
+    def children(self) -> Tuple[Node, ...]:
+        return (self.left, self.right)
+
+
+@dataclass(frozen=True)
+class InExpr(Node):
+    value: Node
+    options: Tuple[Node, ...]
+
+    def children(self) -> Tuple[Node, ...]:
+        return (self.value,) + self.options
+
+
+@dataclass(frozen=True)
+class IfExpr(Node):
+    branches: Tuple[Tuple[Node, Node], ...]
+    otherwise: Optional[Node]
+
+    def children(self) -> Tuple[Node, ...]:
+        nodes = tuple(node for branch in self.branches for node in branch)
+        return nodes + ((self.otherwise,) if self.otherwise is not None else ())
+
+
+@dataclass(frozen=True)
+class CaseExpr(Node):
+    subject: Node
+    whens: Tuple[Tuple[Node, Node], ...]
+    otherwise: Optional[Node]
+
+    def children(self) -> Tuple[Node, ...]:
+        nodes = (self.subject,) + tuple(node for when in self.whens for node in when)
+        return nodes + ((self.otherwise,) if self.otherwise is not None else ())
+
+
+@dataclass(frozen=True)
+class LodExpr(Node):
+    """A level of detail expression; ``kind`` is ``None`` for ``{ expr }``."""
+
+    kind: Optional[str]
+    dimensions: Tuple[Node, ...]
+    body: Node
+
+    def children(self) -> Tuple[Node, ...]:
+        return self.dimensions + (self.body,)
+
+
+def walk(node: Node) -> Iterator[Node]:
+    """Yield *node* and all of its descendants in source order."""
+
+    stack = [node]
+    while stack:
+        current = stack.pop()
+        yield current
+        stack.extend(reversed(current.children()))
+
+
+# ----------------------------------------------------------------------
+# Parser
+
+_COMPARISON_OPS = {"=", "==", "!=", "<>", "<", ">", "<=", ">="}
+
+
+class _Parser:
+    def __init__(self, tokens: List[Token], length: int) -> None:
+        self.tokens = [token for token in tokens if token.kind != "comment"]
+        self.length = length
+        self.position = 0
+
+    # token helpers ----------------------------------------------------
+    def peek(self) -> Optional[Token]:
+        return self.tokens[self.position] if self.position < len(self.tokens) else None
+
+    def at_keyword(self, *words: str) -> bool:
+        token = self.peek()
+        return token is not None and token.kind == "ident" and token.value.lower() in words
+
+    def at(self, *values: str) -> bool:
+        token = self.peek()
+        return token is not None and token.kind in {"op", "punct"} and token.value in values
+
+    def advance(self) -> Token:
+        token = self.peek()
+        if token is None:
+            raise CalculationSyntaxError("Unexpected end of calculation", self.length)
+        self.position += 1
+        return token
+
+    def expect(self, value: str, message: str) -> Token:
+        if not self.at(value):
+            token = self.peek()
+            raise CalculationSyntaxError(message, token.start if token else self.length)
+        return self.advance()
+
+    def expect_keyword(self, word: str) -> Token:
+        if not self.at_keyword(word):
+            token = self.peek()
+            found = f"'{token.value}'" if token else "end of calculation"
+            raise CalculationSyntaxError(f"Expected {word.upper()} but found {found}", token.start if token else self.length)
+        return self.advance()
+
+    # grammar ----------------------------------------------------------
+    def parse(self) -> Node:
+        node = self.expression()
+        token = self.peek()
+        if token is not None:
+            if token.value == ")":
+                raise CalculationSyntaxError("Unbalanced parentheses", token.start)
+            if token.value == "}":
+                raise CalculationSyntaxError("Unbalanced braces", token.start)
+            raise CalculationSyntaxError(f"Unexpected '{token.value}'", token.start)
+        return node
+
+    def expression(self) -> Node:
+        return self.disjunction()
+
+    def disjunction(self) -> Node:
+        node = self.conjunction()
+        while self.at_keyword("or") or self.at("||"):
+            self.advance()
+            right = self.conjunction()
+            node = BinaryOp(node.start, right.end, "OR", node, right)
+        return node
+
+    def conjunction(self) -> Node:
+        node = self.negation()
+        while self.at_keyword("and") or self.at("&&"):
+            self.advance()
+            right = self.negation()
+            node = BinaryOp(node.start, right.end, "AND", node, right)
+        return node
+
+    def negation(self) -> Node:
+        if self.at_keyword("not") or self.at("!"):
+            token = self.advance()
+            operand = self.negation()
+            return UnaryOp(token.start, operand.end, "NOT", operand)
+        return self.comparison()
+
+    def comparison(self) -> Node:
+        node = self.additive()
+        while True:
+            if self.at(*_COMPARISON_OPS):
+                op = self.advance().value
+                right = self.additive()
+                node = BinaryOp(node.start, right.end, op, node, right)
+            elif self.at_keyword("in"):
+                self.advance()
+                self.expect("(", "Expected '(' after IN")
+                options = self.arguments()
+                close = self.expect(")", "Unbalanced parentheses")
+                node = InExpr(node.start, close.end, node, options)
+            else:
+                return node
+
+    def additive(self) -> Node:
+        node = self.multiplicative()
+        while self.at("+", "-"):
+            op = self.advance().value
+            right = self.multiplicative()
+            node = BinaryOp(node.start, right.end, op, node, right)
+        return node
+
+    def multiplicative(self) -> Node:
+        node = self.unary()
+        while self.at("*", "/", "%"):
+            op = self.advance().value
+            right = self.unary()
+            node = BinaryOp(node.start, right.end, op, node, right)
+        return node
+
+    def unary(self) -> Node:
+        if self.at("-", "+"):
+            token = self.advance()
+            operand = self.unary()
+            return UnaryOp(token.start, operand.end, token.value, operand)
+        return self.power()
+
+    def power(self) -> Node:
+        node = self.primary()
+        if self.at("^"):
+            self.advance()
+            right = self.unary()
+            node = BinaryOp(node.start, right.end, "^", node, right)
+        return node
+
+    def primary(self) -> Node:
+        token = self.peek()
+        if token is None:
+            raise CalculationSyntaxError("Unexpected end of calculation", self.length)
+        if token.kind in {"number", "string", "date"}:
+            self.advance()
+            return Literal(token.start, token.end, token.kind, token.value)
+        if token.kind == "field":
+            return self.field_reference()
+        if token.kind == "ident":
+            word = token.value.lower()
+            if word == "if":
+                return self.if_expression()
+            if word == "case":
+                return self.case_expression()
+            if word in {"true", "false", "null"}:
+                self.advance()
+                return Literal(token.start, token.end, "boolean" if word != "null" else "null", token.value)
+            if word in KEYWORDS:
+                raise CalculationSyntaxError(f"Unexpected keyword '{token.value}'", token.start)
+            self.advance()
+            if self.at("("):
+                self.advance()
+                args = self.arguments()
+                close = self.expect(")", "Unbalanced parentheses")
+                return FunctionCall(token.start, close.end, token.value, args)
+            # Tableau accepts single-word field names without brackets.
+            return FieldRef(token.start, token.end, f"[{token.value}]", None, token.start, token.end, bracketed=False)
+        if token.value == "(":
+            self.advance()
+            node = self.expression()
+            self.expect(")", "Unbalanced parentheses")
+            return node
+        if token.value == "{":
+            return self.lod_expression()
+        if token.value == ")":
+            raise CalculationSyntaxError("Unbalanced parentheses", token.start)
+        raise CalculationSyntaxError(f"Unexpected '{token.value}'", token.start)
+
+    def arguments(self) -> Tuple[Node, ...]:
+        if self.at(")"):
+            return ()
+        args = [self.expression()]
+        while self.at(","):
+            self.advance()
+            args.append(self.expression())
+        return tuple(args)
+
+    def field_reference(self) -> FieldRef:
+        first = self.advance()
+        if self.at("."):
+            following = self.tokens[self.position + 1] if self.position + 1 < len(self.tokens) else None
+            if following is not None and following.kind == "field":
+                self.advance()
+                name = self.advance()
+                return FieldRef(first.start, name.end, name.value, first.value, name.start, name.end)
+        return FieldRef(first.start, first.end, first.value, None, first.start, first.end)
+
+    def if_expression(self) -> IfExpr:
+        start = self.advance().start
+        branches = []
+        condition = self.expression()
+        self.expect_keyword("then")
+        branches.append((condition, self.expression()))
+        while self.at_keyword("elseif"):
+            self.advance()
+            condition = self.expression()
+            self.expect_keyword("then")
+            branches.append((condition, self.expression()))
+        otherwise = None
+        if self.at_keyword("else"):
+            self.advance()
+            otherwise = self.expression()
+        end = self.expect_keyword("end")
+        return IfExpr(start, end.end, tuple(branches), otherwise)
+
+    def case_expression(self) -> CaseExpr:
+        start = self.advance().start
+        subject = self.expression()
+        whens = []
+        while self.at_keyword("when"):
+            self.advance()
+            match = self.expression()
+            self.expect_keyword("then")
+            whens.append((match, self.expression()))
+        if not whens:
+            token = self.peek()
+            raise CalculationSyntaxError("CASE requires at least one WHEN", token.start if token else self.length)
+        otherwise = None
+        if self.at_keyword("else"):
+            self.advance()
+            otherwise = self.expression()
+        end = self.expect_keyword("end")
+        return CaseExpr(start, end.end, subject, tuple(whens), otherwise)
+
+    def lod_expression(self) -> LodExpr:
+        start = self.advance().start
+        kind = None
+        dimensions: Tuple[Node, ...] = ()
+        if self.at_keyword("fixed", "include", "exclude"):
+            kind = self.advance().value.upper()
+            if not self.at(":"):
+                dimensions = self.arguments()
+            self.expect(":", f"Expected ':' in {kind} expression")
+        body = self.expression()
+        end = self.expect("}", "Unbalanced braces")
+        return LodExpr(start, end.end, kind, dimensions, body)
+
+
+@dataclass(frozen=True)
+class ParsedCalculation:
+    """Result of :func:`parse_calculation`; shared between callers, so immutable."""
+
+    formula: str
+    tokens: Tuple[Token, ...] = ()
+    ast: Optional[Node] = None
+    error: Optional[str] = None
+    error_position: Optional[int] = None
+    references: Tuple[FieldRef, ...] = ()
+    functions: Tuple[str, ...] = field(default=())
+
+    @property
+    def ok(self) -> bool:
+        return self.error is None
+
+
+@lru_cache(maxsize=PARSE_CACHE_SIZE)
+def parse_calculation(formula: str) -> ParsedCalculation:
+    """Tokenise and parse *formula*, memoised by formula text."""
+
+    try:
+        tokens = tokenize(formula)
+    except CalculationSyntaxError as exc:
+        return ParsedCalculation(formula, error=exc.message, error_position=exc.position)
+    if not any(token.kind != "comment" for token in tokens):
+        return ParsedCalculation(formula, tokens=tuple(tokens))
+    try:
+        ast = _Parser(tokens, len(formula)).parse()
+    except CalculationSyntaxError as exc:
+        return ParsedCalculation(formula, tokens=tuple(tokens), error=exc.message, error_position=exc.position)
+    nodes = list(walk(ast))
+    return ParsedCalculation(
+        formula,
+        tokens=tuple(tokens),
+        ast=ast,
+        references=tuple(node for node in nodes if isinstance(node, FieldRef)),
+        functions=tuple(node.name for node in nodes if isinstance(node, FunctionCall)),
+    )
+
+
+def clear_parse_cache() -> None:
+    parse_calculation.cache_clear()
+
+
+def parse_cache_info() -> Tuple[int, int, Optional[int], int]:
+    """Return ``(hits, misses, maxsize, currsize)`` of the parse cache."""
+
+    return tuple(parse_calculation.cache_info())  # type: ignore[return-value]
+
+
+# ----------------------------------------------------------------------
+# Linting, references and renames
+
+
 @dataclass
 class CalculationLintResult:
     ok: bool
     message: str = ""
+    warnings: List[str] = field(default_factory=list)
 
 
 def lint_calculation(formula: str) -> CalculationLintResult:
-    stack = []
-    for char in formula:
-        if char in "(":
-            stack.append(char)
-        elif char == ")":
-            if not stack:
-                return CalculationLintResult(False, "Unbalanced parentheses")
-            stack.pop()
-    if stack:
-        return CalculationLintResult(False, "Unbalanced parentheses")
-    bracket_stack = 0
-    escaped = False
-    for char in formula:
-        if char == "'" and not escaped:
-            escaped = True
-        elif char == "'" and escaped:
-            escaped = False
-        elif char == "[" and not escaped:
-            bracket_stack += 1
-        elif char == "]" and not escaped:
-            bracket_stack -= 1
-            if bracket_stack < 0:
-                return CalculationLintResult(False, "Unbalanced field brackets")
-    if bracket_stack != 0:
-        return CalculationLintResult(False, "Unbalanced field brackets")
-    return CalculationLintResult(True, "")
+    parsed = parse_calculation(formula)
+    if parsed.error is not None:
+        return CalculationLintResult(False, parsed.error)
+    unknown = sorted({name for name in parsed.functions if name.lower() not in KNOWN_FUNCTIONS})
+    return CalculationLintResult(True, "", [f"Unknown function '{name}'" for name in unknown])
+
+
+def extract_references(formula: str) -> List[str]:
+    """Return the field names referenced by *formula*, qualified where written so.
+
+    Falls back to the bracketed field tokens when the formula does not parse,
+    and to an empty list when it cannot even be tokenised.
+    """
+
+    parsed = parse_calculation(formula)
+    if parsed.ast is not None:
+        return [reference.qualified_name for reference in parsed.references]
+    return [token.value for token in parsed.tokens if token.kind == "field"]
+
+
+def referenced_field_names(formula: str) -> Set[str]:
+    """Return the bracketed field names (without qualifiers) used by *formula*."""
+
+    parsed = parse_calculation(formula)
+    if parsed.ast is not None:
+        return {reference.name for reference in parsed.references}
+    return {token.value for token in parsed.tokens if token.kind == "field"}
+
+
+def rename_references(formula: str, renames: Mapping[str, str], qualifier: Optional[str] = None) -> str:
+    """Rewrite field references of *formula* according to *renames*.
+
+    *renames* maps bracketed old names to bracketed new names and all
+    replacements apply simultaneously. Only real references are rewritten:
+    text inside string literals and comments is left alone. Qualified
+    references (``[ds].[field]``) are renamed only when their qualifier equals
+    *qualifier*. Formulas that do not parse fall back to rewriting bracketed
+    field tokens; formulas that cannot be tokenised are returned unchanged.
+    """
+
+    parsed = parse_calculation(formula)
+    spans: List[Tuple[int, int, str]] = []
+    if parsed.ast is not None:
+        for reference in parsed.references:
+            if reference.qualifier is not None and reference.qualifier != qualifier:
+                continue
+            new = renames.get(reference.name)
+            if new is not None:
+                spans.append((reference.name_start, reference.name_end, new))
+    else:
+        for token in parsed.tokens:
+            if token.kind == "field" and token.value in renames:
+                spans.append((token.start, token.end, renames[token.value]))
+    if not spans:
+        return formula
+    pieces: List[str] = []
+    cursor = 0
+    for start, end, new in sorted(spans):
+        pieces.append(formula[cursor:start])
+        pieces.append(new)
+        cursor = end
+    pieces.append(formula[cursor:])
+    return "".join(pieces)
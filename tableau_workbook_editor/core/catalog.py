@@ -0,0 +1,278 @@
+"""Searchable catalog of many workbooks.
+
+A :class:`Catalog` stores one row per workbook and one row per datasource,
+connection, column, calculation, worksheet, dashboard and parameter in a
+SQLite database. An FTS5 index covers their names, datasources and details
+(captions, connection attributes, formulas), so questions such as "which
+workbooks use ``[Net Revenue]``" are answered without opening any workbook.
+
+:meth:`Catalog.build` crawls a directory and re-indexes only the workbooks
+whose size or modification time changed since the last build. Extraction runs
+on a process pool; the catalog is written from the calling process only.
+"""
+from __future__ import annotations
+
+import os
+import sqlite3
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import asdict, dataclass, field
+from pathlib import Path
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+from . import dashboards, datasources, parameters, worksheets
+from .cache import default_cache_dir
+from .fleet import WORKBOOK_SUFFIXES
+from .xml_utils import xpath
+
+CATALOG_NAME = "catalog.sqlite3"
+ITEM_KINDS = ("datasource", "connection", "column", "calculation", "worksheet", "dashboard", "parameter")
+#: ``<connection>`` attributes copied into the searchable detail of a connection.
+CONNECTION_ATTRIBUTES = ("class", "server", "port", "dbname", "schema", "table", "filename", "username")
+# Bump when the schema or the extracted items change; the catalog is then rebuilt.
+SCHEMA_VERSION = 1
+_COMMIT_EVERY = 200
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS workbooks (
+    id INTEGER PRIMARY KEY,
+    path TEXT NOT NULL UNIQUE,
+    size INTEGER NOT NULL,
+    mtime_ns INTEGER NOT NULL,
+    error TEXT
+);
+CREATE TABLE IF NOT EXISTS items (
+    id INTEGER PRIMARY KEY,
+    workbook_id INTEGER NOT NULL,
+    kind TEXT NOT NULL,
+    datasource TEXT NOT NULL,
+    name TEXT NOT NULL,
+    detail TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS items_workbook ON items (workbook_id);
+CREATE VIRTUAL TABLE IF NOT EXISTS items_fts USING fts5 (datasource, name, detail, content='items', content_rowid='id');
+CREATE TRIGGER IF NOT EXISTS items_insert AFTER INSERT ON items BEGIN
+    INSERT INTO items_fts (rowid, datasource, name, detail) VALUES (new.id, new.datasource, new.name, new.detail);
+END;
+CREATE TRIGGER IF NOT EXISTS items_delete AFTER DELETE ON items BEGIN
+    INSERT INTO items_fts (items_fts, rowid, datasource, name, detail) VALUES ('delete', old.id, old.datasource, old.name, old.detail);
+END;
+"""
+
+#: ``(kind, datasource, name, detail)``
+Item = Tuple[str, str, str, str]
+
+
+@dataclass
+class CatalogHit:
+    """One indexed item matching a search."""
+
+    path: str
+    kind: str
+    datasource: str
+    name: str
+    detail: str
+
+    def to_dict(self) -> Dict[str, str]:
+        return asdict(self)
+
+
+@dataclass
+class BuildStats:
+    """What :meth:`Catalog.build` did."""
+
+    indexed: int = 0
+    unchanged: int = 0
+    removed: int = 0
+    #: ``(path, error)`` for workbooks that could not be read.
+    failed: List[Tuple[str, str]] = field(default_factory=list)
+
+    def to_dict(self) -> Dict[str, object]:
+        return {
+            "indexed": self.indexed,
+            "unchanged": self.unchanged,
+            "removed": self.removed,
+            "failed": [{"path": path, "error": error} for path, error in self.failed],
+        }
+
+
+def extract_items(path: Path) -> List[Item]:
+    """Return the catalog items of the workbook at *path*."""
+
+    from .reader import open_workbook
+
+    root = open_workbook(path).root
+    items: List[Item] = []
+    for ds in xpath(root, datasources.DATASOURCES_XPATH):
+        ds_name = ds.get("name") or ds.get("caption") or ""
+        items.append(("datasource", ds_name, ds_name, ds.get("caption") or ""))
+        for connection in datasources.list_connections(ds):
+            target = connection.get("server") or connection.get("filename") or connection.get("class") or ""
+            detail = " ".join(f"{key}={connection.get(key)}" for key in CONNECTION_ATTRIBUTES if connection.get(key))
+            items.append(("connection", ds_name, target, detail))
+        for column in datasources.list_columns(ds):
+            calculation = column.find("calculation")
+            formula = calculation.get("formula") if calculation is not None else None
+            if formula:
+                items.append(("calculation", ds_name, datasources.column_label(column), formula))
+            else:
+                items.append(("column", ds_name, datasources.column_label(column), column.get("name") or ""))
+    items.extend(("worksheet", "", name, "") for name in worksheets.list_worksheets(root))
+    items.extend(("dashboard", "", name, "") for name in dashboards.list_dashboards(root))
+    for parameter in xpath(root, parameters.PARAMETERS_XPATH):
+        items.append(("parameter", "", parameter.get("name") or "", parameter.get("current-value") or ""))
+    return items
+
+
+def _extract(path: str) -> Tuple[str, List[Item], Optional[str]]:
+    """Pool worker: ``(path, items, error)``; never raises."""
+
+    try:
+        return path, extract_items(Path(path)), None
+    except Exception as exc:  # noqa: BLE001 - failures are reported per file
+        return path, [], f"{type(exc).__name__}: {exc}"
+
+
+def match_expression(query: str) -> str:
+    """Quote *query* as an FTS5 phrase, so ``[Net Revenue]`` matches the words ``net revenue``."""
+
+    return '"' + query.replace('"', '""') + '"'
+
+
+class Catalog:
+    """SQLite catalog of the workbooks under one or more directories."""
+
+    def __init__(self, database: Optional[Path] = None) -> None:
+        self.database = database if database is not None else default_cache_dir() / CATALOG_NAME
+        self._connection: Optional[sqlite3.Connection] = None
+
+    def __enter__(self) -> "Catalog":
+        return self
+
+    def __exit__(self, *exc_info: object) -> None:
+        self.close()
+
+    def close(self) -> None:
+        if self._connection is not None:
+            self._connection.close()
+            self._connection = None
+
+    # ------------------------------------------------------------------
+    def build(self, directory: Path, *, jobs: Optional[int] = None) -> BuildStats:
+        """Index the workbooks under *directory* that are new or changed, and drop deleted ones.
+
+        ``jobs=1`` extracts in the current process; otherwise a process pool
+        with *jobs* workers (default: one per CPU) is used.
+        """
+
+        connection = self._connect()
+        root = directory.expanduser().resolve()
+        found = {str(path): signature for path, signature in _crawl(root)}
+        prefix = str(root).rstrip(os.sep) + os.sep
+        known = {
+            path: (workbook_id, (size, mtime_ns))
+            for workbook_id, path, size, mtime_ns in connection.execute(
+                "SELECT id, path, size, mtime_ns FROM workbooks WHERE path >= ? AND path < ?", (prefix, prefix[:-1] + chr(ord(os.sep) + 1))
+            )
+        }
+        stats = BuildStats()
+        with connection:
+            for path, (workbook_id, _) in known.items():
+                if path not in found:
+                    self._remove(connection, workbook_id)
+                    stats.removed += 1
+        stale = [path for path, signature in found.items() if path not in known or known[path][1] != signature]
+        stats.unchanged = len(found) - len(stale)
+        pending = 0
+        for path, items, error in _extract_all(stale, jobs):
+            size, mtime_ns = found[path]
+            self._store(connection, path, size, mtime_ns, items, error)
+            if error is None:
+                stats.indexed += 1
+            else:
+                stats.failed.append((path, error))
+            pending += 1
+            if pending >= _COMMIT_EVERY:
+                connection.commit()
+                pending = 0
+        connection.commit()
+        return stats
+
+    def search(self, query: str, *, kind: Optional[str] = None, limit: int = 50) -> List[CatalogHit]:
+        """Return the items whose name, datasource or detail contain the words of *query*, best first."""
+
+        if kind is not None and kind not in ITEM_KINDS:
+            raise ValueError(f"Unknown kind '{kind}'; expected one of {', '.join(ITEM_KINDS)}")
+        sql = (
+            "SELECT w.path, i.kind, i.datasource, i.name, i.detail FROM items_fts"
+            " JOIN items i ON i.id = items_fts.rowid JOIN workbooks w ON w.id = i.workbook_id"
+            " WHERE items_fts MATCH ?"
+        )
+        arguments: List[object] = [match_expression(query)]
+        if kind is not None:
+            sql += " AND i.kind = ?"
+            arguments.append(kind)
+        sql += " ORDER BY rank, w.path LIMIT ?"
+        arguments.append(limit)
+        return [CatalogHit(*row) for row in self._connect().execute(sql, arguments)]
+
+    def __len__(self) -> int:
+        (count,) = self._connect().execute("SELECT COUNT(*) FROM workbooks").fetchone()
+        return count
+
+    # ------------------------------------------------------------------
+    @staticmethod
+    def _remove(connection: sqlite3.Connection, workbook_id: int) -> None:
+        connection.execute("DELETE FROM items WHERE workbook_id = ?", (workbook_id,))
+        connection.execute("DELETE FROM workbooks WHERE id = ?", (workbook_id,))
+
+    @staticmethod
+    def _store(connection: sqlite3.Connection, path: str, size: int, mtime_ns: int, items: List[Item], error: Optional[str]) -> None:
+        row = connection.execute("SELECT id FROM workbooks WHERE path = ?", (path,)).fetchone()
+        if row is None:
+            workbook_id = connection.execute(
+                "INSERT INTO workbooks (path, size, mtime_ns, error) VALUES (?, ?, ?, ?)", (path, size, mtime_ns, error)
+            ).lastrowid
+        else:
+            workbook_id = row[0]
+            connection.execute("DELETE FROM items WHERE workbook_id = ?", (workbook_id,))
+            connection.execute("UPDATE workbooks SET size = ?, mtime_ns = ?, error = ? WHERE id = ?", (size, mtime_ns, error, workbook_id))
+        connection.executemany(
+            "INSERT INTO items (workbook_id, kind, datasource, name, detail) VALUES (?, ?, ?, ?, ?)",
+            [(workbook_id, *item) for item in items],
+        )
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._connection is not None:
+            return self._connection
+        self.database.parent.mkdir(parents=True, exist_ok=True)
+        connection = sqlite3.connect(self.database, timeout=5.0)
+        connection.execute("PRAGMA journal_mode=WAL")
+        (version,) = connection.execute("PRAGMA user_version").fetchone()
+        if version != SCHEMA_VERSION:
+            connection.executescript(
+                "DROP TABLE IF EXISTS items_fts; DROP TABLE IF EXISTS items; DROP TABLE IF EXISTS workbooks;"
+            )
+            connection.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+        connection.executescript(_SCHEMA)
+        self._connection = connection
+        return connection
+
+
+def _crawl(root: Path) -> Iterator[Tuple[Path, Tuple[int, int]]]:
+    for path in sorted(root.rglob("*")):
+        if path.suffix.lower() in WORKBOOK_SUFFIXES and path.is_file():
+            stat = path.stat()
+            yield path, (stat.st_size, stat.st_mtime_ns)
+
+
+def _extract_all(paths: List[str], jobs: Optional[int]) -> Iterable[Tuple[str, List[Item], Optional[str]]]:
+    if jobs == 1 or len(paths) <= 1:
+        return map(_extract, paths)
+    workers = jobs or os.cpu_count() or 1
+    return _pooled(paths, workers)
+
+
+def _pooled(paths: List[str], workers: int) -> Iterator[Tuple[str, List[Item], Optional[str]]]:
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        # Chunks amortise the inter-process round trips over thousands of small files.
+        yield from pool.map(_extract, paths, chunksize=max(1, len(paths) // (workers * 8)))
@@ -0,0 +1,200 @@
+"""Rule-based rewriting of datasource connections.
+
+A :class:`ConnectionRule` replaces a regular expression in one attribute
+(``server``, ``dbname``, ``schema``, ``table``, ``port``, ``username``, ...)
+of the ``<connection>`` elements of every datasource, including the
+connections nested in federated ``<named-connections>``. Rules on ``table``
+also apply to ``<relation>`` elements, which hold the tables of federated
+datasources. Rules are compiled when they are parsed, and
+:func:`rewrite_connections` visits each connection and relation once, applying
+in order the rules for the attributes that element has.
+"""
+from __future__ import annotations
+
+import json
+import re
+from collections import defaultdict
+from dataclasses import asdict, dataclass, field
+from pathlib import Path
+from typing import Any, Dict, Iterable, Iterator, List, Mapping, Optional, Pattern, Tuple
+
+from .datasources import DATASOURCES_XPATH
+from .xml_utils import LXML_AVAILABLE, Element, xpath
+
+#: Attributes that rules commonly target; any other attribute name is accepted too.
+CONNECTION_ATTRIBUTES = ("server", "port", "dbname", "schema", "table", "username", "class", "filename", "warehouse")
+REWRITTEN_TAGS = ("connection", "relation")
+#: The only attributes rewritten on ``<relation>`` elements.
+RELATION_ATTRIBUTES = frozenset({"table"})
+
+_RULE_KEYS = frozenset({"attribute", "pattern", "replacement", "datasource", "class"})
+_ATTRIBUTE_NAME = re.compile(r"^[A-Za-z_][\w.-]*$")
+
+
+@dataclass(frozen=True)
+class ConnectionRule:
+    """Replace *pattern* with *replacement* (``re.sub`` syntax) in *attribute*.
+
+    *datasource* restricts the rule to datasources whose name or caption
+    matches that pattern; *connection_class* restricts it to ``<connection>``
+    elements of that ``class``.
+    """
+
+    attribute: str
+    pattern: Pattern[str]
+    replacement: str
+    datasource: Optional[Pattern[str]] = None
+    connection_class: Optional[str] = None
+
+    @classmethod
+    def from_mapping(cls, index: int, item: Mapping[str, Any]) -> "ConnectionRule":
+        if not isinstance(item, Mapping):
+            raise ValueError(f"Rule {index + 1}: expected a mapping")
+        unknown = set(item) - _RULE_KEYS
+        if unknown:
+            raise ValueError(f"Rule {index + 1}: unknown key(s) {', '.join(sorted(unknown))}")
+        missing = [key for key in ("attribute", "pattern", "replacement") if item.get(key) is None]
+        if missing:
+            raise ValueError(f"Rule {index + 1}: missing {', '.join(missing)}")
+        attribute = str(item["attribute"])
+        if not _ATTRIBUTE_NAME.match(attribute):
+            raise ValueError(f"Rule {index + 1}: invalid attribute name '{attribute}'")
+        try:
+            pattern = re.compile(str(item["pattern"]))
+            datasource = re.compile(str(item["datasource"])) if item.get("datasource") is not None else None
+            replacement = str(item["replacement"])
+            # Fails on group references the pattern does not define.
+            pattern.sub(replacement, "")
+        except re.error as exc:
+            raise ValueError(f"Rule {index + 1}: {exc}") from None
+        connection_class = str(item["class"]) if item.get("class") is not None else None
+        return cls(attribute, pattern, replacement, datasource, connection_class)
+
+    def applies_to(self, element: Element) -> bool:
+        return self.connection_class is None or (element.tag == "connection" and element.get("class") == self.connection_class)
+
+    def to_dict(self) -> Dict[str, Any]:
+        data: Dict[str, Any] = {"attribute": self.attribute, "pattern": self.pattern.pattern, "replacement": self.replacement}
+        if self.datasource is not None:
+            data["datasource"] = self.datasource.pattern
+        if self.connection_class is not None:
+            data["class"] = self.connection_class
+        return data
+
+
+@dataclass
+class ConnectionChange:
+    datasource: str
+    #: ``"connection"`` or ``"relation"``.
+    element: str
+    attribute: str
+    before: str
+    after: str
+
+    def describe(self) -> str:
+        return f"{self.datasource}: {self.element} {self.attribute} '{self.before}' -> '{self.after}'"
+
+    def to_dict(self) -> Dict[str, str]:
+        return asdict(self)
+
+
+@dataclass
+class RewriteReport:
+    """What :func:`rewrite_connections` changed, in document order."""
+
+    changes: List[ConnectionChange] = field(default_factory=list)
+    #: Connections and relations visited.
+    visited: int = 0
+
+    def __bool__(self) -> bool:
+        return bool(self.changes)
+
+    def by_datasource(self) -> Dict[str, List[ConnectionChange]]:
+        grouped: Dict[str, List[ConnectionChange]] = {}
+        for change in self.changes:
+            grouped.setdefault(change.datasource, []).append(change)
+        return grouped
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "visited": self.visited,
+            "changed": len(self.changes),
+            "datasources": {name: [change.to_dict() for change in changes] for name, changes in self.by_datasource().items()},
+        }
+
+
+def parse_rules(items: Iterable[Mapping[str, Any] | ConnectionRule]) -> List[ConnectionRule]:
+    return [item if isinstance(item, ConnectionRule) else ConnectionRule.from_mapping(index, item) for index, item in enumerate(items)]
+
+
+def load_rules(path: Path) -> List[ConnectionRule]:
+    """Read rules from a JSON or YAML file holding a list of rules or a mapping with a ``rules`` list.
+
+    Unreadable files and invalid rules raise ``ValueError``.
+    """
+
+    text = path.read_text(encoding="utf-8")
+    if path.suffix.lower() in {".yaml", ".yml"}:
+        try:
+            import yaml  # type: ignore
+        except ImportError:  # pragma: no cover - optional dependency
+            raise ValueError(f"{path}: reading YAML rule files requires PyYAML (pip install tableau_workbook_editor[yaml])") from None
+        try:
+            data = yaml.safe_load(text)
+        except yaml.YAMLError as exc:
+            raise ValueError(f"{path}: invalid YAML: {exc}") from None
+    else:
+        try:
+            data = json.loads(text)
+        except ValueError as exc:
+            raise ValueError(f"{path}: invalid JSON: {exc}") from None
+    if isinstance(data, Mapping):
+        data = data.get("rules")
+    if not isinstance(data, list):
+        raise ValueError(f"{path}: expected a list of rules")
+    return parse_rules(data)
+
+
+def rewrite_connections(root: Element, rules: Iterable[Mapping[str, Any] | ConnectionRule]) -> Tuple[RewriteReport, List[Element]]:
+    """Apply *rules* to every connection and relation of every datasource under *root*.
+
+    Returns the report and the elements that changed.
+    """
+
+    compiled = parse_rules(rules)
+    report = RewriteReport()
+    touched: List[Element] = []
+    for ds in xpath(root, DATASOURCES_XPATH):
+        name = ds.get("name") or ds.get("caption") or ""
+        caption = ds.get("caption") or ""
+        by_attribute: Dict[str, List[ConnectionRule]] = defaultdict(list)
+        for rule in compiled:
+            if rule.datasource is None or rule.datasource.search(name) or (caption and rule.datasource.search(caption)):
+                by_attribute[rule.attribute].append(rule)
+        if not by_attribute:
+            continue
+        for element in _rewritable(ds):
+            report.visited += 1
+            changed = False
+            for attribute, attribute_rules in by_attribute.items():
+                before = element.get(attribute)
+                if before is None or (element.tag == "relation" and attribute not in RELATION_ATTRIBUTES):
+                    continue
+                after = before
+                for rule in attribute_rules:
+                    if rule.applies_to(element):
+                        after = rule.pattern.sub(rule.replacement, after)
+                if after != before:
+                    element.set(attribute, after)
+                    report.changes.append(ConnectionChange(name, element.tag, attribute, before, after))
+                    changed = True
+            if changed:
+                touched.append(element)
+    return report, touched
+
+
+def _rewritable(datasource: Element) -> Iterator[Element]:
+    if LXML_AVAILABLE:
+        # lxml filters by tag in C, skipping the (many) column elements.
+        return datasource.iter(*REWRITTEN_TAGS)
+    return (element for element in datasource.iter() if element.tag in REWRITTEN_TAGS)
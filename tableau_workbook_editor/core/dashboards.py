@@ -3,6 +3,7 @@ from __future__ import annotations
 
 from typing import List, Optional
 
+from .layouts import list_layout_zones
 from .xml_utils import Element, IdRegistry, etree, xpath
 
 
@@ -21,10 +22,9 @@ def find_dashboard(root: Element, name: str) -> Optional[Element]:
 
 
 def list_dashboard_zones(dashboard: Element) -> List[Element]:
-    zones_parent = dashboard.find("zones")
-    if zones_parent is None:
-        return []
-    return list(zones_parent)
+    """Return every zone of *dashboard*, including those nested in layout containers."""
+
+    return list_layout_zones(dashboard)
 
 
 def ensure_zones_parent(dashboard: Element) -> Element:
@@ -57,13 +57,3 @@ def append_sheet_zone(dashboard: Element, sheet_name: str, registry: IdRegistry,
         zones_parent.insert(index, zone)
     return zone
 
-
-def update_zone_geometry(zone: Element, *, x: Optional[int] = None, y: Optional[int] = None, w: Optional[int] = None, h: Optional[int] = None) -> None:
-    if x is not None:
-        zone.set("x", str(x))
-    if y is not None:
-        zone.set("y", str(y))
-    if w is not None:
-        zone.set("w", str(w))
-    if h is not None:
-        zone.set("h", str(h))
@@ -1,7 +1,7 @@
 """Datasource helpers."""
 from __future__ import annotations
 
-from typing import Iterable, List, Optional
+from typing import Dict, Iterable, List, Optional
 
 from .xml_utils import Element, etree, xpath
 
@@ -24,6 +24,14 @@ def list_columns(datasource: Element) -> List[Element]:
     return list(xpath(datasource, "./column"))
 
 
+def column_label(column: Element) -> str:
+    return column.get("caption") or column.get("name") or ""
+
+
+def list_column_names(datasource: Element) -> List[str]:
+    return [column_label(column) for column in list_columns(datasource)]
+
+
 def find_column(datasource: Element, name: str) -> Optional[Element]:
     for column in list_columns(datasource):
         if column.get("caption") == name or column.get("name") == name or column.get("name") == f"[{name}]":
@@ -33,6 +41,26 @@ def find_column(datasource: Element, name: str) -> Optional[Element]:
     return None
 
 
+def index_columns(datasource: Element) -> Dict[str, Element]:
+    """Map every column name and caption of *datasource* to its first column."""
+
+    lookup: Dict[str, Element] = {}
+    for column in list_columns(datasource):
+        for key in (column.get("caption"), column.get("name")):
+            if key:
+                lookup.setdefault(key, column)
+    return lookup
+
+
+def lookup_column(columns: Dict[str, Element], name: str) -> Optional[Element]:
+    """Resolve *name* in an :func:`index_columns` mapping like :func:`find_column`."""
+
+    column = columns.get(name)
+    if column is None:
+        column = columns.get(f"[{name}]")
+    return column
+
+
 def ensure_column_name(column: Element) -> str:
     name = column.get("name")
     if name:
@@ -43,6 +71,12 @@ def ensure_column_name(column: Element) -> str:
     return formatted
 
 
+def list_connections(datasource: Element) -> List[Element]:
+    """Return every ``<connection>`` of *datasource*, including those nested in federated named connections."""
+
+    return list(datasource.iter("connection"))
+
+
 def update_connection(connection: Element, **attrs: str) -> None:
     for key, value in attrs.items():
         if value is None:
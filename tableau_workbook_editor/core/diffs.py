@@ -1,23 +1,253 @@
-"""Diff helpers for workbook changes."""
+"""Diff helpers for workbook changes.
+
+:func:`diff_trees` compares two element trees structurally. Children are
+matched by a stable identity (see :data:`IDENTITY_ATTRIBUTES`), falling back
+to their position among unnamed siblings of the same tag, so reordering
+worksheets or zones shows up as moves rather than as every line changing.
+Each element is visited once and moves are found with a longest increasing
+subsequence per parent, so the diff runs in near-linear time.
+"""
 from __future__ import annotations
 
-from typing import List
+import bisect
+from dataclasses import asdict, dataclass
+from typing import Any, Dict, List, Optional, Sequence, Tuple
 
 from .xml_utils import Element, etree
 
+CHANGE_KINDS = ("added", "removed", "moved", "attribute-changed", "text-changed")
+
+#: Attributes identifying an element among its siblings, tried in order.
+IDENTITY_ATTRIBUTES: Dict[str, Tuple[str, ...]] = {
+    "datasource": ("name",),
+    "column": ("name", "ref"),
+    "worksheet": ("name",),
+    "dashboard": ("name",),
+    "zone": ("id",),
+    "parameter": ("name",),
+    "action": ("name",),
+    "filter": ("column",),
+    "window": ("name",),
+}
+
+ChildKey = Tuple[object, ...]
+# (parent location, keys of the element and its siblings, index among them); None is the root.
+Location = Optional[Tuple[Any, List[ChildKey], int]]
+
+
+@dataclass(frozen=True)
+class Change:
+    """One difference between two trees.
+
+    ``path`` locates the element in the tree it exists in: the old tree for
+    removals, the new tree otherwise. ``before``/``after`` hold the old and
+    new attribute value, text or (for moves) 1-based sibling position.
+    """
+
+    kind: str
+    path: str
+    attribute: Optional[str] = None
+    before: Optional[str] = None
+    after: Optional[str] = None
+
+    def describe(self) -> str:
+        if self.kind == "added":
+            return f"+ {self.path}"
+        if self.kind == "removed":
+            return f"- {self.path}"
+        if self.kind == "moved":
+            return f"~ {self.path} moved from position {self.before} to {self.after}"
+        if self.kind == "text-changed":
+            return f"* {self.path} text: {self.before!r} -> {self.after!r}"
+        return f"* {self.path} @{self.attribute}: {self.before!r} -> {self.after!r}"
+
+    def to_dict(self) -> Dict[str, Optional[str]]:
+        return asdict(self)
+
+
+def identity_key(element: Element) -> Optional[Tuple[str, str]]:
+    """Return ``(attribute, value)`` identifying *element* among its siblings, if it has one."""
+
+    for attribute in IDENTITY_ATTRIBUTES.get(element.tag, ()):
+        value = element.get(attribute)
+        if value:
+            return attribute, value
+    return None
+
 
 def element_to_string(element: Element) -> str:
     return etree.tostring(element, encoding="unicode")
 
 
 def diff_elements(before: Element, after: Element) -> List[str]:
-    before_str = element_to_string(before).splitlines()
-    after_str = element_to_string(after).splitlines()
-    diff: List[str] = []
-    for line in before_str:
-        if line not in after_str:
-            diff.append(f"- {line}")
-    for line in after_str:
-        if line not in before_str:
-            diff.append(f"+ {line}")
-    return diff
+    """Describe the differences between two trees, one line per :class:`Change`."""
+
+    return [change.describe() for change in diff_trees(before, after)]
+
+
+def diff_trees(before: Element, after: Element) -> List[Change]:
+    """Return the structural changes that turn *before* into *after*."""
+
+    if before.tag != after.tag:
+        return [Change("removed", f"/{before.tag}"), Change("added", f"/{after.tag}")]
+    changes: List[Change] = []
+    paths = PathResolver(f"/{after.tag}")
+    stack: List[Tuple[Element, Element, Location]] = [(before, after, None)]
+    while stack:
+        old, new, location = stack.pop()
+        _compare_node(old, new, location, paths, changes)
+        if not len(old) and not len(new):
+            continue
+        old_children, new_children = element_children(old), element_children(new)
+        old_keys, new_keys = child_keys(old_children), child_keys(new_children)
+        if old_keys == new_keys:
+            # Same children in the same order: the common case, no matching needed.
+            for index in range(len(new_children) - 1, -1, -1):
+                stack.append((old_children[index], new_children[index], (location, new_keys, index)))
+            continue
+        old_positions = {key: index for index, key in enumerate(old_keys)}
+        new_positions = {key: index for index, key in enumerate(new_keys)}
+        for index, key in enumerate(old_keys):
+            if key not in new_positions:
+                changes.append(Change("removed", paths.resolve((location, old_keys, index))))
+        common: List[Tuple[int, int]] = []
+        for index, key in enumerate(new_keys):
+            old_index = old_positions.get(key)
+            if old_index is None:
+                changes.append(Change("added", paths.resolve((location, new_keys, index))))
+            else:
+                common.append((old_index, index))
+        for old_index, index in _moved(common):
+            path = paths.resolve((location, new_keys, index))
+            changes.append(Change("moved", path, before=str(old_index + 1), after=str(index + 1)))
+        for old_index, index in reversed(common):
+            stack.append((old_children[old_index], new_children[index], (location, new_keys, index)))
+    return changes
+
+
+def summarize(changes: Sequence[Change]) -> Dict[str, int]:
+    counts = {kind: 0 for kind in CHANGE_KINDS}
+    for change in changes:
+        counts[change.kind] += 1
+    return counts
+
+
+def _compare_node(old: Element, new: Element, location: Location, paths: "PathResolver", changes: List[Change]) -> None:
+    if old.items() != new.items():  # cheaper than comparing ``attrib`` mappings
+        old_attributes, new_attributes = old.attrib, new.attrib
+        path = paths.resolve(location)
+        for name in sorted(set(old_attributes) | set(new_attributes)):
+            before, after = old_attributes.get(name), new_attributes.get(name)
+            if before != after:
+                changes.append(Change("attribute-changed", path, name, before, after))
+    if old.text != new.text:
+        old_text, new_text = (old.text or "").strip(), (new.text or "").strip()
+        if old_text != new_text:
+            changes.append(Change("text-changed", paths.resolve(location), before=old_text, after=new_text))
+
+
+def element_children(parent: Element) -> List[Element]:
+    return [child for child in parent if isinstance(child.tag, str)]  # skip comments and PIs
+
+
+def child_keys(children: Sequence[Element]) -> List[ChildKey]:
+    """Return the key matching each child with its counterpart in the other tree.
+
+    Keys are ``(tag, attribute, value)`` for children with an identity and
+    ``(tag, n)`` for the n-th unnamed child of a tag. Repeated identities get a
+    running count appended so every key is unique.
+    """
+
+    keys: List[ChildKey] = []
+    seen: Dict[ChildKey, int] = {}
+    unnamed: Dict[str, int] = {}
+    for child in children:
+        tag = child.tag
+        key: ChildKey = ()
+        for attribute in IDENTITY_ATTRIBUTES.get(tag, ()):  # inlined identity_key()
+            value = child.get(attribute)
+            if value:
+                key = (tag, attribute, value)
+                break
+        if not key:
+            count = unnamed[tag] = unnamed.get(tag, 0) + 1
+            key = (tag, count)
+        else:
+            if key in seen:
+                seen[key] += 1
+                key += (seen[key],)
+            else:
+                seen[key] = 1
+        keys.append(key)
+    return keys
+
+
+class PathResolver:
+    """Turns the ``(parent, sibling keys, index)`` locations used while diffing into path strings.
+
+    Paths are only built for elements that changed, and each sibling list is
+    formatted at most once.
+    """
+
+    def __init__(self, root: str) -> None:
+        self.root = root
+        self._segments: Dict[int, Tuple[List[ChildKey], List[str]]] = {}
+
+    def resolve(self, location: Location) -> str:
+        parts: List[str] = []
+        while location is not None:
+            parent, keys, index = location
+            parts.append(self._siblings(keys)[index])
+            location = parent
+        parts.append(self.root)
+        return "/".join(reversed(parts))
+
+    def _siblings(self, keys: List[ChildKey]) -> List[str]:
+        cached = self._segments.get(id(keys))
+        if cached is not None:
+            return cached[1]
+        totals: Dict[str, int] = {}
+        for key in keys:
+            totals[key[0]] = totals.get(key[0], 0) + 1  # type: ignore[index]
+        occurrences: Dict[str, int] = {}
+        segments: List[str] = []
+        for key in keys:
+            tag = key[0]
+            occurrence = occurrences[tag] = occurrences.get(tag, 0) + 1  # type: ignore[index]
+            if len(key) == 3:
+                segments.append(f"{tag}[@{key[1]}='{key[2]}']")
+            elif totals[tag] == 1:  # type: ignore[index]
+                segments.append(str(tag))
+            else:
+                segments.append(f"{tag}[{occurrence}]")
+        # Keep ``keys`` alive so its id is not reused while cached.
+        self._segments[id(keys)] = (keys, segments)
+        return segments
+
+
+def _moved(common: List[Tuple[int, int]]) -> List[Tuple[int, int]]:
+    """Return the entries of *common* (in new order) outside a longest increasing run of old positions.
+
+    Those are the fewest elements whose move explains the new order.
+    """
+
+    if len(common) < 2:
+        return []
+    tails: List[int] = []
+    tail_indexes: List[int] = []
+    previous = [-1] * len(common)
+    for index, (old_position, _) in enumerate(common):
+        slot = bisect.bisect_left(tails, old_position)
+        if slot == len(tails):
+            tails.append(old_position)
+            tail_indexes.append(index)
+        else:
+            tails[slot] = old_position
+            tail_indexes[slot] = index
+        previous[index] = tail_indexes[slot - 1] if slot else -1
+    keep = set()
+    index = tail_indexes[-1]
+    while index != -1:
+        keep.add(index)
+        index = previous[index]
+    return [entry for index, entry in enumerate(common) if index not in keep]
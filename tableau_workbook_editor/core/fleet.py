@@ -0,0 +1,184 @@
+"""Run workbook operations across many files with a process pool."""
+from __future__ import annotations
+
+import glob
+import json
+import shutil
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from dataclasses import asdict, dataclass
+from pathlib import Path
+from typing import Any, Dict, Iterable, Iterator, List, Mapping, Optional
+
+from . import operations
+
+WORKBOOK_SUFFIXES = (".twb", ".twbx")
+#: Read-only operations, answered from a streaming scan of the workbook.
+INSPECTION_OPERATIONS = ("inspect", "list", "export-json")
+#: Operations that parse the workbook but never write it.
+READ_ONLY_OPERATIONS = INSPECTION_OPERATIONS + ("validate",)
+#: Every operation ``run_batch`` accepts.
+BATCH_OPERATIONS = (*operations.OPERATIONS, "apply", *READ_ONLY_OPERATIONS)
+#: ``list`` arguments (the ``tbe list`` flags) mapped to item types and summary methods;
+#: without any, every type is listed.
+LIST_KINDS = {
+    "sheets": ("worksheet", "list_worksheets"),
+    "dashboards": ("dashboard", "list_dashboards"),
+    "datasources": ("datasource", "list_datasources"),
+    "parameters": ("parameter", "list_parameters"),
+}
+
+
+@dataclass
+class BatchResult:
+    """Outcome of running an operation against a single workbook."""
+
+    path: str
+    operation: str
+    ok: bool
+    duration: float
+    error: Optional[str] = None
+    result: Optional[Dict[str, Any]] = None
+
+    def to_json(self) -> str:
+        return json.dumps(asdict(self))
+
+
+def expand_paths(patterns: Iterable[str]) -> List[Path]:
+    """Expand glob *patterns* (``**`` recurses) into a sorted list of workbooks."""
+
+    found = set()
+    for pattern in patterns:
+        for match in glob.glob(pattern, recursive=True):
+            path = Path(match)
+            if path.suffix.lower() in WORKBOOK_SUFFIXES and path.is_file():
+                found.add(path)
+    return sorted(found)
+
+
+def check_operation(operation: str, arguments: Mapping[str, Any]) -> None:
+    """Validate *operation* and its arguments once, before any file is processed."""
+
+    if operation == "list":
+        _list_kinds(arguments)
+        return
+    if operation in READ_ONLY_OPERATIONS:
+        if arguments:
+            raise operations.OperationError(0, operation, f"takes no arguments, got {', '.join(sorted(arguments))}")
+        return
+    if operation == "apply":
+        operations.parse_operations(arguments.get("operations", []))
+        return
+    try:
+        operations.resolve_operation(operation)
+    except KeyError:
+        raise operations.OperationError(0, operation, f"unknown operation; expected one of {', '.join(BATCH_OPERATIONS)}") from None
+    operations.parse_operation(0, {"op": operation, **arguments})
+
+
+def _list_kinds(arguments: Mapping[str, Any]) -> List[str]:
+    unknown = sorted(set(arguments) - set(LIST_KINDS))
+    if unknown:
+        raise operations.OperationError(0, "list", f"unknown argument(s) {', '.join(unknown)}; expected {', '.join(LIST_KINDS)}")
+    selected = set()
+    for kind, value in arguments.items():
+        flag = str(value).lower()
+        if flag not in ("true", "false"):
+            raise operations.OperationError(0, "list", f"argument '{kind}': expected true or false, got {value!r}")
+        if flag == "true":
+            selected.add(kind)
+    return [kind for kind in LIST_KINDS if kind in selected] or [*LIST_KINDS]
+
+
+def _inspect(summary: Any, operation: str, arguments: Mapping[str, Any]) -> Dict[str, Any]:
+    if operation == "list":
+        items = []
+        for kind in _list_kinds(arguments):
+            item_type, method = LIST_KINDS[kind]
+            items.extend({"type": item_type, "name": name} for name in getattr(summary, method)())
+        return {"items": items}
+    result: Dict[str, Any] = {
+        "worksheets": summary.list_worksheets(),
+        "dashboards": summary.list_dashboards(),
+        "datasources": summary.list_datasources(),
+        "parameters": summary.list_parameters(),
+    }
+    if operation == "export-json":
+        result["columns"] = {ds: summary.list_columns(ds) for ds in result["datasources"]}
+        result["actions"] = summary.list_actions()
+    return result
+
+
+def process_workbook(
+    path: str,
+    operation: str,
+    arguments: Mapping[str, Any],
+    *,
+    dry_run: bool = False,
+    backup: bool = False,
+    package_assets: bool = False,
+) -> BatchResult:
+    """Run *operation* against the workbook at *path*; never raises."""
+
+    from .reader import open_workbook
+
+    start = time.perf_counter()
+    result: Optional[Dict[str, Any]] = None
+    try:
+        workbook_path = Path(path)
+        if operation in INSPECTION_OPERATIONS:
+            result = _inspect(open_workbook(workbook_path, mode="scan"), operation, arguments)
+        elif operation == "validate":
+            report = open_workbook(workbook_path).validate()
+            result = report.to_dict()
+        else:
+            wb = open_workbook(workbook_path)
+            if operation == "apply":
+                wb.apply(arguments.get("operations", []))
+            else:
+                wb.apply([{"op": operation, **arguments}])
+            if backup and not dry_run:
+                shutil.copy2(workbook_path, workbook_path.with_suffix(workbook_path.suffix + ".bak"))
+            wb.save(package_assets=package_assets, dry_run=dry_run)
+    except Exception as exc:  # noqa: BLE001 - failures are reported per file
+        return BatchResult(path, operation, False, time.perf_counter() - start, error=f"{type(exc).__name__}: {exc}")
+    return BatchResult(path, operation, True, time.perf_counter() - start, result=result)
+
+
+def run_batch(
+    paths: Iterable[Path],
+    operation: str,
+    arguments: Optional[Mapping[str, Any]] = None,
+    *,
+    jobs: Optional[int] = None,
+    dry_run: bool = False,
+    backup: bool = False,
+    package_assets: bool = False,
+) -> Iterator[BatchResult]:
+    """Yield a :class:`BatchResult` per workbook as soon as each one finishes.
+
+    ``jobs=1`` runs in the current process; otherwise a
+    :class:`~concurrent.futures.ProcessPoolExecutor` with *jobs* workers
+    (default: one per CPU) is used. A failing workbook never stops the batch.
+    The operation is validated when this is called, before any result is
+    requested, so a malformed operation raises right away.
+    """
+
+    arguments = dict(arguments or {})
+    check_operation(operation, arguments)
+    options = {"dry_run": dry_run, "backup": backup, "package_assets": package_assets}
+    return _run_batch(paths, operation, arguments, jobs, options)
+
+
+def _run_batch(paths: Iterable[Path], operation: str, arguments: Dict[str, Any], jobs: Optional[int], options: Dict[str, bool]) -> Iterator[BatchResult]:
+    if jobs == 1:
+        for path in paths:
+            yield process_workbook(str(path), operation, arguments, **options)
+        return
+    with ProcessPoolExecutor(max_workers=jobs) as pool:
+        futures = {pool.submit(process_workbook, str(path), operation, arguments, **options): str(path) for path in paths}
+        for future in as_completed(futures):
+            try:
+                yield future.result()
+            except Exception as exc:  # noqa: BLE001 - e.g. a crashed worker process
+                yield BatchResult(futures[future], operation, False, 0.0, error=f"{type(exc).__name__}: {exc}")
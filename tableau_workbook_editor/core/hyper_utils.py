@@ -1,26 +1,142 @@
-"""Optional helpers for interacting with Tableau Hyper extracts."""
+"""Optional helpers for interacting with Tableau Hyper extracts.
+
+Extracts inside packaged workbooks are listed, exported and replaced by
+streaming them between the archive and disk in
+:data:`~tableau_workbook_editor.core.twbx_utils.CHUNK_SIZE` blocks; their size
+and SHA-256 are computed on the way, so memory use does not depend on the size
+of the extract.
+"""
 from __future__ import annotations
 
+import tempfile
 from dataclasses import dataclass
-from pathlib import Path
-from typing import Optional
+from pathlib import Path, PurePosixPath
+from typing import Dict, List, Optional
+from zipfile import ZipFile, ZipInfo
+
+from .twbx_utils import CHUNK_SIZE, DigestReader, replace_members
 
 try:  # pragma: no cover - optional dependency
     from tableauhyperapi import HyperProcess  # type: ignore
 except Exception:  # pragma: no cover - optional dependency
     HyperProcess = None  # type: ignore
 
+#: Member extensions treated as extracts.
+EXTRACT_EXTENSIONS = frozenset({".hyper", ".tde"})
+
 
 @dataclass
 class HyperInfo:
     path: Path
+    size: int = 0
+    sha256: Optional[str] = None
+    #: Member name when the extract is stored inside the packaged workbook at ``path``.
+    member: Optional[str] = None
+    compressed_size: Optional[int] = None
+
+    def to_dict(self) -> Dict[str, object]:
+        return {
+            "path": str(self.path),
+            "member": self.member,
+            "size": self.size,
+            "compressed_size": self.compressed_size,
+            "sha256": self.sha256,
+        }
 
 
 def is_available() -> bool:
     return HyperProcess is not None
 
 
-def describe_hyper(path: Path) -> Optional[HyperInfo]:
+def describe_hyper(path: Path, *, checksum: bool = False) -> Optional[HyperInfo]:
+    """Return the size of the extract at *path*, and its SHA-256 when *checksum* is set."""
+
     if not path.exists():
         return None
-    return HyperInfo(path=path)
+    if not checksum:
+        return HyperInfo(path=path, size=path.stat().st_size)
+    with path.open("rb") as stream:
+        digest = _drain(DigestReader(stream))
+    return HyperInfo(path=path, size=digest.size, sha256=digest.hexdigest())
+
+
+def list_extracts(archive: Path, *, checksum: bool = False) -> List[HyperInfo]:
+    """Describe the extracts stored in the packaged workbook *archive*.
+
+    Sizes come from the archive directory; *checksum* additionally streams
+    each extract to compute its SHA-256.
+    """
+
+    extracts = []
+    with ZipFile(archive, "r") as zf:
+        for info in _extract_infos(zf):
+            sha256 = None
+            if checksum:
+                with zf.open(info) as stream:
+                    sha256 = _drain(DigestReader(stream)).hexdigest()
+            extracts.append(
+                HyperInfo(path=archive, size=info.file_size, sha256=sha256, member=info.filename, compressed_size=info.compress_size)
+            )
+    return extracts
+
+
+def find_extract(archive: Path, name: str) -> str:
+    """Return the member of *archive* named *name*, either in full or by file name."""
+
+    with ZipFile(archive, "r") as zf:
+        members = [info.filename for info in _extract_infos(zf)]
+    if name in members:
+        return name
+    matches = [member for member in members if PurePosixPath(member).name == name]
+    if len(matches) == 1:
+        return matches[0]
+    if matches:
+        raise ValueError(f"Extract name '{name}' is ambiguous: {', '.join(matches)}")
+    raise ValueError(f"Extract '{name}' not found in {archive}")
+
+
+def export_extract(archive: Path, name: str, destination: Path) -> HyperInfo:
+    """Stream the extract *name* out of *archive* to *destination* (a file or directory)."""
+
+    member = find_extract(archive, name)
+    if destination.is_dir():
+        destination = destination / PurePosixPath(member).name
+    destination.parent.mkdir(parents=True, exist_ok=True)
+    with tempfile.NamedTemporaryFile("wb", delete=False, dir=str(destination.parent)) as tmp:
+        temp_path = Path(tmp.name)
+    try:
+        with ZipFile(archive, "r") as zf, zf.open(member) as stream, temp_path.open("wb") as out:
+            digest = DigestReader(stream)
+            for chunk in iter(lambda: digest.read(CHUNK_SIZE), b""):
+                out.write(chunk)
+    except BaseException:
+        temp_path.unlink()
+        raise
+    temp_path.replace(destination)
+    return HyperInfo(path=destination, size=digest.size, sha256=digest.hexdigest(), member=member)
+
+
+def replace_extract(archive: Path, name: str, source: Path, *, target: Optional[Path] = None) -> HyperInfo:
+    """Replace the extract *name* in *archive* with the file *source*.
+
+    Other members are copied without recompression; the archive is written to
+    *target* (default: *archive*) atomically.
+    """
+
+    member = find_extract(archive, name)
+    destination = target or archive
+    digests = replace_members(archive, {member: source}, target=destination)
+    size, sha256 = digests[member]
+    with ZipFile(destination, "r") as zf:
+        compressed_size = zf.getinfo(member).compress_size
+    return HyperInfo(path=destination, size=size, sha256=sha256, member=member, compressed_size=compressed_size)
+
+
+def _extract_infos(zf: ZipFile) -> List[ZipInfo]:
+    return [info for info in zf.infolist() if PurePosixPath(info.filename).suffix.lower() in EXTRACT_EXTENSIONS]
+
+
+def _drain(digest: DigestReader) -> DigestReader:
+    while digest.read(CHUNK_SIZE):
+        pass
+    return digest
@@ -0,0 +1,133 @@
+"""Name index for the top level objects of a workbook."""
+from __future__ import annotations
+
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Tuple
+
+from .xml_utils import Element
+
+# kind -> (collection tag, item tag, attributes an item can be looked up by)
+INDEXED_KINDS: Dict[str, Tuple[str, str, Tuple[str, ...]]] = {
+    "worksheet": ("worksheets", "worksheet", ("name",)),
+    "dashboard": ("dashboards", "dashboard", ("name",)),
+    "datasource": ("datasources", "datasource", ("name", "caption")),
+    "parameter": ("parameters", "parameter", ("name",)),
+}
+
+
+@dataclass
+class _KindIndex:
+    parent: Optional[Element]
+    size: int
+    elements: List[Element] = field(default_factory=list)
+    names: Dict[str, Element] = field(default_factory=dict)
+
+
+class WorkbookIndex:
+    """Map worksheet, dashboard, datasource and parameter names to elements.
+
+    Each kind is built lazily on first lookup and kept up to date by
+    :meth:`add` and :meth:`rename`. Lookups follow the same first-match rules
+    as the ``find_*`` helpers. Adding or removing elements behind the index's
+    back is detected through the collection element's identity and size, and
+    stale hits are re-checked against the element's attributes; call
+    :meth:`invalidate` after renaming elements directly on the tree.
+    """
+
+    def __init__(self, root: Element) -> None:
+        self.root = root
+        self._kinds: Dict[str, _KindIndex] = {}
+
+    # ------------------------------------------------------------------
+    def find(self, kind: str, name: str) -> Optional[Element]:
+        entry = self._entry(kind)
+        element = entry.names.get(name)
+        if element is None or self._matches(kind, element, name):
+            return element
+        # The element was renamed directly on the tree; rebuild and retry.
+        return self._build(kind).names.get(name)
+
+    def worksheet(self, name: str) -> Optional[Element]:
+        return self.find("worksheet", name)
+
+    def dashboard(self, name: str) -> Optional[Element]:
+        return self.find("dashboard", name)
+
+    def datasource(self, name: str) -> Optional[Element]:
+        return self.find("datasource", name)
+
+    def parameter(self, name: str) -> Optional[Element]:
+        return self.find("parameter", name)
+
+    def elements(self, kind: str) -> List[Element]:
+        return list(self._entry(kind).elements)
+
+    # ------------------------------------------------------------------
+    def add(self, kind: str, element: Element) -> None:
+        """Register *element* after it has been appended to its collection."""
+
+        entry = self._kinds.get(kind)
+        if entry is None:
+            return
+        parent = self._collection(kind)
+        if parent is not entry.parent or parent is None or len(parent) != entry.size + 1:
+            self.invalidate(kind)
+            return
+        entry.size += 1
+        entry.elements.append(element)
+        for attribute in INDEXED_KINDS[kind][2]:
+            value = element.get(attribute)
+            if value is not None:
+                entry.names.setdefault(value, element)
+
+    def rename(self, kind: str, element: Element, old: str, new: str) -> None:
+        """Update the index after *element* was renamed from *old* to *new*."""
+
+        entry = self._kinds.get(kind)
+        if entry is None:
+            return
+        if entry.names.get(old) is element:
+            # Another element may share the old name; rebuilding keeps the
+            # first-match semantics intact.
+            self.invalidate(kind)
+            return
+        entry.names.setdefault(new, element)
+
+    def invalidate(self, kind: Optional[str] = None) -> None:
+        if kind is None:
+            self._kinds.clear()
+        else:
+            self._kinds.pop(kind, None)
+
+    # ------------------------------------------------------------------
+    def _collection(self, kind: str) -> Optional[Element]:
+        return self.root.find(INDEXED_KINDS[kind][0])
+
+    def _entry(self, kind: str) -> _KindIndex:
+        entry = self._kinds.get(kind)
+        if entry is not None:
+            parent = self._collection(kind)
+            size = len(parent) if parent is not None else 0
+            if parent is entry.parent and size == entry.size:
+                return entry
+        return self._build(kind)
+
+    def _build(self, kind: str) -> _KindIndex:
+        _, item_tag, attributes = INDEXED_KINDS[kind]
+        parent = self._collection(kind)
+        entry = _KindIndex(parent=parent, size=len(parent) if parent is not None else 0)
+        if parent is not None:
+            for element in parent:
+                if element.tag != item_tag:
+                    continue
+                entry.elements.append(element)
+                for attribute in attributes:
+                    value = element.get(attribute)
+                    if value is not None:
+                        entry.names.setdefault(value, element)
+        self._kinds[kind] = entry
+        return entry
+
+    @staticmethod
+    def _matches(kind: str, element: Element, name: str) -> bool:
+        return any(element.get(attribute) == name for attribute in INDEXED_KINDS[kind][2])
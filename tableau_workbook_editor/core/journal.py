@@ -0,0 +1,65 @@
+"""Change journal for workbook edits."""
+from __future__ import annotations
+
+from dataclasses import dataclass, field
+from typing import Any, Dict, Iterator, List, Tuple
+
+from .xml_utils import Element
+
+
+@dataclass(frozen=True)
+class JournalEntry:
+    """A single recorded edit: the operation name, its arguments and the touched elements."""
+
+    operation: str
+    elements: Tuple[Element, ...] = ()
+    details: Dict[str, Any] = field(default_factory=dict)
+
+    def describe(self) -> str:
+        if not self.details:
+            return self.operation
+        args = ", ".join(f"{key}={value!r}" for key, value in self.details.items())
+        return f"{self.operation}({args})"
+
+
+class ChangeJournal:
+    """Record of the edits applied to a workbook since it was opened.
+
+    Every :class:`~tableau_workbook_editor.core.twb_model.Workbook` mutator
+    appends an entry, so dirty checks cost O(changes) instead of comparing
+    serialised documents. Edits made directly on ``Workbook.root`` are not
+    seen by the journal.
+    """
+
+    def __init__(self) -> None:
+        self.entries: List[JournalEntry] = []
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+    def __iter__(self) -> Iterator[JournalEntry]:
+        return iter(self.entries)
+
+    @property
+    def dirty(self) -> bool:
+        return bool(self.entries)
+
+    def record(self, operation: str, *elements: Element, **details: Any) -> JournalEntry:
+        entry = JournalEntry(operation=operation, elements=tuple(elements), details=details)
+        self.entries.append(entry)
+        return entry
+
+    def touched_elements(self) -> List[Element]:
+        """Return every element recorded by the journal, without duplicates."""
+
+        seen: Dict[int, Element] = {}
+        for entry in self.entries:
+            for element in entry.elements:
+                seen.setdefault(id(element), element)
+        return list(seen.values())
+
+    def describe(self) -> List[str]:
+        return [entry.describe() for entry in self.entries]
+
+    def clear(self) -> None:
+        self.entries.clear()
@@ -1,13 +1,373 @@
-"""Layout helpers."""
+"""Layout helpers.
+
+A dashboard's ``<zones>`` element holds a tree of zones: layout containers
+nest further zones, down to the worksheet, text and image zones. A
+:class:`ZoneTree` flattens that tree in document order with parent links and
+an id index, and keeps a static R-tree over the zone rectangles
+(``x``/``y``/``w``/``h``) for point and rectangle queries. Geometry edits made
+through the tree update the rectangles in place; the R-tree is rebuilt lazily,
+once per batch of edits, on the next spatial query.
+"""
 from __future__ import annotations
 
-from typing import List
+import math
+from dataclasses import dataclass
+from typing import Dict, Iterator, List, Mapping, Optional, Sequence, Tuple, Union
 
 from .xml_utils import Element
 
+ZONE_TAG = "zone"
+GEOMETRY_ATTRIBUTES = ("x", "y", "w", "h")
+ISSUE_KINDS = ("duplicate-id", "invalid-geometry", "out-of-bounds", "overlap")
+#: Zone coordinates span ``0..ZONE_EXTENT`` across the dashboard whatever its pixel ``<size>``.
+ZONE_EXTENT = 100000
+
+#: ``(x0, y0, x1, y1)``; a zone covers ``x0 <= x < x1`` and ``y0 <= y < y1``.
+Bounds = Tuple[int, int, int, int]
+_NODE_CAPACITY = 16
+
 
 def list_layout_zones(dashboard: Element) -> List[Element]:
+    """Return every zone of *dashboard* in document order, including zones nested in containers."""
+
     zones = dashboard.find("zones")
     if zones is None:
         return []
-    return list(zones)
+    return [*zones.iter(ZONE_TAG)]
+
+
+def zone_bounds(zone: Element) -> Optional[Bounds]:
+    """Return the rectangle of *zone*, or ``None`` when its geometry is missing or invalid."""
+
+    try:
+        x, y, w, h = (int(zone.get(name, "")) for name in GEOMETRY_ATTRIBUTES)
+    except ValueError:
+        return None
+    if w < 0 or h < 0:
+        return None
+    return (x, y, x + w, y + h)
+
+
+def is_floating(zone: Element) -> bool:
+    return zone.get("floating") == "true"
+
+
+@dataclass(frozen=True)
+class LayoutIssue:
+    """A problem found by :meth:`ZoneTree.check`."""
+
+    kind: str
+    dashboard: str
+    zones: Tuple[str, ...]
+    message: str
+
+    def describe(self) -> str:
+        return f"{self.dashboard}: {self.message}"
+
+    def to_dict(self) -> Dict[str, object]:
+        return {"kind": self.kind, "dashboard": self.dashboard, "zones": [*self.zones], "message": self.message}
+
+
+# An R-tree node is ``(leaf, entries)``; each entry is ``(bounds, child)`` where
+# the child is a zone position in leaves and another node otherwise.
+_Node = Tuple[bool, List[Tuple[Bounds, Union[int, "_Node"]]]]
+
+
+class _RTree:
+    """Static R-tree bulk-loaded with Sort-Tile-Recursive packing."""
+
+    def __init__(self, entries: Sequence[Tuple[Bounds, int]], capacity: int = _NODE_CAPACITY) -> None:
+        level: List[Tuple[Bounds, Union[int, _Node]]] = [*entries]
+        leaf = True
+        while len(level) > capacity:
+            level = [(_union(group), (leaf, group)) for group in _tile(level, capacity)]
+            leaf = False
+        self._root: _Node = (leaf, level)
+
+    def search(self, bounds: Bounds) -> Iterator[int]:
+        """Yield the positions whose rectangles overlap *bounds* with positive area."""
+
+        x0, y0, x1, y1 = bounds
+        stack = [self._root]
+        while stack:
+            leaf, entries = stack.pop()
+            for (bx0, by0, bx1, by1), child in entries:
+                if bx0 < x1 and x0 < bx1 and by0 < y1 and y0 < by1:
+                    if leaf:
+                        yield child  # type: ignore[misc]
+                    else:
+                        stack.append(child)  # type: ignore[arg-type]
+
+    def point(self, x: int, y: int) -> Iterator[int]:
+        """Yield the positions whose rectangles contain the point."""
+
+        return self.search((x, y, x + 1, y + 1))
+
+
+def _tile(entries: List[Tuple[Bounds, object]], capacity: int) -> Iterator[list]:
+    pages = math.ceil(len(entries) / capacity)
+    per_slice = math.ceil(math.sqrt(pages)) * capacity
+    by_x = sorted(entries, key=lambda entry: entry[0][0] + entry[0][2])
+    for start in range(0, len(by_x), per_slice):
+        column = sorted(by_x[start : start + per_slice], key=lambda entry: entry[0][1] + entry[0][3])
+        for offset in range(0, len(column), capacity):
+            yield column[offset : offset + capacity]
+
+
+def _union(entries: Sequence[Tuple[Bounds, object]]) -> Bounds:
+    return (
+        min(bounds[0] for bounds, _ in entries),
+        min(bounds[1] for bounds, _ in entries),
+        max(bounds[2] for bounds, _ in entries),
+        max(bounds[3] for bounds, _ in entries),
+    )
+
+
+class ZoneTree:
+    """Every zone of one dashboard, with parent links, an id index and a spatial index.
+
+    Zones are kept in document order, so a container comes before the zones
+    it holds. Lookups by id follow the first zone with that id. Call
+    :meth:`rebuild` after adding, removing or re-parenting zones directly on
+    the tree; geometry changed through :meth:`move` and :meth:`update` needs
+    no rebuild.
+    """
+
+    def __init__(self, dashboard: Element) -> None:
+        self.dashboard = dashboard
+        self.rebuild()
+
+    def rebuild(self) -> None:
+        self.zones: List[Element] = []
+        self._parents: List[int] = []
+        self._bounds: List[Optional[Bounds]] = []
+        self._ids: Dict[str, int] = {}
+        self._rtree: Optional[_RTree] = None
+        zones = self.dashboard.find("zones")
+        stack: List[Tuple[Element, int]] = [] if zones is None else [(zone, -1) for zone in reversed(zones) if zone.tag == ZONE_TAG]
+        while stack:
+            zone, parent = stack.pop()
+            position = len(self.zones)
+            self.zones.append(zone)
+            self._parents.append(parent)
+            self._bounds.append(zone_bounds(zone))
+            self._ids.setdefault(zone.get("id") or "", position)
+            stack.extend((child, position) for child in reversed(zone) if child.tag == ZONE_TAG)
+        # Position one past the last descendant, so a zone's subtree is zones[i:ends[i]].
+        self._ends = [position + 1 for position in range(len(self.zones))]
+        for position in range(len(self.zones) - 1, -1, -1):
+            parent = self._parents[position]
+            if parent >= 0 and self._ends[position] > self._ends[parent]:
+                self._ends[parent] = self._ends[position]
+
+    @property
+    def name(self) -> str:
+        return self.dashboard.get("name") or ""
+
+    def __len__(self) -> int:
+        return len(self.zones)
+
+    def __iter__(self) -> Iterator[Element]:
+        return iter(self.zones)
+
+    def __contains__(self, zone_id: object) -> bool:
+        return zone_id in self._ids
+
+    # ------------------------------------------------------------------
+    def find(self, zone_id: str) -> Optional[Element]:
+        position = self._lookup(zone_id)
+        return None if position is None else self.zones[position]
+
+    def parent(self, zone_id: str) -> Optional[Element]:
+        parent = self._parents[self._position(zone_id)]
+        return None if parent < 0 else self.zones[parent]
+
+    def children(self, zone_id: str) -> List[Element]:
+        position = self._position(zone_id)
+        return [self.zones[child] for child in range(position + 1, self._ends[position]) if self._parents[child] == position]
+
+    def depth(self, zone_id: str) -> int:
+        depth, parent = 0, self._parents[self._position(zone_id)]
+        while parent >= 0:
+            depth, parent = depth + 1, self._parents[parent]
+        return depth
+
+    def bounds(self, zone_id: str) -> Optional[Bounds]:
+        return self._bounds[self._position(zone_id)]
+
+    def hit_test(self, x: int, y: int) -> List[Element]:
+        """Return the zones containing the point, outermost first."""
+
+        return [self.zones[position] for position in sorted(self._index().point(x, y))]
+
+    def intersecting(self, bounds: Bounds) -> List[Element]:
+        """Return the zones overlapping the rectangle *bounds* (``x0, y0, x1, y1``), in document order."""
+
+        return [self.zones[position] for position in sorted(self._index().search(bounds))]
+
+    # ------------------------------------------------------------------
+    def move(self, zone_id: str, *, x: Optional[int] = None, y: Optional[int] = None, w: Optional[int] = None, h: Optional[int] = None) -> Element:
+        """Change the geometry of one zone and return it."""
+
+        position = self._position(zone_id)
+        self._set_geometry(position, {"x": x, "y": y, "w": w, "h": h})
+        return self.zones[position]
+
+    def update(self, geometry: Mapping[str, Mapping[str, Optional[int]]]) -> List[Element]:
+        """Apply ``{zone_id: {"x": ..., "y": ..., "w": ..., "h": ...}}`` and return the zones changed.
+
+        Every id is checked before any zone changes.
+        """
+
+        for values in geometry.values():
+            unknown = set(values) - set(GEOMETRY_ATTRIBUTES)
+            if unknown:
+                raise ValueError(f"Unknown geometry attribute(s) {', '.join(sorted(unknown))}; expected x, y, w or h")
+        for zone_id in geometry:
+            self._lookup(zone_id)
+        # Read the positions only after the lookups, which may have rebuilt the tree.
+        positions = [self._ids.get(zone_id) for zone_id in geometry]
+        missing = [zone_id for zone_id, position in zip(geometry, positions) if position is None]
+        if missing:
+            raise ValueError(f"Zone(s) {', '.join(missing)} not found in dashboard '{self.name}'")
+        for position, values in zip(positions, geometry.values()):
+            self._set_geometry(position, values)
+        return [self.zones[position] for position in positions]
+
+    # ------------------------------------------------------------------
+    def overlaps(self) -> List[Tuple[Element, Element]]:
+        """Return pairs of tiled zones that overlap without one containing the other.
+
+        Zones are swept against the other zones of their container only. As
+        long as zones stay inside their containers, zones in different
+        containers can only overlap if the containers themselves overlap, and
+        that is reported one level up. Zones that extend past their container
+        are also checked against the whole dashboard through the R-tree.
+        Floating zones are meant to overlap the layout and are not reported.
+        """
+
+        containers = self._containers()
+        groups: Dict[int, List[int]] = {}
+        for position, bounds in enumerate(self._bounds):
+            # Zones without area cannot overlap anything.
+            if bounds is not None and bounds[0] < bounds[2] and bounds[1] < bounds[3] and not is_floating(self.zones[position]):
+                groups.setdefault(containers[position], []).append(position)
+        pairs = set()
+        for members in groups.values():
+            pairs.update(self._sweep(members))
+        for position in self._outside(containers):
+            if is_floating(self.zones[position]):
+                continue
+            for other in self._index().search(self._bounds[position]):  # type: ignore[arg-type]
+                first, second = min(position, other), max(position, other)
+                # Skip the zone itself, its ancestors and its descendants.
+                if second >= self._ends[first] and not is_floating(self.zones[other]):
+                    pairs.add((first, second))
+        return [(self.zones[first], self.zones[second]) for first, second in sorted(pairs)]
+
+    def out_of_bounds(self) -> List[Element]:
+        """Return the zones that extend past their container or past the edge of the dashboard."""
+
+        return [self.zones[position] for position in self._outside(self._containers())]
+
+    def check(self) -> List[LayoutIssue]:
+        """Report duplicate ids, missing or negative geometry, zones out of bounds and overlapping zones."""
+
+        name = self.name
+        issues = []
+        seen: Dict[str, int] = {}
+        for position, zone in enumerate(self.zones):
+            zone_id = zone.get("id") or ""
+            if zone_id and zone_id in seen:
+                issues.append(LayoutIssue("duplicate-id", name, (zone_id,), f"zone id '{zone_id}' is used more than once"))
+            seen.setdefault(zone_id, position)
+            if self._bounds[position] is None and _has_geometry(zone):
+                issues.append(LayoutIssue("invalid-geometry", name, (zone_id,), f"zone '{zone_id}' has invalid x/y/w/h"))
+        containers = self._containers()
+        for position in self._outside(containers):
+            zone = self.zones[position]
+            zone_id = zone.get("id") or ""
+            if containers[position] >= 0 and not is_floating(zone):
+                message = f"zone '{zone_id}' extends outside its container"
+            else:
+                message = f"zone '{zone_id}' extends past the edge of the dashboard"
+            issues.append(LayoutIssue("out-of-bounds", name, (zone_id,), message))
+        for first, second in self.overlaps():
+            ids = (first.get("id") or "", second.get("id") or "")
+            issues.append(LayoutIssue("overlap", name, ids, f"zones '{ids[0]}' and '{ids[1]}' overlap"))
+        return issues
+
+    # ------------------------------------------------------------------
+    def _lookup(self, zone_id: str) -> Optional[int]:
+        position = self._ids.get(zone_id)
+        if position is not None and self.zones[position].get("id") == zone_id:
+            return position
+        # Missing or renamed: the zones may have been edited directly on the tree.
+        self.rebuild()
+        return self._ids.get(zone_id)
+
+    def _position(self, zone_id: str) -> int:
+        position = self._lookup(zone_id)
+        if position is None:
+            raise ValueError(f"Zone '{zone_id}' not found in dashboard '{self.name}'")
+        return position
+
+    def _set_geometry(self, position: int, values: Mapping[str, Optional[int]]) -> None:
+        zone = self.zones[position]
+        for attribute in GEOMETRY_ATTRIBUTES:
+            value = values.get(attribute)
+            if value is not None:
+                zone.set(attribute, str(value))
+        self._bounds[position] = zone_bounds(zone)
+        self._rtree = None
+
+    def _index(self) -> _RTree:
+        if self._rtree is None:
+            self._rtree = _RTree([(bounds, position) for position, bounds in enumerate(self._bounds) if bounds is not None])
+        return self._rtree
+
+    def _containers(self) -> List[int]:
+        """Position of each zone's nearest ancestor with a geometry, or -1."""
+
+        containers: List[int] = []
+        for parent in self._parents:
+            while parent >= 0 and self._bounds[parent] is None:
+                parent = containers[parent]
+            containers.append(parent)
+        return containers
+
+    def _outside(self, containers: List[int]) -> List[int]:
+        limits = (0, 0, ZONE_EXTENT, ZONE_EXTENT)
+        outside = []
+        for position, bounds in enumerate(self._bounds):
+            if bounds is None:
+                continue
+            container = containers[position]
+            # Floating zones may sit anywhere on the dashboard.
+            if container >= 0 and not is_floating(self.zones[position]):
+                if not _within(bounds, self._bounds[container]):  # type: ignore[arg-type]
+                    outside.append(position)
+            elif not _within(bounds, limits):
+                outside.append(position)
+        return outside
+
+    def _sweep(self, members: List[int]) -> Iterator[Tuple[int, int]]:
+        """Yield the overlapping pairs among *members*, sweeping left to right."""
+
+        active: List[int] = []
+        for position in sorted(members, key=lambda member: self._bounds[member][0]):  # type: ignore[index]
+            x0, y0, x1, y1 = self._bounds[position]  # type: ignore[misc]
+            active = [other for other in active if self._bounds[other][2] > x0]  # type: ignore[index]
+            for other in active:
+                _, oy0, _, oy1 = self._bounds[other]  # type: ignore[misc]
+                if oy0 < y1 and y0 < oy1:
+                    yield (min(position, other), max(position, other))
+            active.append(position)
+
+
+def _within(inner: Bounds, outer: Bounds) -> bool:
+    return outer[0] <= inner[0] and outer[1] <= inner[1] and inner[2] <= outer[2] and inner[3] <= outer[3]
+
+
+def _has_geometry(zone: Element) -> bool:
+    return any(zone.get(name) is not None for name in GEOMETRY_ATTRIBUTES)
@@ -0,0 +1,327 @@
+"""Dependency graph between the fields, calculations, parameters and worksheets of a workbook.
+
+Fields are identified by their qualified name (``[Orders].[Profit]``,
+``[Parameters].[Threshold]``) and worksheets by ``worksheet:<name>``. Edges
+point from a field to what uses it: to each calculation whose formula
+references it and to each worksheet that shows it, filters on it or computes
+with it. References that resolve to nothing become ``unknown`` nodes, so
+broken calculations still show up downstream of the name they expect.
+
+:class:`~tableau_workbook_editor.core.twb_model.Workbook` builds the graph on
+first use of :attr:`~tableau_workbook_editor.core.twb_model.Workbook.lineage`
+and keeps it current as calculations are added and fields renamed.
+"""
+from __future__ import annotations
+
+import heapq
+from collections import deque
+from typing import Dict, Iterator, List, Mapping, Optional, Set, Tuple
+
+from . import datasources, parameters, worksheets
+from .calc_utils import parse_calculation, referenced_field_names
+from .references import WORKSHEET_ATTRIBUTES
+from .validators import split_field_reference
+from .xml_utils import Element, xpath
+
+PARAMETERS_QUALIFIER = "[Parameters]"
+WORKSHEET_PREFIX = "worksheet:"
+NODE_KINDS = ("column", "calculation", "parameter", "worksheet", "unknown")
+
+
+class LineageCycleError(ValueError):
+    """Raised by :meth:`LineageGraph.topological_order` when calculations depend on each other."""
+
+    def __init__(self, cycles: List[List[str]]) -> None:
+        self.cycles = cycles
+        super().__init__("Circular calculations: " + "; ".join(" -> ".join(cycle) for cycle in cycles))
+
+
+def worksheet_node(name: str) -> str:
+    return f"{WORKSHEET_PREFIX}{name}"
+
+
+def node_label(node: str) -> str:
+    """Return *node* as shown to users: the worksheet name or the qualified field name."""
+
+    return node[len(WORKSHEET_PREFIX) :] if node.startswith(WORKSHEET_PREFIX) else node
+
+
+class LineageGraph:
+    """Directed graph from each field to the calculations and worksheets that use it."""
+
+    def __init__(self) -> None:
+        #: Node to its kind, one of :data:`NODE_KINDS`.
+        self.kinds: Dict[str, str] = {}
+        self._uses: Dict[str, Set[str]] = {}
+        self._used_by: Dict[str, Set[str]] = {}
+        # Datasource qualifier to its ``[name]``/``[caption]`` lookup of field nodes.
+        self._fields: Dict[str, Dict[str, str]] = {}
+        # Datasource ``[caption]`` to ``[name]``.
+        self._aliases: Dict[str, str] = {}
+
+    @classmethod
+    def build(cls, root: Element) -> "LineageGraph":
+        graph = cls()
+        graph._fields[PARAMETERS_QUALIFIER] = {}
+        for parameter in xpath(root, parameters.PARAMETERS_XPATH):
+            graph.add_parameter(parameter.get("name") or "")
+        sources = list(xpath(root, datasources.DATASOURCES_XPATH))
+        for ds in sources:
+            graph._index_datasource(ds)
+        for ds in sources:
+            qualifier = _qualifier(ds)
+            for column in datasources.list_columns(ds):
+                formula = _formula(column)
+                if formula:
+                    graph._link_formula(f"{qualifier}.{_column_name(column)}", formula, qualifier)
+        for worksheet in xpath(root, worksheets.WORKSHEETS_XPATH):
+            graph._add_worksheet(worksheet)
+        return graph
+
+    # ------------------------------------------------------------------
+    # Queries
+    def __contains__(self, node: object) -> bool:
+        return node in self.kinds
+
+    def __len__(self) -> int:
+        return len(self.kinds)
+
+    def resolve(self, field: str, datasource: Optional[str] = None) -> List[str]:
+        """Return the field nodes *field* may mean.
+
+        *field* may be qualified (``[Orders].[Profit]``), bracketed or bare,
+        and match a field name or caption. Unqualified fields are looked up
+        in *datasource*, or in every datasource.
+        """
+
+        qualifier, name = split_field_reference(field.strip())
+        if qualifier is None and datasource is not None:
+            qualifier = datasource.strip("[]")
+        if qualifier is not None:
+            scope = self._aliases.get(f"[{qualifier}]", f"[{qualifier}]")
+            node = self._fields.get(scope, {}).get(name)
+            return [node] if node is not None else []
+        return sorted({lookup[name] for lookup in self._fields.values() if name in lookup})
+
+    def dependencies(self, node: str) -> List[str]:
+        """Return the nodes *node* uses directly."""
+
+        return sorted(self._uses.get(node, ()))
+
+    def dependents(self, node: str) -> List[str]:
+        """Return the nodes that use *node* directly."""
+
+        return sorted(self._used_by.get(node, ()))
+
+    def walk(self, node: str, *, downstream: bool = True) -> Iterator[Tuple[str, int]]:
+        """Yield ``(node, distance)`` for everything downstream (or upstream) of *node*, nearest first."""
+
+        edges = self._used_by if downstream else self._uses
+        seen = {node}
+        queue = deque([(node, 0)])
+        while queue:
+            current, distance = queue.popleft()
+            for neighbour in sorted(edges.get(current, ())):
+                if neighbour not in seen:
+                    seen.add(neighbour)
+                    queue.append((neighbour, distance + 1))
+                    yield neighbour, distance + 1
+
+    def downstream(self, node: str) -> List[str]:
+        """Return every node that depends on *node*, directly or not; what a rename or deletion affects."""
+
+        return [found for found, _ in self.walk(node)]
+
+    def upstream(self, node: str) -> List[str]:
+        return [found for found, _ in self.walk(node, downstream=False)]
+
+    def topological_order(self) -> List[str]:
+        """Return all nodes with every node after the ones it uses.
+
+        Raises :class:`LineageCycleError` when the graph has cycles.
+        """
+
+        pending = {node: len(self._uses.get(node, ())) for node in self.kinds}
+        ready = [node for node, count in pending.items() if count == 0]
+        heapq.heapify(ready)
+        order: List[str] = []
+        while ready:
+            node = heapq.heappop(ready)
+            order.append(node)
+            for dependent in self._used_by.get(node, ()):
+                pending[dependent] -= 1
+                if pending[dependent] == 0:
+                    heapq.heappush(ready, dependent)
+        if len(order) != len(self.kinds):
+            raise LineageCycleError(self.cycles())
+        return order
+
+    def cycles(self) -> List[List[str]]:
+        """Return the strongly connected components that form cycles (Tarjan's algorithm)."""
+
+        index: Dict[str, int] = {}
+        low: Dict[str, int] = {}
+        stack: List[str] = []
+        on_stack: Set[str] = set()
+        found: List[List[str]] = []
+        for start in sorted(self.kinds):
+            if start in index:
+                continue
+            index[start] = low[start] = len(index)
+            stack.append(start)
+            on_stack.add(start)
+            work = [(start, iter(sorted(self._used_by.get(start, ()))))]
+            while work:
+                node, neighbours = work[-1]
+                for neighbour in neighbours:
+                    if neighbour not in index:
+                        index[neighbour] = low[neighbour] = len(index)
+                        stack.append(neighbour)
+                        on_stack.add(neighbour)
+                        work.append((neighbour, iter(sorted(self._used_by.get(neighbour, ())))))
+                        break
+                    if neighbour in on_stack:
+                        low[node] = min(low[node], index[neighbour])
+                else:
+                    work.pop()
+                    if work:
+                        parent = work[-1][0]
+                        low[parent] = min(low[parent], low[node])
+                    if low[node] == index[node]:
+                        component: List[str] = []
+                        while True:
+                            member = stack.pop()
+                            on_stack.discard(member)
+                            component.append(member)
+                            if member == node:
+                                break
+                        if len(component) > 1 or node in self._used_by.get(node, ()):
+                            found.append(sorted(component))
+        return found
+
+    # ------------------------------------------------------------------
+    # Incremental updates
+    def add_column(self, column: Element, datasource: Element) -> None:
+        """Register a column just added to *datasource*, with the fields its formula uses."""
+
+        qualifier = _qualifier(datasource)
+        node = self._add_field(qualifier, column)
+        formula = _formula(column)
+        if formula:
+            self._link_formula(node, formula, qualifier)
+
+    def add_parameter(self, name: str) -> None:
+        bracketed = name if name.startswith("[") else f"[{name}]"
+        node = f"{PARAMETERS_QUALIFIER}.{bracketed}"
+        self._define(node, "parameter")
+        self._fields.setdefault(PARAMETERS_QUALIFIER, {})[bracketed] = node
+
+    def rename(self, datasource: Element, names: Mapping[str, str]) -> None:
+        """Follow a rename of the fields of *datasource*; *names* maps old to new bracketed names.
+
+        Call it after the columns were renamed, so their new captions are picked up.
+        """
+
+        qualifier = _qualifier(datasource)
+        for old, new in names.items():
+            self._relabel(f"{qualifier}.{old}", f"{qualifier}.{new}")
+        self._fields[qualifier] = {}
+        self._index_datasource(datasource)
+
+    # ------------------------------------------------------------------
+    def _index_datasource(self, ds: Element) -> None:
+        qualifier = _qualifier(ds)
+        if ds.get("caption"):
+            self._aliases[f"[{ds.get('caption')}]"] = qualifier
+        self._fields.setdefault(qualifier, {})
+        for column in datasources.list_columns(ds):
+            self._add_field(qualifier, column)
+
+    def _add_field(self, qualifier: str, column: Element) -> str:
+        name = _column_name(column)
+        node = f"{qualifier}.{name}"
+        kind = "parameter" if qualifier == PARAMETERS_QUALIFIER else "calculation" if _formula(column) else "column"
+        self._define(node, kind)
+        lookup = self._fields.setdefault(qualifier, {})
+        lookup[name] = node
+        if column.get("caption"):
+            lookup.setdefault(f"[{column.get('caption')}]", node)
+        return node
+
+    def _define(self, node: str, kind: str) -> None:
+        if self.kinds.get(node, "unknown") == "unknown":
+            self.kinds[node] = kind
+
+    def _link_formula(self, node: str, formula: str, qualifier: str) -> None:
+        for reference_qualifier, name in _formula_references(formula):
+            self._link(self._field(reference_qualifier or qualifier, name), node)
+
+    def _add_worksheet(self, worksheet: Element) -> None:
+        node = worksheet_node(worksheet.get("name") or "")
+        self._define(node, "worksheet")
+        scopes = [f"[{ds.get('name')}]" for ds in worksheet.iter("datasource") if ds.get("name")]
+        for element in worksheet.iter():
+            for attribute in WORKSHEET_ATTRIBUTES:
+                value = element.get(attribute)
+                if not value:
+                    continue
+                if attribute == "formula":
+                    references = _formula_references(value)
+                else:
+                    qualifier, name = split_field_reference(value)
+                    references = [(f"[{qualifier}]" if qualifier is not None else None, name)]
+                for qualifier, name in references:
+                    if qualifier is None:
+                        # Unqualified: the first of the worksheet's datasources that defines it.
+                        qualifier = next((scope for scope in scopes if name in self._fields.get(self._aliases.get(scope, scope), {})), None)
+                        qualifier = qualifier or (scopes[0] if scopes else None)
+                    if qualifier is not None:
+                        self._link(self._field(qualifier, name), node)
+
+    def _field(self, qualifier: str, name: str) -> str:
+        """Return the node of field *name* in the *qualifier* datasource, adding an unknown node if needed."""
+
+        qualifier = self._aliases.get(qualifier, qualifier)
+        node = self._fields.get(qualifier, {}).get(name)
+        if node is None:
+            node = f"{qualifier}.{name}"
+            self._define(node, "unknown")
+        return node
+
+    def _link(self, source: str, target: str) -> None:
+        self._used_by.setdefault(source, set()).add(target)
+        self._uses.setdefault(target, set()).add(source)
+
+    def _relabel(self, old: str, new: str) -> None:
+        if old == new or old not in self.kinds:
+            return
+        kind = self.kinds.pop(old)
+        self._define(new, kind)
+        for source in self._uses.pop(old, set()):
+            self._used_by.get(source, set()).discard(old)
+            self._link(new if source == old else source, new)
+        for target in self._used_by.pop(old, set()):
+            self._uses.get(target, set()).discard(old)
+            self._link(new, new if target == old else target)
+
+
+def _qualifier(datasource: Element) -> str:
+    return f"[{datasource.get('name') or datasource.get('caption') or ''}]"
+
+
+def _column_name(column: Element) -> str:
+    return column.get("name") or f"[{column.get('caption') or ''}]"
+
+
+def _formula_references(formula: str) -> List[Tuple[Optional[str], str]]:
+    """Return ``(qualifier, name)`` for each field *formula* uses; bracketed, qualifier ``None`` if absent."""
+
+    parsed = parse_calculation(formula)
+    if parsed.ast is not None:
+        return [(reference.qualifier, reference.name) for reference in parsed.references]
+    return [(None, name) for name in referenced_field_names(formula)]
+
+
+def _formula(column: Element) -> Optional[str]:
+    calculation = column.find("calculation")
+    return calculation.get("formula") if calculation is not None else None
@@ -0,0 +1,273 @@
+"""Three-way merge of workbook trees.
+
+:func:`merge_trees` applies the changes *theirs* made relative to *base* onto
+*ours*, in place. Elements are matched across the three trees the same way
+:mod:`.diffs` matches them: by name, zone id or position among unnamed
+siblings. Attribute and text changes made on one side only are taken as-is,
+added and removed elements are carried over, and a reordering made on one
+side only is applied. Everything else is left as in *ours* and reported as a
+:class:`MergeConflict`.
+
+Zones added on both sides under the same id are kept twice, with the zone
+from *theirs* renumbered through the workbook's
+:class:`~tableau_workbook_editor.core.xml_utils.IdRegistry`. The merge walks
+the trees once and never serialises them.
+"""
+from __future__ import annotations
+
+from dataclasses import asdict, dataclass, field
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from .diffs import ChildKey, Location, PathResolver, child_keys, element_children
+from .xml_utils import Element, IdRegistry, deep_copy_element, id_prefix
+
+CONFLICT_KINDS = ("attribute", "text", "add-add", "modify-delete", "delete-modify", "order")
+
+_Frame = Tuple[Element, Element, Element, Location, int]
+# Subtrees at this depth (datasources, worksheets, dashboards, ...) are skipped
+# when *theirs* left them unchanged, which avoids matching children for most
+# of the tree in the usual case of a few edits.
+_PRUNE_DEPTH = 2
+
+
+@dataclass(frozen=True)
+class MergeConflict:
+    """A change that could not be merged; the merged tree keeps the *ours* side.
+
+    ``path`` locates the element in the merged tree, or in *base* for elements
+    removed on our side.
+    """
+
+    kind: str
+    path: str
+    attribute: Optional[str] = None
+    base: Optional[str] = None
+    ours: Optional[str] = None
+    theirs: Optional[str] = None
+
+    def describe(self) -> str:
+        if self.kind in ("attribute", "text"):
+            label = f"@{self.attribute}" if self.kind == "attribute" else "text"
+            return f"{self.path} {label}: ours {self.ours!r}, theirs {self.theirs!r} (base {self.base!r})"
+        if self.kind == "add-add":
+            return f"{self.path} added on both sides with different content"
+        if self.kind == "modify-delete":
+            return f"{self.path} changed here but removed in theirs"
+        if self.kind == "delete-modify":
+            return f"{self.path} removed here but changed in theirs"
+        return f"{self.path} children reordered differently on both sides"
+
+    def to_dict(self) -> Dict[str, Optional[str]]:
+        return asdict(self)
+
+
+@dataclass
+class MergeResult:
+    """Outcome of :func:`merge_trees`."""
+
+    conflicts: List[MergeConflict] = field(default_factory=list)
+    #: Number of changes taken from *theirs*.
+    applied: int = 0
+    #: Zone ids from *theirs* that were renumbered, old id to new id.
+    renumbered: Dict[str, str] = field(default_factory=dict)
+    #: Elements of *ours* that were modified, for the change journal.
+    touched: List[Element] = field(default_factory=list, repr=False)
+
+    @property
+    def ok(self) -> bool:
+        return not self.conflicts
+
+    def to_dict(self) -> Dict[str, object]:
+        return {
+            "ok": self.ok,
+            "applied": self.applied,
+            "renumbered": dict(self.renumbered),
+            "conflicts": [conflict.to_dict() for conflict in self.conflicts],
+        }
+
+
+def merge_trees(base: Element, ours: Element, theirs: Element, *, registry: Optional[IdRegistry] = None) -> MergeResult:
+    """Apply the changes from *base* to *theirs* onto *ours* and return what happened.
+
+    *registry* must know every id in *ours*. When omitted, one is built the
+    first time a zone from *theirs* is copied over.
+    """
+
+    if not base.tag == ours.tag == theirs.tag:
+        raise ValueError(f"Cannot merge <{ours.tag}> with <{theirs.tag}> over <{base.tag}>")
+    return _Merger(ours, registry).run(base, ours, theirs)
+
+
+def subtrees_equal(left: Element, right: Element) -> bool:
+    """Return ``True`` when both subtrees have the same tags, attributes, text and child order."""
+
+    stack = [(left, right)]
+    while stack:
+        a, b = stack.pop()
+        if a.tag != b.tag or a.items() != b.items() or (a.text or "").strip() != (b.text or "").strip():
+            return False
+        a_children, b_children = element_children(a), element_children(b)
+        if len(a_children) != len(b_children):
+            return False
+        stack.extend(zip(a_children, b_children))
+    return True
+
+
+class _Merger:
+    def __init__(self, ours: Element, registry: Optional[IdRegistry]) -> None:
+        self.ours = ours
+        self.paths = PathResolver(f"/{ours.tag}")
+        self.result = MergeResult()
+        self._registry = registry
+        self._touched: Dict[int, Element] = {}
+
+    @property
+    def registry(self) -> IdRegistry:
+        if self._registry is None:
+            self._registry = IdRegistry([self.ours])
+        return self._registry
+
+    def run(self, base: Element, ours: Element, theirs: Element) -> MergeResult:
+        stack: List[_Frame] = [(base, ours, theirs, None, 0)]
+        while stack:
+            b, o, t, location, depth = stack.pop()
+            if depth == _PRUNE_DEPTH and subtrees_equal(b, t):
+                continue
+            self._merge_node(b, o, t, location)
+            if not (len(b) or len(o) or len(t)):
+                continue
+            children = element_children(b), element_children(o), element_children(t)
+            keys = child_keys(children[0]), child_keys(children[1]), child_keys(children[2])
+            if keys[0] == keys[1] == keys[2]:
+                for index in range(len(keys[1]) - 1, -1, -1):
+                    stack.append((children[0][index], children[1][index], children[2][index], (location, keys[1], index), depth + 1))
+                continue
+            stack.extend(reversed(self._merge_children(o, location, depth + 1, children, keys)))
+        self.result.touched = list(self._touched.values())
+        return self.result
+
+    # ------------------------------------------------------------------
+    def _merge_node(self, b: Element, o: Element, t: Element, location: Location) -> None:
+        base_items, ours_items, theirs_items = b.items(), o.items(), t.items()
+        if theirs_items != ours_items and theirs_items != base_items:
+            base_attributes, ours_attributes, theirs_attributes = dict(base_items), dict(ours_items), dict(theirs_items)
+            for name in sorted(set(base_attributes) | set(ours_attributes) | set(theirs_attributes)):
+                before, mine, other = base_attributes.get(name), ours_attributes.get(name), theirs_attributes.get(name)
+                if other == before or other == mine:
+                    continue
+                if mine != before:
+                    self._conflict("attribute", location, attribute=name, base=before, ours=mine, theirs=other)
+                elif other is None:
+                    del o.attrib[name]
+                    self._applied(o)
+                else:
+                    o.set(name, other)
+                    self._applied(o)
+        if t.text != o.text:
+            before, mine, other = ((e.text or "").strip() for e in (b, o, t))
+            if other != before and other != mine:
+                if mine != before:
+                    self._conflict("text", location, base=before, ours=mine, theirs=other)
+                else:
+                    o.text = t.text
+                    self._applied(o)
+
+    def _merge_children(
+        self,
+        o: Element,
+        location: Location,
+        depth: int,
+        children: Tuple[List[Element], List[Element], List[Element]],
+        keys: Tuple[List[ChildKey], List[ChildKey], List[ChildKey]],
+    ) -> List[_Frame]:
+        base_keys, ours_keys, theirs_keys = keys
+        base_at = dict(zip(base_keys, children[0]))
+        ours_at = dict(zip(ours_keys, children[1]))
+        theirs_at = dict(zip(theirs_keys, children[2]))
+        ours_index = {key: index for index, key in enumerate(ours_keys)}
+
+        for index, key in enumerate(base_keys):
+            if key not in theirs_at and key in ours_at:
+                if subtrees_equal(base_at[key], ours_at[key]):
+                    o.remove(ours_at.pop(key))
+                    self._applied(o)
+                else:
+                    self._conflict("modify-delete", (location, ours_keys, ours_index[key]))
+            elif key in theirs_at and key not in ours_at and not subtrees_equal(base_at[key], theirs_at[key]):
+                self._conflict("delete-modify", (location, base_keys, index))
+
+        self._reorder(o, location, [key for key in base_keys if key in ours_at and key in theirs_at], keys, ours_at)
+
+        frames: List[_Frame] = []
+        for key in ours_keys:
+            if key not in ours_at or key not in theirs_at:
+                continue
+            if key in base_at:
+                frames.append((base_at[key], ours_at[key], theirs_at[key], (location, ours_keys, ours_index[key]), depth))
+            elif not subtrees_equal(ours_at[key], theirs_at[key]):
+                if key[0] == "zone":
+                    self._insert_after(o, ours_at[key], self._adopt(theirs_at[key]))
+                else:
+                    self._conflict("add-add", (location, ours_keys, ours_index[key]))
+
+        previous: Optional[Element] = None
+        for key in theirs_keys:
+            if key in ours_at:
+                previous = ours_at[key]
+            elif key not in base_at:
+                previous = self._insert_after(o, previous, self._adopt(theirs_at[key]))
+        return frames
+
+    def _reorder(
+        self,
+        o: Element,
+        location: Location,
+        common: Sequence[ChildKey],
+        keys: Tuple[List[ChildKey], List[ChildKey], List[ChildKey]],
+        ours_at: Dict[ChildKey, Element],
+    ) -> None:
+        """Apply a reordering of the children present on all sides made by *theirs* only."""
+
+        shared = set(common)
+        ours_order = [key for key in keys[1] if key in shared]
+        theirs_order = [key for key in keys[2] if key in shared]
+        if theirs_order == list(common) or theirs_order == ours_order:
+            return
+        if ours_order != list(common):
+            self._conflict("order", location)
+            return
+        moved = iter(ours_at[key] for key in theirs_order)
+        members = {id(ours_at[key]) for key in shared}
+        o[:] = [next(moved) if id(child) in members else child for child in list(o)]
+        self._applied(o)
+
+    def _adopt(self, element: Element) -> Element:
+        """Copy *element* from *theirs*, renumbering zone ids already used in *ours*."""
+
+        adopted = deep_copy_element(element)
+        for zone in adopted.iter("zone"):
+            identifier = zone.get("id")
+            if not identifier:
+                continue
+            if identifier in self.registry.known_ids:
+                renumbered = self.registry.new(id_prefix(identifier))
+                zone.set("id", renumbered)
+                self.result.renumbered[identifier] = renumbered
+            else:
+                self.registry.reserve(identifier)
+        return adopted
+
+    def _insert_after(self, parent: Element, anchor: Optional[Element], element: Element) -> Element:
+        if anchor is None:
+            parent.insert(0, element)
+        else:
+            parent.insert(parent.index(anchor) + 1, element)
+        self._applied(parent)
+        return element
+
+    def _applied(self, element: Element) -> None:
+        self.result.applied += 1
+        self._touched.setdefault(id(element), element)
+
+    def _conflict(self, kind: str, location: Location, **values: Optional[str]) -> None:
+        self.result.conflicts.append(MergeConflict(kind, self.paths.resolve(location), **values))
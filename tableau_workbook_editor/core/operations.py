@@ -0,0 +1,202 @@
+"""Declarative workbook operations applied in batches."""
+from __future__ import annotations
+
+import inspect
+import json
+import typing
+from collections.abc import Mapping as MappingABC
+from dataclasses import dataclass, field
+from functools import lru_cache
+from pathlib import Path
+from typing import TYPE_CHECKING, Any, Dict, Iterable, List, Mapping
+
+if TYPE_CHECKING:  # pragma: no cover
+    from .twb_model import Workbook
+
+
+#: Operation names (as used by the CLI commands) mapped to Workbook methods.
+OPERATIONS: Dict[str, str] = {
+    "rename-field": "rename_field",
+    "rename-fields": "rename_fields",
+    "add-calc": "add_calculation",
+    "set-parameter": "set_parameter",
+    "add-sheet-to-dashboard": "add_sheet_to_dashboard",
+    "move-zone": "move_zone",
+    "move-zones": "move_zones",
+    "add-filter-action": "add_filter_action",
+    "set-connection": "set_connection",
+    "rewrite-connections": "rewrite_connections",
+}
+
+# CLI option names accepted as aliases of the Workbook keyword arguments.
+_ARGUMENT_ALIASES: Dict[str, Dict[str, str]] = {
+    "rename_field": {"from": "old", "to": "new"},
+    "add_calculation": {"type": "data_type"},
+    "set_parameter": {"type": "data_type", "allow": "allowable_values"},
+    "add_filter_action": {"target_sheet": "target"},
+}
+
+
+class OperationError(ValueError):
+    """Raised when an operation is malformed or fails to apply."""
+
+    def __init__(self, index: int, operation: str, message: str) -> None:
+        super().__init__(f"Operation {index + 1} ({operation}): {message}")
+        self.index = index
+        self.operation = operation
+
+
+@dataclass
+class Operation:
+    """A single validated call to a :class:`Workbook` mutator."""
+
+    name: str
+    method: str
+    arguments: Dict[str, Any] = field(default_factory=dict)
+
+    def apply(self, workbook: "Workbook") -> None:
+        getattr(workbook, self.method)(**self.arguments)
+
+
+def resolve_operation(name: str) -> str:
+    """Return the Workbook method for *name* (a CLI name or a method name)."""
+
+    normalised = name.strip().replace("_", "-")
+    if normalised in OPERATIONS:
+        return OPERATIONS[normalised]
+    method = name.strip()
+    if method in OPERATIONS.values():
+        return method
+    raise KeyError(name)
+
+
+def parse_operation(index: int, item: Mapping[str, Any]) -> Operation:
+    from .twb_model import Workbook
+
+    if not isinstance(item, Mapping) or "op" not in item:
+        raise OperationError(index, "?", "expected a mapping with an 'op' key")
+    name = str(item["op"])
+    try:
+        method = resolve_operation(name)
+    except KeyError:
+        raise OperationError(index, name, f"unknown operation; expected one of {', '.join(OPERATIONS)}") from None
+    aliases = _ARGUMENT_ALIASES.get(method, {})
+    arguments: Dict[str, Any] = {}
+    for key, value in item.items():
+        if key == "op":
+            continue
+        argument = key.replace("-", "_")
+        arguments[aliases.get(argument, argument)] = value
+    try:
+        inspect.signature(getattr(Workbook, method)).bind(None, **arguments)
+    except TypeError as exc:
+        raise OperationError(index, name, str(exc)) from None
+    hints = _argument_types(method)
+    for argument, value in arguments.items():
+        if argument in hints:
+            try:
+                arguments[argument] = _coerce(value, hints[argument])
+            except (TypeError, ValueError) as exc:
+                raise OperationError(index, name, f"argument '{argument}': {exc}") from None
+    return Operation(name=name, method=method, arguments=arguments)
+
+
+@lru_cache(maxsize=None)
+def _argument_types(method: str) -> Dict[str, Any]:
+    from .twb_model import Workbook
+
+    try:
+        return typing.get_type_hints(getattr(Workbook, method))
+    except NameError:
+        # Annotations naming types imported only for type checking; the
+        # method converts its own arguments.
+        return {}
+
+
+def _coerce(value: Any, hint: Any) -> Any:
+    """Convert JSON/YAML scalars in *value* to the types *hint* expects.
+
+    Numbers and booleans become strings for ``str`` arguments (``value: 5`` in
+    a YAML file) and numeric strings become integers for ``int`` arguments
+    (``--arg x=10`` on the command line); values of the wrong shape raise
+    ``TypeError`` so the operation is rejected before anything runs.
+    """
+
+    origin = typing.get_origin(hint)
+    args = typing.get_args(hint)
+    if origin is typing.Union:
+        if value is None and type(None) in args:
+            return None
+        options = [arg for arg in args if arg is not type(None)]
+        return _coerce(value, options[0]) if len(options) == 1 else value
+    if hint is str:
+        if isinstance(value, str):
+            return value
+        if isinstance(value, bool):
+            return "true" if value else "false"
+        if isinstance(value, (int, float)):
+            return str(value)
+        raise TypeError(f"expected a string, got {type(value).__name__}")
+    if hint is bool:
+        if isinstance(value, bool):
+            return value
+        if isinstance(value, str) and value.lower() in {"true", "false"}:
+            return value.lower() == "true"
+        raise TypeError(f"expected true or false, got {value!r}")
+    if hint is int:
+        if isinstance(value, int) and not isinstance(value, bool):
+            return value
+        if isinstance(value, str):
+            try:
+                return int(value)
+            except ValueError:
+                pass
+        raise TypeError(f"expected an integer, got {value!r}")
+    if origin is list and args:
+        if not isinstance(value, (list, tuple)):
+            raise TypeError(f"expected a list, got {type(value).__name__}")
+        return [_coerce(item, args[0]) for item in value]
+    if origin in (dict, MappingABC) and len(args) == 2:
+        if not isinstance(value, Mapping):
+            raise TypeError(f"expected a mapping, got {type(value).__name__}")
+        return {_coerce(key, args[0]): _coerce(item, args[1]) for key, item in value.items()}
+    return value
+
+
+def parse_operations(items: Iterable[Mapping[str, Any]]) -> List[Operation]:
+    return [parse_operation(index, item) for index, item in enumerate(items)]
+
+
+def load_operations(path: Path) -> List[Operation]:
+    """Read operations from a JSON or YAML file.
+
+    The file holds either a list of operations or a mapping with an
+    ``operations`` list. Each operation is a mapping with an ``op`` key and the
+    keyword arguments of the matching Workbook method.
+    """
+
+    data = _read_structured(path, "operation")
+    if isinstance(data, Mapping):
+        data = data.get("operations")
+    if not isinstance(data, list):
+        raise ValueError(f"{path}: expected a list of operations")
+    return parse_operations(data)
+
+
+def _read_structured(path: Path, kind: str) -> Any:
+    """Parse the JSON or YAML file at *path*, raising ``ValueError`` naming it on any failure."""
+
+    text = path.read_text(encoding="utf-8")
+    if path.suffix.lower() not in {".yaml", ".yml"}:
+        try:
+            return json.loads(text)
+        except ValueError as exc:
+            raise ValueError(f"{path}: invalid JSON: {exc}") from None
+    try:
+        import yaml  # type: ignore
+    except ImportError:  # pragma: no cover - optional dependency
+        raise ValueError(f"{path}: reading YAML {kind} files requires PyYAML (pip install tableau_workbook_editor[yaml])") from None
+    try:
+        return yaml.safe_load(text)
+    except yaml.YAMLError as exc:
+        raise ValueError(f"{path}: invalid YAML: {exc}") from None
@@ -3,10 +3,16 @@ from __future__ import annotations
 
 from dataclasses import dataclass
 from pathlib import Path
-from typing import Optional
+from typing import TYPE_CHECKING, Optional, Tuple
 
-from . import twbx_utils, xml_utils
-from .twb_model import Workbook
+from .scanner import WorkbookSummary, scan_workbook
+
+if TYPE_CHECKING:  # pragma: no cover
+    from . import twbx_utils
+    from .cache import MetadataCache
+    from .twb_model import Workbook
+
+OPEN_MODES = ("full", "scan")
 
 
 @dataclass
@@ -14,9 +20,27 @@ class WorkbookSource:
     path: Path
     is_twbx: bool
     packaged: Optional[twbx_utils.PackagedWorkbook]
+    #: ``(size, mtime_ns)`` of a ``.twb`` when it was read; splice saves re-read it only if unchanged.
+    signature: Optional[Tuple[int, int]] = None
+
+
+def open_workbook(path: Path, mode: str = "full", cache: Optional["MetadataCache"] = None) -> Workbook | WorkbookSummary:
+    """Open *path* as an editable :class:`Workbook`.
+
+    ``mode="scan"`` instead streams the XML and returns a read-only
+    :class:`WorkbookSummary`, which answers the ``list_*`` queries without
+    building the element tree. With a *cache*, scan results are looked up in
+    and stored to the :class:`~tableau_workbook_editor.core.cache.MetadataCache`.
+    """
 
+    if mode not in OPEN_MODES:
+        raise ValueError(f"Unsupported open mode '{mode}': expected one of {', '.join(OPEN_MODES)}")
+    if mode == "scan":
+        return cache.summary(path) if cache is not None else scan_workbook(path)
+    # Scan mode never needs the element tree or the workbook model.
+    from . import twbx_utils, xml_utils
+    from .twb_model import Workbook
 
-def open_workbook(path: Path) -> Workbook:
     path = path.expanduser().resolve()
     if not path.exists():
         raise FileNotFoundError(path)
@@ -25,9 +49,10 @@ def open_workbook(path: Path) -> Workbook:
         root = xml_utils.load_xml(package.workbook_xml)
         source = WorkbookSource(path=path, is_twbx=True, packaged=package)
     elif path.suffix.lower() == ".twb":
+        stat = path.stat()
         data = path.read_bytes()
         root = xml_utils.load_xml(data)
-        source = WorkbookSource(path=path, is_twbx=False, packaged=None)
+        source = WorkbookSource(path=path, is_twbx=False, packaged=None, signature=(stat.st_size, stat.st_mtime_ns))
     else:
         raise ValueError("Unsupported workbook extension: expected .twb or .twbx")
     return Workbook(root=root, source=source)
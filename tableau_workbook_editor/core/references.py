@@ -0,0 +1,224 @@
+"""Reverse index from field references to the elements that mention them."""
+from __future__ import annotations
+
+import re
+from dataclasses import dataclass
+from typing import Dict, Iterable, List, Mapping, Optional, Set, Tuple
+
+from . import actions, datasources, worksheets
+from .calc_utils import referenced_field_names, rename_references
+from .xml_utils import Element, xpath
+
+#: A bracketed field token such as ``[Profit]``; ``]]`` escapes a literal bracket.
+FIELD_TOKEN = re.compile(r"\[(?:[^\]]|\]\])*\]")
+_MAPPING_SEGMENT = re.compile(r"[^=;]+")
+
+# Attributes indexed below datasources and worksheets respectively.
+DATASOURCE_ATTRIBUTES = ("ref", "formula")
+WORKSHEET_ATTRIBUTES = ("ref", "column", "formula")
+
+_SiteKey = Tuple[int, str]
+
+
+@dataclass(frozen=True)
+class ReferenceSite:
+    """An attribute of *element* that mentions a field.
+
+    ``scope`` is the datasource element for sites inside a datasource and
+    ``None`` for worksheet and action sites, which may refer to any datasource.
+    """
+
+    element: Element
+    attribute: str
+    scope: Optional[Element]
+
+    @property
+    def key(self) -> _SiteKey:
+        return (id(self.element), self.attribute)
+
+
+def field_tokens(text: str) -> List[str]:
+    return FIELD_TOKEN.findall(text)
+
+
+def mapping_fields(mapping: str) -> List[str]:
+    """Return the field captions of an action ``mapping`` string."""
+
+    return [segment.strip() for segment in _MAPPING_SEGMENT.findall(mapping) if segment.strip()]
+
+
+def rewrite_formula(formula: str, renames: Mapping[str, str], qualifier: Optional[str] = None) -> str:
+    """Replace the field references of *formula* found in *renames*.
+
+    All replacements happen in one pass over the parsed references, so
+    chained renames (``A -> B``, ``B -> C``) are applied simultaneously and
+    string literals and comments are left untouched. See
+    :func:`~tableau_workbook_editor.core.calc_utils.rename_references`.
+    """
+
+    return rename_references(formula, renames, qualifier)
+
+
+def rewrite_mapping(mapping: str, renames: Mapping[str, str]) -> str:
+    """Replace whole field captions of an action ``mapping`` string, keeping separators."""
+
+    def replace(match: "re.Match[str]") -> str:
+        segment = match.group(0)
+        stripped = segment.strip()
+        if stripped not in renames:
+            return segment
+        start = segment.index(stripped)
+        return segment[:start] + renames[stripped] + segment[start + len(stripped) :]
+
+    return _MAPPING_SEGMENT.sub(replace, mapping)
+
+
+class FieldReferenceIndex:
+    """Lazily built map from field tokens to the attributes that mention them.
+
+    ``ref`` and ``column`` attributes are indexed under their last field token
+    (``[Orders].[Profit]`` under ``[Profit]``), formulas under every field
+    they reference and filter action mappings under their field captions. Renames
+    rewrite only the indexed sites and re-index them in place. Elements added
+    through :class:`~tableau_workbook_editor.core.twb_model.Workbook` are
+    registered with :meth:`add`; call :meth:`invalidate` after editing the
+    tree directly.
+    """
+
+    def __init__(self, root: Element) -> None:
+        self.root = root
+        self._fields: Optional[Dict[str, Dict[_SiteKey, ReferenceSite]]] = None
+        self._captions: Dict[str, Dict[_SiteKey, ReferenceSite]] = {}
+        self._site_keys: Dict[_SiteKey, Set[str]] = {}
+
+    # ------------------------------------------------------------------
+    def sites(self, field: str) -> List[ReferenceSite]:
+        return list(self._index().get(field, {}).values())
+
+    def mapping_sites(self, caption: str) -> List[ReferenceSite]:
+        self._index()
+        return list(self._captions.get(caption, {}).values())
+
+    def add(self, element: Element, scope: Optional[Element]) -> None:
+        """Index *element* and its descendants after they were added to the tree."""
+
+        if self._fields is None:
+            return
+        attributes = DATASOURCE_ATTRIBUTES if scope is not None else WORKSHEET_ATTRIBUTES
+        self._index_subtree(element, scope, attributes)
+
+    def add_action(self, action: Element) -> None:
+        if self._fields is None:
+            return
+        self._index_action(action)
+
+    def invalidate(self) -> None:
+        self._fields = None
+        self._captions = {}
+        self._site_keys = {}
+
+    # ------------------------------------------------------------------
+    def rename(
+        self,
+        *,
+        scope: Element,
+        names: Mapping[str, str],
+        captions: Mapping[str, str],
+    ) -> List[Element]:
+        """Rewrite references to the fields of the *scope* datasource.
+
+        *names* maps old to new bracketed field names and *captions* old to
+        new captions (used by action mappings). Returns the elements that were
+        changed.
+        """
+
+        fields = self._index()
+        qualifier = f"[{scope.get('name')}]" if scope.get("name") else None
+        qualified = dict(names)
+        if qualifier is not None:
+            qualified.update({f"{qualifier}.{old}": f"{qualifier}.{new}" for old, new in names.items()})
+
+        pending: Dict[_SiteKey, ReferenceSite] = {}
+        for old in names:
+            for key, site in fields.get(old, {}).items():
+                if site.scope is None or site.scope is scope:
+                    pending[key] = site
+        touched: List[Element] = []
+        for site in pending.values():
+            value = site.element.get(site.attribute)
+            if value is None:
+                continue
+            if site.attribute == "formula":
+                updated = rewrite_formula(value, names, qualifier)
+            else:
+                updated = qualified.get(value, value)
+            if updated != value:
+                site.element.set(site.attribute, updated)
+                self._reindex(site)
+                touched.append(site.element)
+
+        mapping_pending: Dict[_SiteKey, ReferenceSite] = {}
+        for old in captions:
+            mapping_pending.update(self._captions.get(old, {}))
+        for site in mapping_pending.values():
+            value = site.element.get("mapping")
+            if value is None:
+                continue
+            updated = rewrite_mapping(value, captions)
+            if updated != value:
+                site.element.set("mapping", updated)
+                self._reindex(site)
+                touched.append(site.element)
+        return touched
+
+    # ------------------------------------------------------------------
+    def _index(self) -> Dict[str, Dict[_SiteKey, ReferenceSite]]:
+        if self._fields is None:
+            self._fields = {}
+            self._captions = {}
+            self._site_keys = {}
+            for ds in xpath(self.root, datasources.DATASOURCES_XPATH):
+                self._index_subtree(ds, ds, DATASOURCE_ATTRIBUTES)
+            for worksheet in xpath(self.root, worksheets.WORKSHEETS_XPATH):
+                self._index_subtree(worksheet, None, WORKSHEET_ATTRIBUTES)
+            for action in actions.list_actions(self.root):
+                self._index_action(action)
+        return self._fields
+
+    def _index_subtree(self, element: Element, scope: Optional[Element], attributes: Iterable[str]) -> None:
+        for node in element.iter():
+            for attribute in attributes:
+                if node.get(attribute):
+                    self._register(ReferenceSite(node, attribute, scope))
+
+    def _index_action(self, action: Element) -> None:
+        if action.get("mapping"):
+            self._register(ReferenceSite(action, "mapping", None))
+
+    def _site_tokens(self, site: ReferenceSite) -> Set[str]:
+        value = site.element.get(site.attribute) or ""
+        if site.attribute == "mapping":
+            return set(mapping_fields(value))
+        if site.attribute == "formula":
+            return referenced_field_names(value)
+        tokens = field_tokens(value)
+        return {tokens[-1]} if tokens else {value}
+
+    def _register(self, site: ReferenceSite) -> None:
+        assert self._fields is not None
+        table = self._captions if site.attribute == "mapping" else self._fields
+        tokens = self._site_tokens(site)
+        self._site_keys[site.key] = tokens
+        for token in tokens:
+            table.setdefault(token, {})[site.key] = site
+
+    def _reindex(self, site: ReferenceSite) -> None:
+        table = self._captions if site.attribute == "mapping" else self._fields
+        assert table is not None
+        for token in self._site_keys.pop(site.key, set()):
+            bucket = table.get(token)
+            if bucket is not None:
+                bucket.pop(site.key, None)
+                if not bucket:
+                    del table[token]
+        self._register(site)
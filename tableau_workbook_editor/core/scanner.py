@@ -0,0 +1,138 @@
+"""Streaming, read-only workbook inspection.
+
+Building the full element tree is wasteful when a caller only needs the names
+of the top level workbook objects. :func:`scan_workbook` walks the XML with an
+incremental parser and discards every element as soon as it has been seen, so
+memory use does not grow with the size of the workbook.
+"""
+from __future__ import annotations
+
+from dataclasses import asdict, dataclass, field
+from pathlib import Path
+from typing import Any, BinaryIO, Callable, Dict, List, Mapping, Tuple
+from zipfile import ZipFile
+
+from .actions import action_label
+from .datasources import column_label
+from .xml_utils import Element, iterparse_xml
+
+
+def _name(element: Element) -> str:
+    return element.get("name") or ""
+
+
+def _name_or_caption(element: Element) -> str:
+    return element.get("name") or element.get("caption") or ""
+
+
+# Element paths (relative to the ``<workbook>`` root) mirroring the XPath
+# expressions used by the worksheet, dashboard, datasource, parameter and
+# action helpers, together with how each element is named.
+_COLLECTED: Dict[Tuple[str, ...], Tuple[str, Callable[[Element], str]]] = {
+    ("worksheets", "worksheet"): ("worksheets", _name),
+    ("dashboards", "dashboard"): ("dashboards", _name),
+    ("datasources", "datasource"): ("datasources", _name_or_caption),
+    ("parameters", "parameter"): ("parameters", _name),
+    ("actions", "action"): ("actions", action_label),
+}
+# Columns are grouped under the datasource collected just before them.
+_COLUMN_PATH = ("datasources", "datasource", "column")
+
+
+@dataclass
+class WorkbookSummary:
+    """Names of the top level objects of a workbook, gathered by :func:`scan_workbook`.
+
+    The ``list_*`` methods mirror :class:`~tableau_workbook_editor.core.twb_model.Workbook`
+    so read-only callers can use either object interchangeably.
+    """
+
+    path: Path
+    worksheets: List[str] = field(default_factory=list)
+    dashboards: List[str] = field(default_factory=list)
+    datasources: List[str] = field(default_factory=list)
+    parameters: List[str] = field(default_factory=list)
+    actions: List[str] = field(default_factory=list)
+    columns: Dict[str, List[str]] = field(default_factory=dict)
+
+    def list_worksheets(self) -> List[str]:
+        return list(self.worksheets)
+
+    def list_dashboards(self) -> List[str]:
+        return list(self.dashboards)
+
+    def list_datasources(self) -> List[str]:
+        return list(self.datasources)
+
+    def list_parameters(self) -> List[str]:
+        return list(self.parameters)
+
+    def list_columns(self, datasource: str) -> List[str]:
+        if datasource not in self.columns:
+            raise ValueError(f"Datasource '{datasource}' not found")
+        return list(self.columns[datasource])
+
+    def list_actions(self) -> List[str]:
+        return list(self.actions)
+
+    def to_dict(self) -> Dict[str, Any]:
+        data = asdict(self)
+        del data["path"]
+        return data
+
+    @classmethod
+    def from_dict(cls, path: Path, data: Mapping[str, Any]) -> "WorkbookSummary":
+        return cls(path=path, **data)
+
+
+def scan_stream(stream: BinaryIO, path: Path) -> WorkbookSummary:
+    """Scan the workbook XML readable from *stream*."""
+
+    summary = WorkbookSummary(path=path)
+    columns: List[str] = []
+    tags: List[str] = []
+    stack: List[Element] = []
+    for event, element in iterparse_xml(stream, events=("start", "end")):
+        if event == "start":
+            tags.append(element.tag)
+            stack.append(element)
+            key = tuple(tags[1:])
+            collected = _COLLECTED.get(key)
+            if collected is not None:
+                attribute, namer = collected
+                getattr(summary, attribute).append(namer(element))
+                if attribute == "datasources":
+                    columns = summary.columns.setdefault(summary.datasources[-1], [])
+            elif key == _COLUMN_PATH:
+                columns.append(column_label(element))
+            continue
+        tags.pop()
+        stack.pop()
+        # Drop the finished element so the partially built tree never holds
+        # more than the current ancestor chain.
+        element.clear()
+        if stack:
+            stack[-1].remove(element)
+    return summary
+
+
+def scan_workbook(path: Path) -> WorkbookSummary:
+    """Return a :class:`WorkbookSummary` for the ``.twb`` or ``.twbx`` at *path*."""
+
+    path = path.expanduser().resolve()
+    if not path.exists():
+        raise FileNotFoundError(path)
+    suffix = path.suffix.lower()
+    if suffix == ".twbx":
+        with ZipFile(path, "r") as zf:
+            inner = [info for info in zf.infolist() if info.filename.lower().endswith(".twb")]
+            if not inner:
+                raise ValueError("Packaged workbook does not contain a .twb file")
+            if len(inner) > 1:
+                raise ValueError("Multiple .twb files found inside the package")
+            with zf.open(inner[0]) as stream:
+                return scan_stream(stream, path)
+    if suffix == ".twb":
+        with path.open("rb") as stream:
+            return scan_stream(stream, path)
+    raise ValueError("Unsupported workbook extension: expected .twb or .twbx")
@@ -0,0 +1,462 @@
+"""Resident workbook server (``tbe serve``) and its client.
+
+The server keeps parsed :class:`~tableau_workbook_editor.core.twb_model.Workbook`
+objects in a :class:`WorkbookPool`, so consecutive commands against the same
+workbook skip the parse. Entries are evicted least recently used first once
+their estimated memory exceeds the pool budget, and are reloaded when the
+file's size or modification time changes on disk.
+
+Requests are JSON-RPC 2.0 objects, one per line, over a Unix domain socket:
+
+* ``call(path, method, arguments)`` invokes a read-only or mutating
+  :class:`Workbook` method on the cached workbook;
+* ``save(path, target, dry_run, package_assets, backup)`` writes it;
+* ``run(path, operations, ...)`` applies a list of operations and saves, like
+  ``tbe apply``;
+* ``discard(path)``, ``stats()``, ``ping()`` and ``shutdown()``.
+
+Parameters that do not fit the method, including the ``arguments`` that
+``call`` passes on to the workbook, are rejected with ``INVALID_PARAMS``
+before anything runs; any failure while the method runs is an
+``APPLICATION_ERROR``.
+"""
+from __future__ import annotations
+
+import inspect
+import json
+import os
+import shutil
+import socket
+import socketserver
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+from pathlib import Path
+from typing import TYPE_CHECKING, Any, Callable, Dict, List, Mapping, Optional, Tuple
+
+from . import operations
+
+if TYPE_CHECKING:  # pragma: no cover
+    from .twb_model import Workbook
+
+SOCKET_ENV = "TBE_SOCKET"
+SOCKET_NAME = "serve.sock"
+#: Estimated memory of all cached workbooks before least recently used ones are evicted.
+DEFAULT_MAX_BYTES = 512 * 1024 * 1024
+# A parsed tree with its indexes takes roughly this many times the size of its XML.
+TREE_OVERHEAD = 12
+
+READ_METHODS = (
+    "list_worksheets",
+    "list_dashboards",
+    "list_datasources",
+    "list_parameters",
+    "list_columns",
+    "list_actions",
+    "validate",
+    "diff",
+)
+MUTATION_METHODS = tuple(operations.OPERATIONS.values()) + ("apply",)
+
+# JSON-RPC 2.0 error codes.
+PARSE_ERROR = -32700
+INVALID_REQUEST = -32600
+METHOD_NOT_FOUND = -32601
+INVALID_PARAMS = -32602
+APPLICATION_ERROR = -32000
+
+_Signature = Tuple[int, int]
+
+
+class WorkbookConflict(RuntimeError):
+    """Raised when a workbook with unsaved edits was changed on disk."""
+
+
+class ServerError(RuntimeError):
+    """An error response returned by the server."""
+
+    def __init__(self, message: str, code: int = APPLICATION_ERROR, kind: Optional[str] = None) -> None:
+        super().__init__(message)
+        self.code = code
+        self.kind = kind
+
+
+def default_socket_path() -> Path:
+    """Return ``$TBE_SOCKET``, else ``serve.sock`` in the metadata cache directory."""
+
+    configured = os.environ.get(SOCKET_ENV)
+    if configured:
+        return Path(configured).expanduser()
+    from .cache import default_cache_dir
+
+    return default_cache_dir() / SOCKET_NAME
+
+
+def _signature(path: Path) -> _Signature:
+    stat = path.stat()
+    return (stat.st_size, stat.st_mtime_ns)
+
+
+def estimate_bytes(workbook: "Workbook") -> int:
+    """Estimate the memory held by *workbook* from the size of its XML."""
+
+    source = workbook.source
+    if source.packaged is not None:
+        size = len(source.packaged.workbook_xml)
+    elif source.signature is not None:
+        size = source.signature[0]
+    else:
+        size = source.path.stat().st_size
+    return size * TREE_OVERHEAD
+
+
+@dataclass
+class PoolEntry:
+    workbook: "Workbook"
+    signature: _Signature
+    size: int
+    #: ``True`` while the workbook holds edits that have not been saved.
+    pending: bool = False
+    hits: int = 0
+
+
+class WorkbookPool:
+    """LRU cache of open workbooks bounded by their estimated memory.
+
+    Not thread-safe; :class:`WorkbookServer` serialises access with a lock.
+    """
+
+    def __init__(self, max_bytes: int = DEFAULT_MAX_BYTES, *, loader: Optional[Callable[[Path], "Workbook"]] = None) -> None:
+        self.max_bytes = max_bytes
+        self._loader = loader
+        self._entries: "OrderedDict[Path, PoolEntry]" = OrderedDict()
+
+    def __contains__(self, path: Path) -> bool:
+        return path.expanduser().resolve() in self._entries
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    @property
+    def total_bytes(self) -> int:
+        return sum(entry.size for entry in self._entries.values())
+
+    def entry(self, path: Path) -> PoolEntry:
+        """Return the entry for *path*, (re)loading it when missing or changed on disk."""
+
+        path = path.expanduser().resolve()
+        signature = _signature(path)
+        entry = self._entries.get(path)
+        if entry is not None and entry.signature != signature:
+            if entry.pending:
+                raise WorkbookConflict(f"{path} changed on disk and has unsaved edits; discard them first")
+            del self._entries[path]
+            entry = None
+        if entry is None:
+            workbook = self._load(path)
+            entry = PoolEntry(workbook, signature, estimate_bytes(workbook))
+            self._entries[path] = entry
+            self._evict(keep=path)
+        else:
+            self._entries.move_to_end(path)
+        entry.hits += 1
+        return entry
+
+    def workbook(self, path: Path) -> "Workbook":
+        return self.entry(path).workbook
+
+    def saved(self, path: Path) -> None:
+        """Record that the workbook at *path* was just written back to *path*."""
+
+        path = path.expanduser().resolve()
+        entry = self._entries.get(path)
+        if entry is not None:
+            entry.signature = _signature(path)
+            entry.pending = False
+
+    def discard(self, path: Path) -> bool:
+        return self._entries.pop(path.expanduser().resolve(), None) is not None
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "entries": [
+                {"path": str(path), "bytes": entry.size, "hits": entry.hits, "pending": entry.pending}
+                for path, entry in self._entries.items()
+            ],
+            "bytes": self.total_bytes,
+            "max_bytes": self.max_bytes,
+        }
+
+    def _load(self, path: Path) -> "Workbook":
+        if self._loader is not None:
+            return self._loader(path)
+        from .reader import open_workbook
+
+        return open_workbook(path)
+
+    def _evict(self, keep: Path) -> None:
+        total = self.total_bytes
+        for path in list(self._entries):
+            if total <= self.max_bytes:
+                break
+            entry = self._entries[path]
+            # Unsaved edits are never dropped, and the entry just loaded stays.
+            if path == keep or entry.pending:
+                continue
+            del self._entries[path]
+            total -= entry.size
+
+
+class InvalidParams(ValueError):
+    """The arguments a request passes on to a Workbook method do not fit it."""
+
+
+def _jsonable(value: Any) -> Any:
+    from .connections import RewriteReport
+    from .validators import ValidationReport
+
+    if isinstance(value, (ValidationReport, RewriteReport)):
+        return value.to_dict()
+    if isinstance(value, Path):
+        return str(value)
+    return value
+
+
+class WorkbookService:
+    """The JSON-RPC methods, dispatched against a :class:`WorkbookPool`."""
+
+    def __init__(self, pool: WorkbookPool) -> None:
+        self.pool = pool
+        self.lock = threading.Lock()
+        self.on_shutdown: Optional[Callable[[], None]] = None
+        self._methods: Dict[str, Callable[..., Any]] = {
+            "ping": self.ping,
+            "stats": self.stats,
+            "call": self.call,
+            "save": self.save,
+            "run": self.run,
+            "discard": self.discard,
+            "shutdown": self.shutdown,
+        }
+
+    def handle(self, request: Any) -> Optional[Dict[str, Any]]:
+        """Return the response to a decoded JSON-RPC *request* (``None`` for notifications)."""
+
+        if not isinstance(request, dict) or request.get("jsonrpc") != "2.0" or not isinstance(request.get("method"), str):
+            return _error(None, INVALID_REQUEST, "Invalid request")
+        request_id = request.get("id")
+        method = self._methods.get(request["method"])
+        if method is None:
+            return _error(request_id, METHOD_NOT_FOUND, f"Unknown method '{request['method']}'")
+        params = request.get("params", {})
+        if not isinstance(params, dict):
+            return _error(request_id, INVALID_PARAMS, "params must be an object")
+        try:
+            inspect.signature(method).bind(**params)
+        except TypeError as exc:
+            return _error(request_id, INVALID_PARAMS, str(exc), type(exc).__name__)
+        try:
+            with self.lock:
+                result = method(**params)
+        except InvalidParams as exc:
+            return _error(request_id, INVALID_PARAMS, str(exc), type(exc).__name__)
+        except Exception as exc:  # noqa: BLE001 - every failure is reported to the client
+            return _error(request_id, APPLICATION_ERROR, str(exc), type(exc).__name__)
+        if "id" not in request:
+            return None
+        return {"jsonrpc": "2.0", "id": request_id, "result": _jsonable(result)}
+
+    # ------------------------------------------------------------------
+    def ping(self) -> Dict[str, Any]:
+        return {"pid": os.getpid()}
+
+    def stats(self) -> Dict[str, Any]:
+        return self.pool.stats()
+
+    def call(self, path: str, method: str, arguments: Optional[Mapping[str, Any]] = None) -> Any:
+        if method not in READ_METHODS and method not in MUTATION_METHODS:
+            raise ValueError(f"Workbook method '{method}' is not available over the server")
+        arguments = _check_arguments(method, arguments or {})
+        entry = self.pool.entry(Path(path))
+        if method in READ_METHODS:
+            return getattr(entry.workbook, method)(**arguments)
+        entry.pending = True
+        try:
+            return getattr(entry.workbook, method)(**arguments)
+        except Exception:
+            # A failed edit may leave the tree half modified.
+            self.pool.discard(Path(path))
+            raise
+
+    def save(
+        self,
+        path: str,
+        target: Optional[str] = None,
+        dry_run: bool = False,
+        package_assets: bool = False,
+        backup: bool = False,
+    ) -> Dict[str, Optional[str]]:
+        source = Path(path).expanduser().resolve()
+        entry = self.pool.entry(source)
+        backup_path = None
+        if backup and not dry_run:
+            backup_path = source.with_suffix(source.suffix + ".bak")
+            shutil.copy2(source, backup_path)
+        saved = entry.workbook.save(path=target, dry_run=dry_run, package_assets=package_assets)
+        if saved == source and (entry.workbook.source.is_twbx or not package_assets):
+            self.pool.saved(source)
+        elif entry.pending:
+            # The file no longer matches the edited tree; reload on next use.
+            self.pool.discard(source)
+        return {"path": None if saved is None else str(saved), "backup": None if backup_path is None else str(backup_path)}
+
+    def run(
+        self,
+        path: str,
+        operations: List[Mapping[str, Any]],
+        target: Optional[str] = None,
+        dry_run: bool = False,
+        package_assets: bool = False,
+        backup: bool = False,
+    ) -> Dict[str, Any]:
+        count = self.call(path, "apply", {"ops": operations})
+        saved = self.save(path, target=target, dry_run=dry_run, package_assets=package_assets, backup=backup)
+        return {"count": count, **saved}
+
+    def discard(self, path: str) -> bool:
+        return self.pool.discard(Path(path))
+
+    def shutdown(self) -> bool:
+        if self.on_shutdown is not None:
+            self.on_shutdown()
+        return True
+
+
+def _check_arguments(method: str, arguments: Mapping[str, Any]) -> Dict[str, Any]:
+    """Bind *arguments* to the Workbook *method*; operation arguments are also type-checked and converted."""
+
+    from .twb_model import Workbook
+
+    if not isinstance(arguments, Mapping):
+        raise InvalidParams("arguments must be an object")
+    if method in operations.OPERATIONS.values():
+        try:
+            return operations.parse_operation(0, {"op": method, **arguments}).arguments
+        except operations.OperationError as exc:
+            raise InvalidParams(str(exc)) from None
+    try:
+        inspect.signature(getattr(Workbook, method)).bind(None, **arguments)
+    except TypeError as exc:
+        raise InvalidParams(f"{method}: {exc}") from None
+    return dict(arguments)
+
+
+def _error(request_id: Any, code: int, message: str, kind: Optional[str] = None) -> Dict[str, Any]:
+    error: Dict[str, Any] = {"code": code, "message": message}
+    if kind is not None:
+        error["data"] = {"type": kind}
+    return {"jsonrpc": "2.0", "id": request_id, "error": error}
+
+
+class _RequestHandler(socketserver.StreamRequestHandler):
+    server: "WorkbookServer"
+
+    def handle(self) -> None:
+        for line in self.rfile:
+            if not line.strip():
+                continue
+            try:
+                request = json.loads(line)
+            except ValueError:
+                response: Optional[Dict[str, Any]] = _error(None, PARSE_ERROR, "Parse error")
+            else:
+                response = self.server.service.handle(request)
+            if response is not None:
+                self.wfile.write(json.dumps(response).encode("utf-8") + b"\n")
+                self.wfile.flush()
+
+
+class WorkbookServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    """Serve a :class:`WorkbookService` on a Unix domain socket."""
+
+    daemon_threads = True
+
+    def __init__(self, socket_path: Path, pool: Optional[WorkbookPool] = None) -> None:
+        self.socket_path = socket_path.expanduser()
+        self.service = WorkbookService(pool if pool is not None else WorkbookPool())
+        self.service.on_shutdown = lambda: threading.Thread(target=self.shutdown, daemon=True).start()
+        self.socket_path.parent.mkdir(parents=True, exist_ok=True)
+        if self.socket_path.exists():
+            if connect(self.socket_path) is not None:
+                raise RuntimeError(f"A server is already listening on {self.socket_path}")
+            self.socket_path.unlink()
+        super().__init__(str(self.socket_path), _RequestHandler)
+        # Anyone who can connect can write workbooks as this user.
+        os.chmod(self.socket_path, 0o600)
+
+    def server_close(self) -> None:
+        super().server_close()
+        try:
+            self.socket_path.unlink()
+        except FileNotFoundError:
+            pass
+
+
+def serve(socket_path: Optional[Path] = None, *, max_bytes: int = DEFAULT_MAX_BYTES) -> None:
+    """Run a server in the foreground until it is shut down or interrupted."""
+
+    server = WorkbookServer(socket_path or default_socket_path(), WorkbookPool(max_bytes))
+    try:
+        server.serve_forever()
+    finally:
+        server.server_close()
+
+
+# ----------------------------------------------------------------------
+# Client
+class ServerClient:
+    """A connection to a running server."""
+
+    def __init__(self, sock: socket.socket) -> None:
+        self._socket = sock
+        self._reader = sock.makefile("rb")
+        self._next_id = 0
+
+    def call(self, method: str, /, **params: Any) -> Any:
+        self._next_id += 1
+        request = {"jsonrpc": "2.0", "id": self._next_id, "method": method, "params": params}
+        self._socket.sendall(json.dumps(request).encode("utf-8") + b"\n")
+        line = self._reader.readline()
+        if not line:
+            raise ServerError("The server closed the connection")
+        response = json.loads(line)
+        if "error" in response:
+            error = response["error"]
+            raise ServerError(error.get("message", ""), error.get("code", APPLICATION_ERROR), (error.get("data") or {}).get("type"))
+        return response.get("result")
+
+    def close(self) -> None:
+        self._reader.close()
+        self._socket.close()
+
+    def __enter__(self) -> "ServerClient":
+        return self
+
+    def __exit__(self, *exc_info: object) -> None:
+        self.close()
+
+
+def connect(socket_path: Optional[Path] = None, *, timeout: Optional[float] = 60.0) -> Optional[ServerClient]:
+    """Return a client for the server at *socket_path*, or ``None`` when none is listening."""
+
+    path = (socket_path or default_socket_path()).expanduser()
+    if not hasattr(socket, "AF_UNIX") or not path.exists():
+        return None
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    sock.settimeout(timeout)
+    try:
+        sock.connect(str(path))
+    except OSError:
+        sock.close()
+        return None
+    return ServerClient(sock)
@@ -0,0 +1,472 @@
+"""Byte-preserving serialisation that rewrites only the edited parts of a workbook.
+
+:func:`dump_xml` re-serialises the whole tree, which is slow on large
+workbooks and reformats nodes that were never touched. :func:`splice_xml`
+instead copies the original document byte for byte and re-serialises only
+the top-level (``<datasources>``, ``<worksheets>`` ...) and second-level
+(``<datasource>``, ``<worksheet>`` ...) elements that contain an edit recorded
+in the workbook's :class:`~tableau_workbook_editor.core.journal.ChangeJournal`.
+
+Splicing relies on the journal: edits made directly on ``Workbook.root`` are
+invisible to it and would be lost, so it is opt-in via
+``Workbook.save(splice=True)``.
+"""
+from __future__ import annotations
+
+import bisect
+import copy
+import html
+import re
+from dataclasses import dataclass, field
+from typing import TYPE_CHECKING, Dict, Iterable, List, Optional, Set
+
+from .xml_utils import LXML_AVAILABLE, Element, etree
+
+if TYPE_CHECKING:  # pragma: no cover
+    from .reader import WorkbookSource
+
+_MARKUP = re.compile(
+    rb"<(?:!--.*?-->|!\[CDATA\[.*?\]\]>|\?.*?\?>|!DOCTYPE(?:[^\[>]|\[[^\]]*\])*>"
+    rb"|/(?P<end>[^\s>]+)\s*>"
+    rb"|(?P<start>[^\s/>]+)(?:\"[^\"]*\"|'[^']*'|[^>\"'])*>)",
+    re.S,
+)
+_ENCODING = re.compile(rb"^\s*<\?xml[^>]*encoding\s*=\s*[\"']([^\"']+)[\"']")
+_NS_DECLARATION = re.compile(rb"\s+xmlns(?::[^\s=]+)?\s*=\s*(?:\"[^\"]*\"|'[^']*')")
+_ATTRIBUTE = re.compile(rb"([^\s=/>]+)\s*=\s*(?:\"([^\"]*)\"|'([^']*)')")
+_ATTRIBUTE_WHITESPACE = re.compile(r"[\t\n\r]")
+_WHITESPACE = b" \t\r\n"
+
+# Element depths whose source positions are tracked: the root and its children
+# are copied piecewise, depth-2 elements are copied or re-serialised whole.
+SPLICE_DEPTH = 2
+
+
+class _Fallback(Exception):
+    """Raised when a locator cannot place an element in the original bytes."""
+
+
+@dataclass
+class _Span:
+    """Byte range of an element; ``body_start == end`` for self-closing elements."""
+
+    tag: bytes
+    start: int
+    body_start: int
+    body_end: int
+    end: int
+    children: List["_Span"] = field(default_factory=list)
+
+
+def _elements(parent: Element) -> List[Element]:
+    return [child for child in parent if isinstance(child.tag, str)]
+
+
+def _local_name(tag: str | bytes) -> str:
+    if isinstance(tag, bytes):
+        tag = tag.decode("utf-8")
+    return tag.rsplit("}", 1)[-1].rsplit(":", 1)[-1]
+
+
+class SourceSnapshot:
+    """Shape of the first two levels of the tree as it was parsed.
+
+    Capturing it costs one pass over the root's grandchildren; it lets
+    :func:`splice_xml` pair elements with their byte ranges in the original
+    document and detect where children were added, removed or reordered.
+    """
+
+    def __init__(self, root: Element) -> None:
+        self.root = root
+        self.children: Dict[int, List[Element]] = {id(root): _elements(root)}
+        self.attributes: Dict[int, Dict[str, str]] = {id(root): dict(root.attrib)}
+        self.parents: Dict[int, Element] = {}
+        self.positions: Dict[int, int] = {}
+        for index, child in enumerate(self.children[id(root)]):
+            self.children[id(child)] = _elements(child)
+            self.attributes[id(child)] = dict(child.attrib)
+            self.parents[id(child)] = root
+            self.positions[id(child)] = index
+            for grand_index, grandchild in enumerate(self.children[id(child)]):
+                self.attributes[id(grandchild)] = dict(grandchild.attrib)
+                self.parents[id(grandchild)] = child
+                self.positions[id(grandchild)] = grand_index
+
+    def __contains__(self, element: Element) -> bool:
+        return element is self.root or id(element) in self.parents
+
+    def next_sibling(self, element: Element) -> Optional[Element]:
+        siblings = self.children[id(self.parents[id(element)])]
+        position = self.positions[id(element)] + 1
+        return siblings[position] if position < len(siblings) else None
+
+
+# ----------------------------------------------------------------------
+# Locators map snapshot elements to their spans in the original bytes.
+
+
+class _TokenLocator:
+    """Tokenises the whole document; works everywhere but costs a pass over every tag."""
+
+    def __init__(self, data: bytes, snapshot: SourceSnapshot) -> None:
+        self.spans: Dict[int, _Span] = {}
+        root_span = scan_spans(data)
+        if _local_name(root_span.tag) != _local_name(snapshot.root.tag):
+            raise _Fallback("root element mismatch")
+        self.spans[id(snapshot.root)] = root_span
+        self._pair(snapshot, snapshot.root, root_span)
+        for child in snapshot.children[id(snapshot.root)]:
+            self._pair(snapshot, child, self.spans[id(child)])
+
+    def _pair(self, snapshot: SourceSnapshot, element: Element, span: _Span) -> None:
+        children = snapshot.children[id(element)]
+        if len(children) != len(span.children):
+            raise _Fallback("element count mismatch")
+        for child, child_span in zip(children, span.children):
+            if _local_name(child_span.tag) != _local_name(child.tag):
+                raise _Fallback("element tag mismatch")
+            self.spans[id(child)] = child_span
+
+    def span(self, element: Element) -> _Span:
+        return self.spans[id(element)]
+
+
+class _LineLocator:
+    """Places elements near lxml's ``sourceline``, touching only the lines it needs.
+
+    ``sourceline`` is the line where a start tag ends and is approximate past
+    line 65535, so it is only used as a hint: the start tag must open one of
+    the few lines around it and match the element's parsed tag and
+    attributes, and exactly one line may qualify. Any doubt raises
+    :class:`_Fallback` so the caller can retry with :class:`_TokenLocator`.
+    """
+
+    _skips: Dict[int, "re.Pattern[bytes]"] = {}
+    # Lines searched before and after the ``sourceline`` hint.
+    WINDOW = (3, 1)
+    CHUNK = 256 * 1024
+
+    def __init__(self, data: bytes, snapshot: SourceSnapshot) -> None:
+        self.data = data
+        self.snapshot = snapshot
+        self.spans: Dict[int, _Span] = {}
+        self._heads: Dict[int, "re.Match[bytes]"] = {}
+        # Sorted (line, offset) checkpoints at line starts.
+        self._lines = [1]
+        self._offsets = [0]
+        self._scanned = self._newlines = 0
+        self._scanned_line = 1
+
+    def span(self, element: Element) -> _Span:
+        span = self.spans.get(id(element))
+        if span is None:
+            span = self.spans[id(element)] = self._locate(element)
+        return span
+
+    def _checkpoint(self, line: int) -> None:
+        # Count newlines a chunk at a time (fast, in C) until *line* is within
+        # a chunk of a checkpoint, so the per-line skip below stays short.
+        data = self.data
+        while self._scanned_line < line and self._scanned < len(data):
+            boundary = min(self._scanned + self.CHUNK, len(data))
+            self._newlines += data.count(b"\n", self._scanned, boundary)
+            self._scanned = boundary
+            self._scanned_line = self._newlines + 1
+            newline = data.find(b"\n", boundary)
+            if newline != -1:
+                position = bisect.bisect_left(self._lines, self._newlines + 2)
+                self._lines.insert(position, self._newlines + 2)
+                self._offsets.insert(position, newline + 1)
+
+    def _line_offset(self, line: int) -> Optional[int]:
+        self._checkpoint(line)
+        index = bisect.bisect_right(self._lines, line) - 1
+        offset, remaining, power = self._offsets[index], line - self._lines[index], 0
+        while remaining:
+            if remaining & 1:
+                pattern = self._skips.get(power)
+                if pattern is None:
+                    pattern = self._skips[power] = re.compile(rb"(?:[^\n]*\n){%d}" % (1 << power))
+                match = pattern.match(self.data, offset)
+                if match is None:
+                    return None
+                offset = match.end()
+            remaining >>= 1
+            power += 1
+        if self._lines[index] != line:
+            self._lines.insert(index + 1, line)
+            self._offsets.insert(index + 1, offset)
+        return offset
+
+    def _start_tag(self, line: int, element: Element) -> Optional["re.Match[bytes]"]:
+        offset = self._line_offset(line)
+        if offset is None:
+            return None
+        data = self.data
+        while offset < len(data) and data[offset] in b" \t":
+            offset += 1
+        head = _MARKUP.match(data, offset)
+        if head is None or head.group("start") is None or _local_name(head.group("start")) != _local_name(element.tag):
+            return None
+        if _parse_attributes(data[head.end("start") : head.end()]) != _local_attributes(self.snapshot.attributes[id(element)]):
+            return None
+        return head
+
+    def _head(self, element: Element) -> "re.Match[bytes]":
+        head = self._heads.get(id(element))
+        if head is not None:
+            return head
+        hint = element.sourceline
+        if not hint:
+            raise _Fallback("no source line")
+        before, after = self.WINDOW
+        candidates = [head for line in range(max(hint - before, 1), hint + after + 1) if (head := self._start_tag(line, element))]
+        if len(candidates) != 1:
+            raise _Fallback("start tag not found near its source line")
+        self._heads[id(element)] = candidates[0]
+        return candidates[0]
+
+    def _locate(self, element: Element) -> _Span:
+        head = self._head(element)
+        start, tag = head.start(), head.group("start")
+        if self.data[head.end() - 2 : head.end() - 1] == b"/":
+            return _Span(tag, start, head.end(), head.end(), head.end())
+        end = self._end(element)
+        close = self.data.rfind(b"</", head.end(), end)
+        tail = _MARKUP.match(self.data, close) if close != -1 else None
+        if tail is None or tail.group("end") != tag or tail.end() != end:
+            raise _Fallback("end tag mismatch")
+        return _Span(tag, start, head.end(), close, end)
+
+    def _end(self, element: Element) -> int:
+        """Return where *element* ends: before the whitespace preceding whatever follows it."""
+
+        if element is self.snapshot.root:
+            close = self.data.rfind(b"</")
+            tail = _MARKUP.match(self.data, close) if close != -1 else None
+            if tail is None:
+                raise _Fallback("missing root end tag")
+            return tail.end()
+        following = self.snapshot.next_sibling(element)
+        if following is not None:
+            boundary = self._head(following).start()
+        else:
+            boundary = self.data.rfind(b"</", 0, self._end(self.snapshot.parents[id(element)]))
+        while boundary > 0 and self.data[boundary - 1] in _WHITESPACE:
+            boundary -= 1
+        return boundary
+
+
+def _local_attributes(attributes: Dict[str, str]) -> Dict[str, str]:
+    return {_local_name(key): value for key, value in attributes.items()}
+
+
+def _parse_attributes(raw: bytes) -> Dict[str, str]:
+    """Parse the attributes of a start tag the way an XML parser reports them."""
+
+    parsed: Dict[str, str] = {}
+    for match in _ATTRIBUTE.finditer(raw):
+        name = match.group(1)
+        if name == b"xmlns" or name.startswith(b"xmlns:"):
+            continue
+        value = match.group(2) if match.group(2) is not None else match.group(3)
+        parsed[_local_name(name)] = html.unescape(_ATTRIBUTE_WHITESPACE.sub(" ", value.decode("utf-8")))
+    return parsed
+
+
+def scan_spans(data: bytes) -> _Span:
+    """Return the span of the root element, with its children and grandchildren."""
+
+    stack: List[_Span] = []
+    root: Optional[_Span] = None
+    for match in _MARKUP.finditer(data):
+        name = match.group("start")
+        if name is not None:
+            self_closing = data[match.end() - 2 : match.end() - 1] == b"/"
+            depth = len(stack)
+            span = _Span(name, match.start(), match.end(), match.end(), match.end())
+            if depth == 0:
+                if root is not None:
+                    raise _Fallback("multiple root elements")
+                root = span
+            elif depth <= SPLICE_DEPTH:
+                stack[-1].children.append(span)
+            if not self_closing:
+                stack.append(span)
+            continue
+        name = match.group("end")
+        if name is not None:
+            if not stack:
+                raise _Fallback("unbalanced end tag")
+            span = stack.pop()
+            span.body_end, span.end = match.start(), match.end()
+    if root is None or stack:
+        raise _Fallback("unbalanced document")
+    return root
+
+
+def original_bytes(source: "WorkbookSource") -> Optional[bytes]:
+    """Return the bytes the workbook was parsed from, if they are still available."""
+
+    if source.packaged is not None:
+        return source.packaged.workbook_xml
+    if source.signature is None:
+        return None
+    try:
+        stat = source.path.stat()
+    except OSError:
+        return None
+    if (stat.st_size, stat.st_mtime_ns) != source.signature:
+        return None
+    return source.path.read_bytes()
+
+
+def _escape_text(text: Optional[str]) -> bytes:
+    if not text:
+        return b""
+    escaped = text.replace("&", "&amp;").replace("<", "&lt;").replace(">", "&gt;").replace("\r", "&#13;")
+    return escaped.encode("utf-8")
+
+
+def serialize_fragment(element: Element) -> bytes:
+    """Serialise *element* without its tail, as :func:`dump_xml` would inside the document."""
+
+    if not LXML_AVAILABLE:
+        detached = copy.copy(element)
+        detached.tail = None
+        return etree.tostring(detached, encoding="unicode").encode("utf-8")  # type: ignore[arg-type]
+    data = etree.tostring(element, encoding="utf-8", with_tail=False, pretty_print=True)  # type: ignore[arg-type]
+    data = data.rstrip(b"\n")
+    parent = element.getparent()
+    if isinstance(element.tag, str) and parent is not None and element.nsmap == parent.nsmap and b"xmlns" in data:
+        # lxml repeats inherited namespace declarations on serialised fragments.
+        head = _MARKUP.match(data)
+        if head is not None:
+            data = _NS_DECLARATION.sub(b"", data[: head.end()]) + data[head.end() :]
+    return data
+
+
+class _Splicer:
+    def __init__(self, root: Element, snapshot: SourceSnapshot, touched: Iterable[Element]) -> None:
+        self.root = root
+        self.snapshot = snapshot
+        # Depth-2 elements re-serialised whole.
+        self.rewrite: Set[int] = set()
+        # Root or depth-1 elements whose attributes or children changed.
+        self.restructured: Set[int] = set()
+        # Root or depth-1 elements with an edit somewhere below them.
+        self.contains: Set[int] = set()
+        self._parents: Optional[Dict[int, Element]] = None
+        for element in touched:
+            self._mark(element)
+
+    def _parent(self, element: Element) -> Optional[Element]:
+        if LXML_AVAILABLE:
+            return element.getparent()
+        if self._parents is None:
+            self._parents = {id(child): parent for parent in self.root.iter() for child in parent}
+        return self._parents.get(id(element))
+
+    def _mark(self, element: Element) -> None:
+        chain = [element]
+        while (parent := self._parent(chain[-1])) is not None:
+            chain.append(parent)
+        if chain[-1] is not self.root:
+            return  # detached since it was recorded; its former parent is recorded too
+        chain.reverse()
+        self.contains.add(id(self.root))
+        if len(chain) == 1 or chain[1] not in self.snapshot:
+            self.restructured.add(id(self.root))
+            return
+        top = chain[1]
+        self.contains.add(id(top))
+        if len(chain) == 2 or chain[2] not in self.snapshot:
+            self.restructured.add(id(top))
+        else:
+            self.rewrite.add(id(chain[2]))
+
+    # ------------------------------------------------------------------
+    def render(self, data: bytes, locator: "_TokenLocator | _LineLocator") -> Optional[bytes]:
+        self.data = data
+        self.locator = locator
+        span = locator.span(self.root)
+        out = [data[: span.start]]
+        if not self._emit(self.root, out):
+            return None
+        out.append(data[span.end :])
+        return b"".join(out)
+
+    def _emit(self, element: Element, out: List[bytes]) -> bool:
+        key = id(element)
+        if element not in self.snapshot or key in self.rewrite:
+            out.append(serialize_fragment(element))
+            return True
+        span = self.locator.span(element)
+        if key in self.restructured:
+            if dict(element.attrib) != self.snapshot.attributes[key]:
+                if element is self.root:
+                    return False
+                out.append(serialize_fragment(element))
+                return True
+            if _elements(element) != self.snapshot.children[key]:
+                return self._emit_rebuilt(element, span, out)
+        if key not in self.contains:
+            out.append(self.data[span.start : span.end])
+            return True
+        cursor = span.start
+        for child in self.snapshot.children.get(key, ()):
+            child_key = id(child)
+            if child_key in self.rewrite or child_key in self.contains:
+                child_span = self.locator.span(child)
+                out.append(self.data[cursor : child_span.start])
+                if not self._emit(child, out):
+                    return False
+                cursor = child_span.end
+        out.append(self.data[cursor : span.end])
+        return True
+
+    def _emit_rebuilt(self, element: Element, span: _Span, out: List[bytes]) -> bool:
+        if span.body_start == span.end:
+            # Originally self-closing: there is no body to splice into.
+            if element is self.root:
+                return False
+            out.append(serialize_fragment(element))
+            return True
+        out.append(self.data[span.start : span.body_start])
+        out.append(_escape_text(element.text))
+        for child in element:
+            if not isinstance(child.tag, str):
+                out.append(serialize_fragment(child))
+            elif not self._emit(child, out):
+                return False
+            out.append(_escape_text(child.tail))
+        out.append(self.data[span.body_end : span.end])
+        return True
+
+
+def splice_xml(root: Element, snapshot: SourceSnapshot, data: Optional[bytes], touched: Iterable[Element]) -> Optional[bytes]:
+    """Return *data* with the subtrees containing *touched* elements re-serialised.
+
+    Returns ``None`` when the document cannot be spliced (the original bytes
+    are unavailable, use an encoding other than UTF-8, no longer match the
+    parsed shape, or the root element's attributes changed); callers should
+    then fall back to :func:`~tableau_workbook_editor.core.xml_utils.dump_xml`.
+    """
+
+    if data is None or snapshot.root is not root:
+        return None
+    declared = _ENCODING.match(data)
+    if declared is not None and declared.group(1).lower().replace(b"_", b"-") not in (b"utf-8", b"utf8"):
+        return None
+    splicer = _Splicer(root, snapshot, touched)
+    if not splicer.contains:
+        return data
+    if LXML_AVAILABLE:
+        try:
+            return splicer.render(data, _LineLocator(data, snapshot))
+        except _Fallback:
+            pass
+    try:
+        return splicer.render(data, _TokenLocator(data, snapshot))
+    except _Fallback:
+        return None
@@ -3,15 +3,24 @@ from __future__ import annotations
 
 from dataclasses import dataclass
 from pathlib import Path
-from typing import TYPE_CHECKING, Dict, List, Optional
+from typing import TYPE_CHECKING, Any, Dict, Iterable, List, Mapping, Optional, Tuple
 
-from . import actions, dashboards, datasources, parameters, validators, versioning, worksheets
+from . import actions, dashboards, datasources, operations, parameters, splice, versioning, worksheets
 from .calc_utils import lint_calculation
-from .xml_utils import Element, IdRegistry, dump_xml, etree, load_xml, xpath
-from .writer import WorkbookWriter
+from .index import WorkbookIndex
+from .journal import ChangeJournal
+from .references import FieldReferenceIndex
+from .xml_utils import Element, IdRegistry, dump_xml, etree, load_xml
 
 if TYPE_CHECKING:  # pragma: no cover
+    from . import validators
+    from .connections import ConnectionRule, RewriteReport
+    from .diffs import Change
+    from .layouts import ZoneTree
+    from .lineage import LineageGraph
+    from .merge import MergeResult
     from .reader import WorkbookSource
+    from .twbx_utils import CompressionPolicy
 
 
 @dataclass
@@ -25,8 +34,31 @@ class Workbook:
     def __init__(self, *, root: Element, source: "WorkbookSource") -> None:
         self.root = root
         self.source = source
-        self._original = dump_xml(root)
-        self.id_registry = IdRegistry([root])
+        self.journal = ChangeJournal()
+        self.index = WorkbookIndex(root)
+        self.references = FieldReferenceIndex(root)
+        self._id_registry: Optional[IdRegistry] = None
+        self._lineage: Optional["LineageGraph"] = None
+        self._zone_trees: Dict[Element, "ZoneTree"] = {}
+        self._snapshot = splice.SourceSnapshot(root)
+
+    @property
+    def id_registry(self) -> IdRegistry:
+        """Identifier registry, built on first use so read-only callers never pay for it."""
+
+        if self._id_registry is None:
+            self._id_registry = IdRegistry([self.root])
+        return self._id_registry
+
+    @property
+    def lineage(self) -> "LineageGraph":
+        """Dependency graph of fields, calculations, parameters and worksheets, built on first use."""
+
+        if self._lineage is None:
+            from .lineage import LineageGraph
+
+            self._lineage = LineageGraph.build(self.root)
+        return self._lineage
 
     # ------------------------------------------------------------------
     # Creation helpers
@@ -50,45 +82,74 @@ class Workbook:
     def list_parameters(self) -> List[str]:
         return parameters.list_parameters(self.root)
 
+    def list_columns(self, datasource: str) -> List[str]:
+        ds = self.index.datasource(datasource)
+        if ds is None:
+            raise ValueError(f"Datasource '{datasource}' not found")
+        return datasources.list_column_names(ds)
+
+    def list_actions(self) -> List[str]:
+        return actions.list_action_names(self.root)
+
     # ------------------------------------------------------------------
     # Modification helpers
     def rename_field(self, *, datasource: str, old: str, new: str) -> None:
-        ds = datasources.find_datasource(self.root, datasource)
+        self._rename_columns("rename_field", datasource, {old: new}, old=old, new=new)
+
+    def rename_fields(self, *, datasource: str, mapping: Mapping[str, str]) -> None:
+        """Rename several fields of *datasource* at once.
+
+        *mapping* maps current field names or captions to new captions. All
+        references are rewritten in a single pass over the indexed sites and
+        the renames apply simultaneously, so ``{"A": "B", "B": "C"}`` turns
+        ``A`` into ``B`` and ``B`` into ``C``.
+        """
+
+        self._rename_columns("rename_fields", datasource, mapping, mapping=dict(mapping))
+
+    def _rename_columns(self, operation: str, datasource: str, renames: Mapping[str, str], **details: object) -> None:
+        ds = self.index.datasource(datasource)
         if ds is None:
             raise ValueError(f"Datasource '{datasource}' not found")
-        column = datasources.find_column(ds, old)
-        if column is None:
-            raise ValueError(f"Field '{old}' not found in datasource '{datasource}'")
-        old_name = datasources.ensure_column_name(column)
-        old_caption = column.get("caption") or old_name.strip("[]")
-        new_ref = new if new.startswith("[") else f"[{new}]"
-        column.set("name", new_ref)
-        column.set("caption", new)
-        # Update dependencies in datasource
-        for dep in xpath(ds, ".//*[@ref]"):
-            if dep.get("ref") == old_name:
-                dep.set("ref", new_ref)
-        # Update worksheets
-        for worksheet_name in self.list_worksheets():
-            worksheet = worksheets.find_worksheet(self.root, worksheet_name)
-            if worksheet is None:
+        lookup = datasources.index_columns(ds)
+        resolved: List[Tuple[Element, str]] = []
+        for old, new in renames.items():
+            column = datasources.lookup_column(lookup, old)
+            if column is None:
+                raise ValueError(f"Field '{old}' not found in datasource '{datasource}'")
+            new_ref = new if new.startswith("[") else f"[{new}]"
+            if column.get("name") == new_ref and column.get("caption") == new:
+                # Already named and captioned that way: nothing to rewrite.
                 continue
-            worksheets.update_field_reference(worksheet, old=old_name, new=new_ref)
-            for node in xpath(worksheet, ".//*[@formula]"):
-                formula = node.get("formula")
-                if formula and old_name in formula:
-                    node.set("formula", formula.replace(old_name, new_ref))
-        # Update actions mapping text
-        for action in actions.list_actions(self.root):
-            mapping = action.get("mapping")
-            if mapping and old_caption in mapping:
-                action.set("mapping", mapping.replace(old_caption, new))
+            resolved.append((column, new))
+        if not resolved:
+            return
+        renamed = {id(column) for column, _ in resolved}
+        for column, new in resolved:
+            existing = datasources.lookup_column(lookup, new)
+            if existing is not None and id(existing) not in renamed:
+                raise ValueError(f"Field '{new}' already exists in datasource '{datasource}'")
+        names: Dict[str, str] = {}
+        captions: Dict[str, str] = {}
+        for column, new in resolved:
+            old_name = datasources.ensure_column_name(column)
+            new_ref = new if new.startswith("[") else f"[{new}]"
+            names[old_name] = new_ref
+            captions[column.get("caption") or old_name.strip("[]")] = new
+            column.set("name", new_ref)
+            column.set("caption", new)
+        # Update datasource dependencies, worksheet references, formulas and
+        # action mappings through the reverse reference index.
+        touched = self.references.rename(scope=ds, names=names, captions=captions)
+        if self._lineage is not None:
+            self._lineage.rename(ds, names)
+        self.journal.record(operation, *(column for column, _ in resolved), *touched, datasource=datasource, **details)
 
     def add_calculation(self, *, datasource: str, name: str, formula: str, data_type: str = "string") -> None:
         lint = lint_calculation(formula)
         if not lint.ok:
             raise ValueError(f"Calculation is invalid: {lint.message}")
-        ds = datasources.find_datasource(self.root, datasource)
+        ds = self.index.datasource(datasource)
         if ds is None:
             raise ValueError(f"Datasource '{datasource}' not found")
         column = etree.Element("column")
@@ -101,6 +162,10 @@ class Workbook:
         calc.set("formula", formula)
         column.append(calc)
         ds.append(column)
+        self.references.add(column, ds)
+        if self._lineage is not None:
+            self._lineage.add_column(column, ds)
+        self.journal.record("add_calculation", ds, column, datasource=datasource, name=name, formula=formula, data_type=data_type)
 
     def set_parameter(
         self,
@@ -111,9 +176,14 @@ class Workbook:
         allowable_values: Optional[List[str]] = None,
         display_format: Optional[str] = None,
     ) -> None:
-        parameter = parameters.find_parameter(self.root, name)
+        parameter = self.index.parameter(name)
+        touched: List[Element] = []
         if parameter is None:
             parameter = parameters.create_parameter(self.root, name=name, data_type=data_type, value=value)
+            self.index.add("parameter", parameter)
+            if self._lineage is not None:
+                self._lineage.add_parameter(name)
+            touched.append(parameters.ensure_parameters_parent(self.root))
         else:
             parameter.set("datatype", data_type)
             parameter.set("current-value", value)
@@ -129,6 +199,16 @@ class Workbook:
                 values_node.append(value_node)
         if display_format is not None:
             parameter.set("display-format", display_format)
+        touched.append(parameter)
+        self.journal.record(
+            "set_parameter",
+            *touched,
+            name=name,
+            data_type=data_type,
+            value=value,
+            allowable_values=allowable_values,
+            display_format=display_format,
+        )
 
     def add_sheet_to_dashboard(
         self,
@@ -139,13 +219,13 @@ class Workbook:
         container: str,
         index: int,
     ) -> None:
-        worksheet = worksheets.find_worksheet(self.root, sheet)
+        worksheet = self.index.worksheet(sheet)
         if worksheet is None:
             raise ValueError(f"Worksheet '{sheet}' not found")
-        dashboard_element = dashboards.find_dashboard(self.root, dashboard)
+        dashboard_element = self.index.dashboard(dashboard)
         if dashboard_element is None:
             raise ValueError(f"Dashboard '{dashboard}' not found")
-        dashboards.append_sheet_zone(
+        zone = dashboards.append_sheet_zone(
             dashboard_element,
             sheet_name=sheet,
             registry=self.id_registry,
@@ -153,6 +233,17 @@ class Workbook:
             container=container,
             index=index,
         )
+        self._zone_trees.pop(dashboard_element, None)
+        self.journal.record(
+            "add_sheet_to_dashboard",
+            dashboards.ensure_zones_parent(dashboard_element),
+            zone,
+            dashboard=dashboard,
+            sheet=sheet,
+            floating=floating,
+            container=container,
+            index=index,
+        )
 
     def move_zone(
         self,
@@ -164,17 +255,35 @@ class Workbook:
         w: Optional[int] = None,
         h: Optional[int] = None,
     ) -> None:
-        dashboard_element = dashboards.find_dashboard(self.root, dashboard)
+        zone = self.zone_tree(dashboard).move(zone_id, x=x, y=y, w=w, h=h)
+        self.journal.record("move_zone", zone, dashboard=dashboard, zone_id=zone_id, x=x, y=y, w=w, h=h)
+
+    def move_zones(self, *, dashboard: str, zones: Mapping[str, Mapping[str, Optional[int]]]) -> None:
+        """Set the geometry of many zones at once: ``zones={zone_id: {"x": ..., "y": ..., "w": ..., "h": ...}}``."""
+
+        touched = self.zone_tree(dashboard).update(zones)
+        if touched:
+            self.journal.record("move_zones", *touched, dashboard=dashboard, zones={key: dict(value) for key, value in zones.items()})
+
+    def zone_tree(self, dashboard: str) -> "ZoneTree":
+        """Return the :class:`~tableau_workbook_editor.core.layouts.ZoneTree` of *dashboard*, built on first use."""
+
+        from .layouts import ZoneTree
+
+        dashboard_element = self.index.dashboard(dashboard)
         if dashboard_element is None:
             raise ValueError(f"Dashboard '{dashboard}' not found")
-        for zone in dashboards.list_dashboard_zones(dashboard_element):
-            if zone.get("id") == zone_id:
-                dashboards.update_zone_geometry(zone, x=x, y=y, w=w, h=h)
-                return
-        raise ValueError(f"Zone '{zone_id}' not found in dashboard '{dashboard}'")
+        tree = self._zone_trees.get(dashboard_element)
+        if tree is None:
+            tree = self._zone_trees[dashboard_element] = ZoneTree(dashboard_element)
+        return tree
 
     def add_filter_action(self, *, source: str, target: str, mapping: Dict[str, str]) -> None:
-        actions.create_filter_action(self.root, source=source, target=target, mapping=mapping)
+        action = actions.create_filter_action(self.root, source=source, target=target, mapping=mapping)
+        self.references.add_action(action)
+        self.journal.record(
+            "add_filter_action", actions.ensure_actions_parent(self.root), action, source=source, target=target, mapping=dict(mapping)
+        )
 
     def set_connection(
         self,
@@ -185,13 +294,15 @@ class Workbook:
         schema: Optional[str] = None,
         table: Optional[str] = None,
     ) -> None:
-        ds = datasources.find_datasource(self.root, datasource)
+        ds = self.index.datasource(datasource)
         if ds is None:
             raise ValueError(f"Datasource '{datasource}' not found")
+        touched: List[Element] = []
         connection = ds.find("connection")
         if connection is None:
             connection = etree.Element("connection")
             ds.append(connection)
+            touched.append(ds)
         update: Dict[str, Optional[str]] = {
             "server": server,
             "dbname": db,
@@ -201,14 +312,103 @@ class Workbook:
         for key, value in update.items():
             if value is not None:
                 connection.set(key, value)
+        touched.append(connection)
+        self.journal.record("set_connection", *touched, datasource=datasource, server=server, db=db, schema=schema, table=table)
+
+    def rewrite_connections(self, rules: Iterable[Mapping[str, Any] | "ConnectionRule"]) -> "RewriteReport":
+        """Apply regex *rules* to the connections of every datasource in one pass.
+
+        See :mod:`tableau_workbook_editor.core.connections` for the rule format.
+        Invalid rules raise :class:`ValueError` before anything is changed.
+        """
+
+        from .connections import rewrite_connections
+
+        report, touched = rewrite_connections(self.root, rules)
+        if touched:
+            self.journal.record("rewrite_connections", *touched, changed=len(report.changes))
+        return report
+
+    def apply(self, ops: Iterable[Mapping[str, Any] | "operations.Operation"]) -> int:
+        """Apply a list of declarative operations and return how many ran.
+
+        Every operation is validated before the first one runs: its name,
+        its argument names and, through the method annotations, the types of
+        its values (numbers given for string arguments are converted). If an
+        operation fails an :class:`~tableau_workbook_editor.core.operations.OperationError`
+        is raised; the workbook is not saved, and the in-memory tree should be
+        discarded because earlier operations have already been applied.
+        """
+
+        parsed = [
+            op if isinstance(op, operations.Operation) else operations.parse_operation(index, op)
+            for index, op in enumerate(ops)
+        ]
+        for index, op in enumerate(parsed):
+            try:
+                op.apply(self)
+            except (ValueError, KeyError, TypeError) as exc:
+                raise operations.OperationError(index, op.name, str(exc)) from exc
+        return len(parsed)
 
     # ------------------------------------------------------------------
     def validate(self) -> validators.ValidationReport:
+        from . import validators
+
         return validators.validate_workbook(self.root)
 
-    def diff(self) -> List[str]:
-        before = load_xml(self._original)
-        return [] if etree.tostring(before) == etree.tostring(self.root) else ["Workbook modified"]
+    @property
+    def dirty(self) -> bool:
+        """``True`` when any edit has been recorded in :attr:`journal`."""
+
+        return self.journal.dirty
+
+    def diff(self, other: Optional["Workbook"] = None) -> List[str]:
+        """Describe :meth:`changes` one line each."""
+
+        changes = self.changes(other)
+        if changes is None:
+            return ["Workbook modified"]
+        return [change.describe() for change in changes]
+
+    def changes(self, other: Optional["Workbook"] = None) -> Optional[List["Change"]]:
+        """Return the structural changes from *other* (or the file as loaded) to this workbook.
+
+        Returns ``None`` when the workbook was edited but the original file
+        changed on disk since it was loaded, so there is nothing to compare with.
+        """
+
+        from .diffs import diff_trees
+
+        if other is not None:
+            return diff_trees(other.root, self.root)
+        if not self.journal.dirty:
+            return []
+        original = splice.original_bytes(self.source)
+        if original is None:
+            return None
+        return diff_trees(load_xml(original), self.root)
+
+    def merge(self, base: "Workbook", theirs: "Workbook") -> "MergeResult":
+        """Merge into this workbook the changes *theirs* made relative to *base*.
+
+        Non-conflicting changes are applied in place; conflicting ones keep
+        this workbook's version and are listed in the returned
+        :class:`~tableau_workbook_editor.core.merge.MergeResult`.
+        """
+
+        from .merge import merge_trees
+
+        result = merge_trees(base.root, self.root, theirs.root, registry=self._id_registry)
+        if result.touched:
+            self.index.invalidate()
+            self.references.invalidate()
+            self._lineage = None
+            self._zone_trees.clear()
+            self.journal.record(
+                "merge", *result.touched, base=str(base.source.path), theirs=str(theirs.source.path), conflicts=len(result.conflicts)
+            )
+        return result
 
     # ------------------------------------------------------------------
     def save(
@@ -218,14 +418,58 @@ class Workbook:
         package_assets: bool = False,
         target_version: Optional[str] = None,
         dry_run: bool = False,
+        splice: bool = False,
+        compression: Optional[CompressionPolicy] = None,
     ) -> Path | None:
-        versioning.ensure_target_version(self.root, target_version)
-        xml_bytes = dump_xml(self.root)
+        """Write the workbook to *path* (default: where it was opened from).
+
+        ``splice=True`` copies the original document verbatim and re-serialises
+        only the datasources, worksheets, dashboards and other second-level
+        elements edited through this class, so untouched bytes stay identical.
+        It falls back to a full serialisation when that is not possible. Edits
+        made directly on :attr:`root` are not journaled and are lost when
+        splicing. *compression* controls how packaged workbooks are
+        compressed; see :class:`~tableau_workbook_editor.core.twbx_utils.CompressionPolicy`.
+        """
+
+        xml_bytes = self.serialize(target_version=target_version, splice=splice)
         if dry_run:
             return None
-        writer = WorkbookWriter(self.source)
+        return self.write_bytes(xml_bytes, path=path, package_assets=package_assets, compression=compression)
+
+    def serialize(self, *, target_version: Optional[str] = None, splice: bool = False) -> bytes:
+        """Return the workbook XML exactly as :meth:`save` would write it."""
+
+        had_version = self.root.find("version") is not None
+        version_node = versioning.ensure_target_version(self.root, target_version)
+        if version_node is not None:
+            touched = [version_node] if had_version else [self.root, version_node]
+            self.journal.record("set_target_version", *touched, target_version=target_version)
+        return self._spliced_xml() if splice else dump_xml(self.root)
+
+    def write_bytes(
+        self,
+        xml_bytes: bytes,
+        *,
+        path: Optional[str | Path] = None,
+        package_assets: bool = False,
+        compression: Optional[CompressionPolicy] = None,
+    ) -> Path:
+        """Write XML produced by :meth:`serialize` the way :meth:`save` does."""
+
+        # Deferred with the zip and compression helpers until a workbook is written.
+        from .writer import WorkbookWriter
+
+        writer = WorkbookWriter(self.source, compression=compression)
         target_path = Path(path) if path is not None else None
         return writer.write(target_path, xml_bytes, package_assets=package_assets)
 
-    def save_as(self, path: str | Path, *, package_assets: bool = False, target_version: Optional[str] = None) -> Path | None:
-        return self.save(path=path, package_assets=package_assets, target_version=target_version)
+    def save_as(
+        self, path: str | Path, *, package_assets: bool = False, target_version: Optional[str] = None, splice: bool = False
+    ) -> Path | None:
+        return self.save(path=path, package_assets=package_assets, target_version=target_version, splice=splice)
+
+    def _spliced_xml(self) -> bytes:
+        original = splice.original_bytes(self.source)
+        spliced = splice.splice_xml(self.root, self._snapshot, original, self.journal.touched_elements())
+        return spliced if spliced is not None else dump_xml(self.root)
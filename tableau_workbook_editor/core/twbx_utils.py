@@ -1,46 +1,476 @@
 """Helpers for manipulating Tableau packaged workbooks (.twbx)."""
 from __future__ import annotations
 
-from dataclasses import dataclass
-from pathlib import Path
-from typing import Dict, Optional
-from zipfile import ZipFile
+import hashlib
+import os
+import struct
+import tempfile
+import time
+import weakref
+import zlib
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from dataclasses import dataclass, field
+from io import BytesIO
+from pathlib import Path, PurePosixPath
+from typing import BinaryIO, Deque, Dict, FrozenSet, Mapping, Optional, Tuple, Union
+from zipfile import ZIP64_LIMIT, ZIP_DEFLATED, ZIP_STORED, BadZipFile, ZipFile, ZipInfo
+
+#: Replacement data larger than this many bytes is spilled to a temporary file.
+DEFAULT_MEMORY_LIMIT = 64 * 1024 * 1024
+#: Size of the blocks used when streaming member data.
+CHUNK_SIZE = 1024 * 1024
+
+#: Extensions whose contents are already compressed; deflating them again wastes time.
+INCOMPRESSIBLE_EXTENSIONS = frozenset(
+    {".hyper", ".tde", ".png", ".jpg", ".jpeg", ".gif", ".zip", ".gz", ".7z", ".mp4", ".webp", ".tdsx", ".twbx"}
+)
+
+_LOCAL_HEADER_SIZE = 30
+_LOCAL_HEADER_SIGNATURE = b"PK\x03\x04"
+_DATA_DESCRIPTOR_FLAG = 0x08
+_ZIP64_EXTRA_ID = 0x0001
+
+
+@dataclass(frozen=True)
+class CompressionPolicy:
+    """How :func:`pack_twbx` compresses the members it writes.
+
+    Members are stored when their extension is in ``stored_extensions`` and
+    deflated at ``level`` otherwise; ``deflated_extensions`` overrides the
+    stored list. Deflated members of at least ``parallel_threshold`` bytes are
+    split into ``block_size`` blocks that are compressed on ``workers``
+    threads (zlib releases the GIL) and written to the archive in order.
+    Unmodified members are copied without recompression unless ``recompress``
+    is set and their current compression differs from the policy.
+    """
+
+    level: int = 6
+    stored_extensions: FrozenSet[str] = INCOMPRESSIBLE_EXTENSIONS
+    deflated_extensions: FrozenSet[str] = field(default_factory=frozenset)
+    recompress: bool = False
+    workers: Optional[int] = None
+    parallel_threshold: int = 8 * CHUNK_SIZE
+    block_size: int = CHUNK_SIZE
+
+    def __post_init__(self) -> None:
+        if not 0 <= self.level <= 9:
+            raise ValueError(f"Compression level must be between 0 and 9, got {self.level}")
+        if self.block_size <= 0:
+            raise ValueError("block_size must be positive")
+
+    @property
+    def max_workers(self) -> int:
+        return self.workers if self.workers is not None else (os.cpu_count() or 1)
+
+    def compress_type(self, name: str) -> int:
+        extension = PurePosixPath(name).suffix.lower()
+        if extension in self.deflated_extensions or extension not in self.stored_extensions:
+            return ZIP_DEFLATED
+        return ZIP_STORED
+
+
+DEFAULT_COMPRESSION = CompressionPolicy()
+
+
+class PackagedMember:
+    """Lazy handle on a file stored inside a packaged workbook.
+
+    Only the archive path and the :class:`~zipfile.ZipInfo` metadata are kept
+    until the contents are requested. Replacement data is held in memory up to
+    ``memory_limit`` bytes and spilled to a temporary file beyond that.
+    """
+
+    def __init__(self, archive: Path, info: ZipInfo, *, memory_limit: int = DEFAULT_MEMORY_LIMIT) -> None:
+        self.archive = archive
+        self.info = info
+        self.memory_limit = memory_limit
+        self._data: Optional[bytes] = None
+        self._spill_path: Optional[Path] = None
+        self._spill_size = 0
+        self._finalizer: Optional[weakref.finalize] = None
+
+    @property
+    def name(self) -> str:
+        return self.info.filename
+
+    @property
+    def size(self) -> int:
+        if self._data is not None:
+            return len(self._data)
+        if self._spill_path is not None:
+            return self._spill_size
+        return self.info.file_size
+
+    @property
+    def is_modified(self) -> bool:
+        return self._data is not None or self._spill_path is not None
+
+    @property
+    def spilled(self) -> bool:
+        return self._spill_path is not None
+
+    def open(self) -> BinaryIO:
+        """Return a readable binary stream over the member contents."""
+
+        if self._data is not None:
+            return BytesIO(self._data)
+        if self._spill_path is not None:
+            return self._spill_path.open("rb")
+        # The returned stream keeps the archive file open after the ZipFile
+        # object itself is closed.
+        with ZipFile(self.archive, "r") as zf:
+            return zf.open(self.info)
+
+    def read(self) -> bytes:
+        with self.open() as stream:
+            return stream.read()
+
+    def replace(self, data: Union[bytes, BinaryIO]) -> None:
+        """Replace the member contents with *data* (bytes or a binary stream)."""
+
+        self._discard()
+        if isinstance(data, (bytes, bytearray)):
+            if len(data) <= self.memory_limit:
+                self._data = bytes(data)
+                return
+            data = BytesIO(data)
+        head = data.read(self.memory_limit + 1)
+        if len(head) <= self.memory_limit:
+            self._data = head
+            return
+        fd, name = tempfile.mkstemp(prefix="tbe-member-")
+        size = len(head)
+        with os.fdopen(fd, "wb") as spill:
+            spill.write(head)
+            for chunk in iter(lambda: data.read(CHUNK_SIZE), b""):
+                spill.write(chunk)
+                size += len(chunk)
+        self._spill_path = Path(name)
+        self._spill_size = size
+        self._finalizer = weakref.finalize(self, _remove_file, self._spill_path)
+
+    def rebind(self, archive: Path, info: ZipInfo) -> None:
+        """Point the handle at *info* inside *archive*, dropping replacement data."""
+
+        self._discard()
+        self.archive = archive
+        self.info = info
+
+    def _discard(self) -> None:
+        self._data = None
+        if self._finalizer is not None:
+            self._finalizer()
+            self._finalizer = None
+        self._spill_path = None
+        self._spill_size = 0
+
+
+class DigestReader:
+    """Read-through wrapper that counts and SHA-256 hashes the bytes read from *stream*."""
+
+    def __init__(self, stream: BinaryIO) -> None:
+        self.stream = stream
+        self.size = 0
+        self._hash = hashlib.sha256()
+
+    def read(self, size: int = -1) -> bytes:
+        data = self.stream.read(size)
+        self.size += len(data)
+        self._hash.update(data)
+        return data
+
+    def hexdigest(self) -> str:
+        return self._hash.hexdigest()
+
+
+def _remove_file(path: Path) -> None:
+    try:
+        path.unlink()
+    except FileNotFoundError:  # pragma: no cover - already cleaned up
+        pass
 
 
 @dataclass
 class PackagedWorkbook:
-    """In-memory representation of a Tableau packaged workbook."""
+    """Representation of a Tableau packaged workbook.
+
+    The workbook XML is held in memory while every other member is a lazy
+    :class:`PackagedMember`. Plain ``bytes`` values are accepted in
+    ``other_files`` for assets added by callers.
+    """
 
     workbook_xml: bytes
     inner_path: str
-    other_files: Dict[str, bytes]
+    other_files: Dict[str, Union[bytes, PackagedMember]]
+
+    def rebind(self, archive: Path) -> None:
+        """Re-point lazy members at *archive* after it has been rewritten."""
+
+        with ZipFile(archive, "r") as zf:
+            infos = {info.filename: info for info in zf.infolist()}
+        for name, member in self.other_files.items():
+            if isinstance(member, PackagedMember) and name in infos:
+                member.rebind(archive, infos[name])
+
 
+def extract_twbx(path: Path, *, memory_limit: int = DEFAULT_MEMORY_LIMIT) -> PackagedWorkbook:
+    """Open *path* and return a :class:`PackagedWorkbook` instance.
 
-def extract_twbx(path: Path) -> PackagedWorkbook:
-    """Extract *path* and return a :class:`PackagedWorkbook` instance."""
+    Only the embedded ``.twb`` is read; other members are returned as lazy
+    :class:`PackagedMember` handles.
+    """
 
     workbook_xml: Optional[bytes] = None
     inner_path = ""
-    other_files: Dict[str, bytes] = {}
+    other_files: Dict[str, Union[bytes, PackagedMember]] = {}
     with ZipFile(path, "r") as zf:
         for info in zf.infolist():
-            data = zf.read(info)
             if info.filename.lower().endswith(".twb"):
                 if workbook_xml is not None:
                     raise ValueError("Multiple .twb files found inside the package")
-                workbook_xml = data
+                workbook_xml = zf.read(info)
                 inner_path = info.filename
             else:
-                other_files[info.filename] = data
+                other_files[info.filename] = PackagedMember(path, info, memory_limit=memory_limit)
     if workbook_xml is None:
         raise ValueError("Packaged workbook does not contain a .twb file")
     return PackagedWorkbook(workbook_xml=workbook_xml, inner_path=inner_path, other_files=other_files)
 
 
-def pack_twbx(target: Path, package: PackagedWorkbook) -> None:
-    """Write *package* back to ``target`` preserving non-workbook files."""
+def _strip_zip64_extra(extra: bytes) -> bytes:
+    """Remove zip64 records from *extra*; :meth:`ZipInfo.FileHeader` re-adds them."""
+
+    kept = bytearray()
+    offset = 0
+    while offset + 4 <= len(extra):
+        header_id, length = struct.unpack("<HH", extra[offset : offset + 4])
+        end = offset + 4 + length
+        if header_id != _ZIP64_EXTRA_ID:
+            kept += extra[offset:end]
+        offset = end
+    return bytes(kept)
+
+
+def _copy_raw_member(source: BinaryIO, info: ZipInfo, zf: ZipFile) -> None:
+    """Append *info* to *zf* by copying its compressed bytes from *source* verbatim."""
+
+    source.seek(info.header_offset)
+    header = source.read(_LOCAL_HEADER_SIZE)
+    if len(header) != _LOCAL_HEADER_SIZE or header[:4] != _LOCAL_HEADER_SIGNATURE:
+        raise BadZipFile(f"Bad local file header for member '{info.filename}'")
+    name_length, extra_length = struct.unpack("<HH", header[26:30])
+    source.seek(name_length + extra_length, os.SEEK_CUR)
+
+    clone = ZipInfo(info.filename, date_time=info.date_time)
+    clone.compress_type = info.compress_type
+    clone.comment = info.comment
+    clone.extra = _strip_zip64_extra(info.extra)
+    clone.create_system = info.create_system
+    clone.create_version = info.create_version
+    clone.extract_version = info.extract_version
+    clone.internal_attr = info.internal_attr
+    clone.external_attr = info.external_attr
+    # Sizes and CRC are known up front, so no trailing data descriptor is written.
+    clone.flag_bits = info.flag_bits & ~_DATA_DESCRIPTOR_FLAG
+    clone.CRC = info.CRC
+    clone.compress_size = info.compress_size
+    clone.file_size = info.file_size
+
+    # ZipFile has no public API for adding pre-compressed data, so the local
+    # header and payload are written directly and the archive bookkeeping is
+    # updated the same way ZipFile.writestr does.
+    clone.header_offset = zf.fp.tell()
+    zip64 = clone.file_size > ZIP64_LIMIT or clone.compress_size > ZIP64_LIMIT
+    zf.fp.write(clone.FileHeader(zip64))
+    remaining = info.compress_size
+    while remaining:
+        chunk = source.read(min(CHUNK_SIZE, remaining))
+        if not chunk:
+            raise BadZipFile(f"Truncated data for member '{info.filename}'")
+        zf.fp.write(chunk)
+        remaining -= len(chunk)
+    zf.filelist.append(clone)
+    zf.NameToInfo[clone.filename] = clone
+    zf.start_dir = zf.fp.tell()
+
+
+def _deflate_block(block: bytes, window: bytes, level: int) -> bytes:
+    # Each block is a raw deflate segment ending on a byte boundary
+    # (Z_SYNC_FLUSH), primed with the previous block's tail so the ratio stays
+    # close to single-stream compression; concatenated they form one stream.
+    compressor = zlib.compressobj(level, zlib.DEFLATED, -zlib.MAX_WBITS, zdict=window) if window else zlib.compressobj(
+        level, zlib.DEFLATED, -zlib.MAX_WBITS
+    )
+    return compressor.compress(block) + compressor.flush(zlib.Z_SYNC_FLUSH)
+
+
+# An empty final deflate block terminating a stream of sync-flushed segments.
+_FINAL_BLOCK = zlib.compressobj(0, zlib.DEFLATED, -zlib.MAX_WBITS).flush(zlib.Z_FINISH)
+_WINDOW_SIZE = 32 * 1024
+
+
+def _write_parallel(zf: ZipFile, info: ZipInfo, source: BinaryIO, policy: CompressionPolicy, pool: ThreadPoolExecutor) -> None:
+    """Deflate *source* in blocks on *pool* and write the result to *zf* as *info*."""
+
+    zip64 = info.file_size * 1.05 > ZIP64_LIMIT
+    info.flag_bits &= ~_DATA_DESCRIPTOR_FLAG
+    info.CRC = info.compress_size = 0
+    info.header_offset = zf.fp.tell()
+    zf.fp.write(info.FileHeader(zip64))
+
+    crc = compressed = size = 0
+    pending: Deque[Future] = deque()
+    window = b""
+    for block in iter(lambda: source.read(policy.block_size), b""):
+        crc = zlib.crc32(block, crc)
+        size += len(block)
+        pending.append(pool.submit(_deflate_block, block, window, policy.level))
+        window = block[-_WINDOW_SIZE:]
+        # Bound the blocks held in memory while keeping every worker busy.
+        while len(pending) > 2 * policy.max_workers:
+            data = pending.popleft().result()
+            zf.fp.write(data)
+            compressed += len(data)
+    while pending:
+        data = pending.popleft().result()
+        zf.fp.write(data)
+        compressed += len(data)
+    zf.fp.write(_FINAL_BLOCK)
+    compressed += len(_FINAL_BLOCK)
+
+    # Rewrite the local header with the final sizes, as ZipFile does for
+    # seekable archives; the zip64 choice keeps its length unchanged.
+    end = zf.fp.tell()
+    info.CRC, info.compress_size, info.file_size = crc, compressed, size
+    zf.fp.seek(info.header_offset)
+    zf.fp.write(info.FileHeader(zip64))
+    zf.fp.seek(end)
+    zf.filelist.append(info)
+    zf.NameToInfo[info.filename] = info
+    zf.start_dir = end
+
+
+def _write_stream(
+    zf: ZipFile,
+    info: ZipInfo,
+    source: BinaryIO,
+    policy: CompressionPolicy,
+    pool: Optional[ThreadPoolExecutor],
+) -> None:
+    info.compress_type = policy.compress_type(info.filename)
+    if info.compress_type == ZIP_DEFLATED:
+        # ZipFile.open only honours a per-member level through this attribute.
+        info._compresslevel = policy.level  # type: ignore[attr-defined]
+        if pool is not None and info.file_size >= policy.parallel_threshold:
+            _write_parallel(zf, info, source, policy, pool)
+            return
+    with zf.open(info, "w", force_zip64=info.file_size > ZIP64_LIMIT) as dest:
+        for chunk in iter(lambda: source.read(CHUNK_SIZE), b""):
+            dest.write(chunk)
+
+
+def _member_info(name: str, size: int, template: Optional[ZipInfo] = None) -> ZipInfo:
+    if template is None:
+        # Same defaults as ZipFile.writestr for a plain name.
+        info = ZipInfo(name, date_time=time.localtime(time.time())[:6])
+        info.external_attr = 0o600 << 16
+    else:
+        info = ZipInfo(name, date_time=template.date_time)
+        info.external_attr = template.external_attr
+    info.file_size = size
+    return info
+
+
+def _needs_pool(package: PackagedWorkbook, policy: CompressionPolicy) -> bool:
+    if policy.max_workers <= 1:
+        return False
+    sizes = {package.inner_path: len(package.workbook_xml)}
+    for name, member in package.other_files.items():
+        if not isinstance(member, PackagedMember):
+            sizes[name] = len(member)
+        elif member.is_modified or policy.recompress:
+            sizes[name] = member.size
+    return any(size >= policy.parallel_threshold and policy.compress_type(name) == ZIP_DEFLATED for name, size in sizes.items())
+
+
+def pack_twbx(target: Path, package: PackagedWorkbook, *, policy: Optional[CompressionPolicy] = None) -> None:
+    """Write *package* to ``target`` preserving non-workbook files.
+
+    Members are compressed according to *policy* (default:
+    :data:`DEFAULT_COMPRESSION`, which deflates the workbook XML and stores
+    already-compressed extracts and images). Unmodified
+    :class:`PackagedMember` entries are copied from their source archive
+    without being decompressed.
+    """
+
+    policy = policy or DEFAULT_COMPRESSION
+    sources: Dict[Path, BinaryIO] = {}
+    pool = ThreadPoolExecutor(max_workers=policy.max_workers) if _needs_pool(package, policy) else None
+    try:
+        with ZipFile(target, "w") as zf:
+            info = _member_info(package.inner_path, len(package.workbook_xml))
+            _write_stream(zf, info, BytesIO(package.workbook_xml), policy, pool)
+            for name, member in package.other_files.items():
+                if not isinstance(member, PackagedMember):
+                    _write_stream(zf, _member_info(name, len(member)), BytesIO(member), policy, pool)
+                elif member.is_modified or (policy.recompress and member.info.compress_type != policy.compress_type(name)):
+                    with member.open() as stream:
+                        _write_stream(zf, _member_info(name, member.size, member.info), stream, policy, pool)
+                else:
+                    source = sources.get(member.archive)
+                    if source is None:
+                        source = sources[member.archive] = member.archive.open("rb")
+                    _copy_raw_member(source, member.info, zf)
+    finally:
+        if pool is not None:
+            pool.shutdown()
+        for source in sources.values():
+            source.close()
+
+
+def replace_members(
+    archive: Path,
+    replacements: Mapping[str, Path],
+    *,
+    target: Optional[Path] = None,
+    policy: Optional[CompressionPolicy] = None,
+) -> Dict[str, Tuple[int, str]]:
+    """Rewrite *archive* with the members named in *replacements* taken from files.
+
+    Replacement files are streamed into the archive in :data:`CHUNK_SIZE`
+    blocks and every other member is copied without being decompressed, so
+    memory use does not depend on member sizes. The result is written next to
+    *target* (default: *archive*) and renamed over it. Returns the
+    ``(size, sha256)`` of each replacement as it was written.
+    """
 
-    with ZipFile(target, "w") as zf:
-        zf.writestr(package.inner_path, package.workbook_xml)
-        for name, data in package.other_files.items():
-            zf.writestr(name, data)
+    policy = policy or DEFAULT_COMPRESSION
+    target = (target or archive).expanduser().resolve()
+    digests: Dict[str, Tuple[int, str]] = {}
+    fd, name = tempfile.mkstemp(prefix=".tbe-", suffix=target.suffix, dir=str(target.parent))
+    os.close(fd)
+    temp_path = Path(name)
+    try:
+        with archive.open("rb") as source:
+            with ZipFile(source, "r") as reader:
+                infos = reader.infolist()
+            missing = set(replacements) - {info.filename for info in infos}
+            if missing:
+                raise ValueError(f"No member named {', '.join(sorted(missing))} in {archive}")
+            with ZipFile(temp_path, "w") as zf:
+                for info in infos:
+                    replacement = replacements.get(info.filename)
+                    if replacement is None:
+                        _copy_raw_member(source, info, zf)
+                        continue
+                    with replacement.open("rb") as stream:
+                        digest = DigestReader(stream)
+                        size = os.fstat(stream.fileno()).st_size
+                        _write_stream(zf, _member_info(info.filename, size, info), digest, policy, None)
+                    digests[info.filename] = (digest.size, digest.hexdigest())
+        temp_path.replace(target)
+    except BaseException:
+        _remove_file(temp_path)
+        raise
+    return digests
@@ -1,37 +1,484 @@
-"""Validation helpers."""
+"""Validation helpers.
+
+Validation is a set of :class:`Rule` objects run by a single traversal of the
+workbook tree. Each rule subscribes to element tags; the engine dispatches
+every element to the rules interested in its tag and then calls
+:meth:`Rule.finish` so rules can resolve references against the symbol tables
+of the shared :class:`ValidationContext`, which are filled in during the same
+traversal. Register additional rules with :func:`register_rule`.
+"""
 from __future__ import annotations
 
-from dataclasses import dataclass
-from typing import List
+import re
+from dataclasses import asdict, dataclass
+from typing import Any, ClassVar, Dict, Iterable, Iterator, List, Optional, Sequence, Set, Tuple, Type
+
+from .calc_utils import parse_calculation
+from .references import field_tokens
+from .xml_utils import LXML_AVAILABLE, Element, etree
+
+SEVERITIES = ("error", "warning")
+PARAMETERS_DATASOURCE = "Parameters"
+# Fields Tableau generates itself; they are never declared in a datasource.
+_BUILTIN_FIELDS = {"[Number of Records]", "[Measure Names]", "[Measure Values]", "[Multiple Values]"}
+# Derived field references such as ``[sum:Profit:qk]`` name the field in the middle.
+_DERIVED_FIELD = re.compile(r"^\[[A-Za-z0-9_]*:(.+):[A-Za-z0-9_]*\]$")
 
-from . import dashboards, worksheets
-from .xml_utils import Element
+_Location = Tuple[Element, ...]
 
 
 @dataclass
 class ValidationIssue:
     message: str
+    rule: str = ""
+    severity: str = "error"
+    #: Location of the offending element, e.g. ``/workbook/dashboards/dashboard[@name='Executive']/zones/zone[@id='z1']``.
+    path: str = ""
+
+    def to_dict(self) -> Dict[str, str]:
+        return asdict(self)
 
 
 @dataclass
 class ValidationReport:
     issues: List[ValidationIssue]
 
+    @property
+    def errors(self) -> List[ValidationIssue]:
+        return [issue for issue in self.issues if issue.severity == "error"]
+
+    @property
+    def warnings(self) -> List[ValidationIssue]:
+        return [issue for issue in self.issues if issue.severity == "warning"]
+
     @property
     def ok(self) -> bool:
-        return not self.issues
+        """``True`` when there are no errors; warnings do not fail validation."""
+
+        return not self.errors
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {"ok": self.ok, "issues": [issue.to_dict() for issue in self.issues]}
+
+
+def format_path(location: Sequence[Element]) -> str:
+    segments = []
+    for element in location:
+        if not isinstance(element.tag, str):
+            continue
+        segment = element.tag
+        for attribute in ("name", "id"):
+            value = element.get(attribute)
+            if value:
+                segment += f"[@{attribute}='{value}']"
+                break
+        segments.append(segment)
+    return "/" + "/".join(segments)
+
+
+def split_field_reference(value: str) -> Tuple[Optional[str], str]:
+    """Return ``(qualifier, name)`` for a reference such as ``[Orders].[sum:Profit:qk]``.
+
+    The qualifier is returned without brackets and derived names are reduced
+    to the underlying field (``[Profit]``).
+    """
+
+    if value.startswith("[") and value.endswith("]") and "]." not in value and ":" not in value:
+        return None, value
+    tokens = field_tokens(value)
+    if not tokens:
+        return None, f"[{value}]"
+    name = tokens[-1]
+    derived = _DERIVED_FIELD.match(name)
+    if derived is not None:
+        name = f"[{derived.group(1)}]"
+    qualifier = tokens[-2][1:-1] if len(tokens) > 1 else None
+    return qualifier, name
+
+
+class ValidationContext:
+    """State shared by the rules of one validation run.
+
+    ``location`` holds the elements from the root to the element being
+    visited. The symbol tables are filled in as the traversal reaches the
+    definitions, so a reference that cannot be resolved when it is visited
+    should be kept (with a :meth:`snapshot` of its location) and checked
+    again in :meth:`Rule.finish`.
+    """
+
+    def __init__(self) -> None:
+        self.location: List[Element] = []
+        #: Tag of the top-level section being visited (``datasources``, ``worksheets`` ...).
+        self.section: Optional[str] = None
+        #: The datasource, worksheet, dashboard ... that contains the current element.
+        self.owner: Optional[Element] = None
+        self.issues: List[ValidationIssue] = []
+        self.worksheets: Set[str] = set()
+        self.dashboards: Set[str] = set()
+        self.parameters: Set[str] = set()
+        #: Datasource name (and caption) to its field names (``[Name]`` and ``[Caption]``).
+        self.fields: Dict[str, Set[str]] = {}
+        #: Worksheet name to the datasources it declares.
+        self.worksheet_datasources: Dict[str, Set[str]] = {}
+        #: Zone id to the ``(tag, name)`` of the dashboard or worksheet that first used it.
+        self.zone_ids: Dict[str, Tuple[str, str]] = {}
+
+    def enter(self, element: Element) -> None:
+        self.location.append(element)
+        depth = len(self.location)
+        if depth == 2:
+            self.section = element.tag
+        elif depth == 3:
+            self.owner = element
+
+    def leave(self) -> None:
+        self.location.pop()
+        depth = len(self.location)
+        if depth == 1:
+            self.section = None
+        elif depth == 2:
+            self.owner = None
+
+    def snapshot(self) -> _Location:
+        return tuple(self.location)
+
+    def report(self, rule: "Rule", message: str, location: Optional[Sequence[Element]] = None) -> None:
+        where = self.location if location is None else location
+        self.issues.append(ValidationIssue(message, rule.name, rule.severity, format_path(where)))
+
+    def datasource_fields(self, name: str) -> Optional[Set[str]]:
+        return self.fields.get(name)
+
+    def all_fields(self) -> Set[str]:
+        return set().union(*self.fields.values()) if self.fields else set()
+
+
+class Rule:
+    """A validation rule.
+
+    ``tags`` lists the element tags passed to :meth:`visit`. A new instance
+    is created for every validation run, so rules may keep state.
+    """
+
+    name: ClassVar[str] = ""
+    severity: ClassVar[str] = "error"
+    tags: ClassVar[Tuple[str, ...]] = ()
+
+    def visit(self, element: Element, context: ValidationContext) -> None:  # pragma: no cover - interface
+        pass
+
+    def finish(self, context: ValidationContext) -> None:
+        pass
+
+
+RULES: List[Type[Rule]] = []
+
+
+def register_rule(rule: Type[Rule]) -> Type[Rule]:
+    """Class decorator adding *rule* to the rules run by :func:`validate_workbook`."""
+
+    if rule.severity not in SEVERITIES:
+        raise ValueError(f"Rule '{rule.name}' has unknown severity '{rule.severity}'")
+    RULES.append(rule)
+    return rule
+
+
+# ----------------------------------------------------------------------
+# Symbol tables
+
+
+class SymbolCollector(Rule):
+    """Fills the symbol tables of the context; always runs first and reports nothing."""
+
+    name = "symbols"
+    tags = ("datasource", "column", "worksheet", "dashboard", "parameter")
+
+    def visit(self, element: Element, context: ValidationContext) -> None:
+        section, depth = context.section, len(context.location) - 1
+        tag = element.tag
+        if section == "datasources":
+            owner = context.owner
+            if tag == "datasource" and depth == 2:
+                names = self._datasource_names(element)
+                table = context.fields.setdefault(names[0], set())
+                for alias in names[1:]:
+                    context.fields[alias] = table
+            elif tag == "column" and depth == 3 and owner is not None:
+                table = context.fields.setdefault(self._datasource_names(owner)[0], set())
+                name = element.get("name")
+                caption = element.get("caption")
+                if name:
+                    table.add(name if name.startswith("[") else f"[{name}]")
+                if caption:
+                    table.add(f"[{caption}]")
+                if owner.get("name") == PARAMETERS_DATASOURCE:
+                    context.parameters.update(value.strip("[]") for value in (name, caption) if value)
+        elif section == "worksheets":
+            owner = context.owner
+            if tag == "worksheet" and depth == 2:
+                context.worksheets.add(element.get("name") or "")
+            elif tag == "datasource" and owner is not None and element.get("name"):
+                context.worksheet_datasources.setdefault(owner.get("name") or "", set()).add(element.get("name"))
+        elif section == "dashboards" and tag == "dashboard" and depth == 2:
+            context.dashboards.add(element.get("name") or "")
+        elif section == "parameters" and tag == "parameter" and depth == 2:
+            context.parameters.update(value for value in (element.get("name"), element.get("caption")) if value)
 
+    @staticmethod
+    def _datasource_names(datasource: Element) -> List[str]:
+        name = datasource.get("name") or ""
+        caption = datasource.get("caption")
+        return [name, caption] if caption and caption != name else [name]
 
-def validate_workbook(root: Element) -> ValidationReport:
-    issues: List[ValidationIssue] = []
-    worksheet_names = set(worksheets.list_worksheets(root))
-    for dashboard_name in dashboards.list_dashboards(root):
-        dashboard = dashboards.find_dashboard(root, dashboard_name)
-        if dashboard is None:
+
+# ----------------------------------------------------------------------
+# Rules
+
+
+@register_rule
+class MissingDashboardWorksheet(Rule):
+    name = "missing-dashboard-worksheet"
+    tags = ("zone",)
+
+    def __init__(self) -> None:
+        self.zones: List[Tuple[str, str, _Location]] = []
+
+    def visit(self, element: Element, context: ValidationContext) -> None:
+        owner = context.owner
+        if context.section == "dashboards" and owner is not None and element.get("type") == "worksheet":
+            sheet = element.get("worksheet") or ""
+            if sheet not in context.worksheets:
+                self.zones.append((owner.get("name") or "", sheet, context.snapshot()))
+
+    def finish(self, context: ValidationContext) -> None:
+        for dashboard, sheet, location in self.zones:
+            if sheet not in context.worksheets:
+                context.report(self, f"Dashboard '{dashboard}' references missing worksheet '{sheet}'", location)
+
+
+@register_rule
+class DuplicateZoneId(Rule):
+    name = "duplicate-zone-id"
+    tags = ("zone",)
+
+    def visit(self, element: Element, context: ValidationContext) -> None:
+        identifier = element.get("id")
+        if not identifier:
+            return
+        first = context.zone_ids.get(identifier)
+        if first is None:
+            owner = context.owner
+            context.zone_ids[identifier] = (owner.tag, owner.get("name") or "") if owner is not None else ("workbook", "")
+        else:
+            context.report(self, f"Zone id '{identifier}' is already used in {first[0]} '{first[1]}'")
+
+
+class _FieldReferences(Rule):
+    """Checks field references, deferring those not resolvable yet to :meth:`finish`."""
+
+    def __init__(self) -> None:
+        # (datasource scope, worksheet scope, qualifier, field, description, location)
+        self.pending: List[Tuple[Optional[str], Optional[str], Optional[str], str, str, _Location]] = []
+
+    def _scope(self, context: ValidationContext) -> Tuple[Optional[str], Optional[str]]:
+        owner = context.owner
+        name = owner.get("name") if owner is not None else None
+        if context.section == "datasources":
+            return name, None
+        if context.section == "worksheets":
+            return None, name
+        return None, None
+
+    def check(
+        self,
+        context: ValidationContext,
+        datasource: Optional[str],
+        worksheet: Optional[str],
+        qualifier: Optional[str],
+        field_name: str,
+        description: str,
+    ) -> None:
+        if self._problem(context, datasource, worksheet, qualifier, field_name, final=False) is not None:
+            self.pending.append((datasource, worksheet, qualifier, field_name, description, context.snapshot()))
+
+    def finish(self, context: ValidationContext) -> None:
+        for datasource, worksheet, qualifier, field_name, description, location in self.pending:
+            problem = self._problem(context, datasource, worksheet, qualifier, field_name, final=True)
+            if problem is not None:
+                context.report(self, f"{description} references {problem}", location)
+
+    def _problem(
+        self,
+        context: ValidationContext,
+        datasource: Optional[str],
+        worksheet: Optional[str],
+        qualifier: Optional[str],
+        field_name: str,
+        *,
+        final: bool,
+    ) -> Optional[str]:
+        """Describe why the reference does not resolve, or return ``None`` when it does."""
+
+        if field_name in _BUILTIN_FIELDS or field_name.startswith("[:"):
+            return None
+        if qualifier is not None:
+            if qualifier == PARAMETERS_DATASOURCE and PARAMETERS_DATASOURCE not in context.fields:
+                return None  # checked by UndefinedParameter
+            known = context.fields.get(qualifier)
+            if known is None:
+                return f"unknown datasource '{qualifier}'"
+            return None if field_name in known else f"unknown field {field_name} of datasource '{qualifier}'"
+        if datasource is not None:
+            scopes: Iterable[str] = (datasource,)
+        elif worksheet is not None and worksheet in context.worksheet_datasources:
+            scopes = context.worksheet_datasources[worksheet]
+        elif not final:
+            return "an unscoped field"  # resolved against every datasource at the end
+        else:
+            scopes = context.fields
+        if any(field_name in context.fields.get(scope, ()) for scope in scopes):
+            return None
+        return f"unknown field {field_name}"
+
+
+@register_rule
+class DanglingFieldReference(_FieldReferences):
+    name = "dangling-field-reference"
+    tags = ("column", "filter")
+
+    def visit(self, element: Element, context: ValidationContext) -> None:
+        if context.section != "worksheets":
+            return
+        for attribute in ("ref", "column"):
+            value = element.get(attribute)
+            if value:
+                datasource, worksheet = self._scope(context)
+                qualifier, field_name = split_field_reference(value)
+                self.check(context, datasource, worksheet, qualifier, field_name, f"Worksheet '{worksheet}'")
+
+
+@register_rule
+class UnknownCalculationField(_FieldReferences):
+    name = "unknown-calculation-field"
+    tags = ("calculation",)
+
+    def visit(self, element: Element, context: ValidationContext) -> None:
+        formula = element.get("formula")
+        if not formula:
+            return
+        datasource, worksheet = self._scope(context)
+        if datasource is None and worksheet is None:
+            return
+        parsed = parse_calculation(formula)
+        if parsed.ast is None:
+            return  # reported by CalculationSyntax
+        column = context.location[-2] if len(context.location) > 1 else None
+        label = (column.get("caption") or column.get("name")) if column is not None and column.tag == "column" else None
+        description = f"Calculation '{label}'" if label else f"Calculation in '{datasource or worksheet}'"
+        for reference in parsed.references:
+            qualifier = reference.qualifier[1:-1] if reference.qualifier else None
+            self.check(context, datasource, worksheet, qualifier, reference.name, description)
+
+
+@register_rule
+class CalculationSyntax(Rule):
+    name = "calculation-syntax"
+    tags = ("calculation",)
+
+    def visit(self, element: Element, context: ValidationContext) -> None:
+        formula = element.get("formula")
+        if formula:
+            parsed = parse_calculation(formula)
+            if parsed.error is not None:
+                context.report(self, f"Calculation does not parse: {parsed.error} at position {parsed.error_position}")
+
+
+@register_rule
+class UndefinedParameter(Rule):
+    name = "undefined-parameter"
+    tags = ("calculation",)
+
+    def __init__(self) -> None:
+        self.references: List[Tuple[str, _Location]] = []
+
+    def visit(self, element: Element, context: ValidationContext) -> None:
+        formula = element.get("formula")
+        if not formula or f"[{PARAMETERS_DATASOURCE}]" not in formula:
+            return
+        parsed = parse_calculation(formula)
+        for reference in parsed.references:
+            parameter = reference.name[1:-1]
+            if reference.qualifier == f"[{PARAMETERS_DATASOURCE}]" and parameter not in context.parameters:
+                self.references.append((parameter, context.snapshot()))
+
+    def finish(self, context: ValidationContext) -> None:
+        for parameter, location in self.references:
+            if parameter not in context.parameters:
+                context.report(self, f"Calculation references undefined parameter '{parameter}'", location)
+
+
+@register_rule
+class ActionTarget(Rule):
+    name = "action-target"
+    tags = ("action",)
+
+    def __init__(self) -> None:
+        self.actions: List[Tuple[str, str, str, _Location]] = []
+
+    def visit(self, element: Element, context: ValidationContext) -> None:
+        if context.section != "actions":
+            return
+        label = element.get("name") or element.get("caption") or element.get("type") or "action"
+        for role in ("source", "target"):
+            sheet = element.get(role)
+            if sheet and sheet not in context.worksheets and sheet not in context.dashboards:
+                self.actions.append((label, role, sheet, context.snapshot()))
+
+    def finish(self, context: ValidationContext) -> None:
+        for label, role, sheet, location in self.actions:
+            if sheet not in context.worksheets and sheet not in context.dashboards:
+                context.report(self, f"Action '{label}' {role} '{sheet}' is not a worksheet or dashboard", location)
+
+
+# ----------------------------------------------------------------------
+# Engine
+
+
+def _traverse(root: Element, context: ValidationContext) -> Iterator[Element]:
+    """Yield every element depth-first, entering and leaving it on *context*."""
+
+    if LXML_AVAILABLE:
+        for event, element in etree.iterwalk(root, events=("start", "end")):
+            if event == "start":
+                context.enter(element)
+                yield element
+            else:
+                context.leave()
+        return
+    stack: List[Tuple[Element, bool]] = [(root, True)]
+    while stack:
+        element, entering = stack.pop()
+        if not entering:
+            context.leave()
             continue
-        for zone in dashboards.list_dashboard_zones(dashboard):
-            if zone.get("type") == "worksheet":
-                sheet = zone.get("worksheet")
-                if sheet not in worksheet_names:
-                    issues.append(ValidationIssue(f"Dashboard '{dashboard_name}' references missing worksheet '{sheet}'"))
-    return ValidationReport(issues=issues)
+        context.enter(element)
+        yield element
+        stack.append((element, False))
+        stack.extend((child, True) for child in reversed(element))
+
+
+def validate_workbook(root: Element, rules: Optional[Iterable[Type[Rule]]] = None) -> ValidationReport:
+    """Run *rules* (default: every registered rule) over *root* in one traversal."""
+
+    context = ValidationContext()
+    active = [SymbolCollector()] + [rule() for rule in (RULES if rules is None else rules)]
+    dispatch: Dict[str, List[Rule]] = {}
+    for rule in active:
+        for tag in rule.tags:
+            dispatch.setdefault(tag, []).append(rule)
+    for element in _traverse(root, context):
+        for rule in dispatch.get(element.tag, ()):
+            rule.visit(element, context)
+    for rule in active:
+        rule.finish(context)
+    return ValidationReport(issues=context.issues)
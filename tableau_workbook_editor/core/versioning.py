@@ -13,9 +13,9 @@ def get_workbook_version(root: Element) -> Optional[str]:
     return version_node.get("value") or version_node.text
 
 
-def ensure_target_version(root: Element, target_version: Optional[str]) -> None:
+def ensure_target_version(root: Element, target_version: Optional[str]) -> Optional[Element]:
     if target_version is None:
-        return
+        return None
     version_node = root.find("version")
     if version_node is None:
         version_node = etree.Element("version")
@@ -23,3 +23,4 @@ def ensure_target_version(root: Element, target_version: Optional[str]) -> None:
         root.append(version_node)
     else:
         version_node.set("value", target_version)
+    return version_node
@@ -14,8 +14,9 @@ if TYPE_CHECKING:  # pragma: no cover
 class WorkbookWriter:
     """Persist a workbook to disk with atomic semantics."""
 
-    def __init__(self, source: "WorkbookSource") -> None:
+    def __init__(self, source: "WorkbookSource", *, compression: Optional[twbx_utils.CompressionPolicy] = None) -> None:
         self.source = source
+        self.compression = compression
 
     def write(self, target: Optional[Path], xml_bytes: bytes, package_assets: bool) -> Path:
         target_path = (target or self.source.path).expanduser().resolve()
@@ -40,6 +41,9 @@ class WorkbookWriter:
         target.parent.mkdir(parents=True, exist_ok=True)
         with tempfile.NamedTemporaryFile("wb", delete=False, dir=str(target.parent)) as tmp:
             temp_path = Path(tmp.name)
-        twbx_utils.pack_twbx(temp_path, package)
+        twbx_utils.pack_twbx(temp_path, package, policy=self.compression)
         temp_path.replace(target)
+        if self.source.packaged is not None and target == self.source.path:
+            # Lazy members still point at byte offsets of the replaced archive.
+            self.source.packaged.rebind(target)
         return target
@@ -1,8 +1,9 @@
 """Utilities for working with Tableau XML documents."""
 from __future__ import annotations
 
+import re
 from dataclasses import dataclass
-from typing import Iterable, Iterator, Optional
+from typing import BinaryIO, Dict, Iterable, Iterator, Optional, Tuple
 
 try:  # pragma: no cover - optional dependency
     from defusedxml.lxml import fromstring  # type: ignore
@@ -10,14 +11,15 @@ try:  # pragma: no cover - optional dependency
     LXML_AVAILABLE = True
 except Exception:  # pragma: no cover - fallback path
     try:
-        from defusedxml.ElementTree import fromstring  # type: ignore
+        from defusedxml.ElementTree import fromstring, iterparse as _iterparse  # type: ignore
     except Exception:  # pragma: no cover - final fallback
-        from xml.etree.ElementTree import fromstring  # type: ignore
+        from xml.etree.ElementTree import fromstring, iterparse as _iterparse  # type: ignore
     from xml.etree import ElementTree as etree  # type: ignore
     LXML_AVAILABLE = False
 
 __all__ = [
     "load_xml",
+    "iterparse_xml",
     "dump_xml",
     "Element",
     "ensure_unique_id",
@@ -48,6 +50,19 @@ def load_xml(data: bytes) -> Element:
     return fromstring(data)
 
 
+def iterparse_xml(source: BinaryIO, events: Tuple[str, ...] = ("start", "end")) -> Iterator[Tuple[str, Element]]:
+    """Incrementally parse *source*, yielding ``(event, element)`` pairs.
+
+    Entity resolution is disabled in the same way as :func:`load_xml`. Callers
+    are responsible for clearing elements they no longer need so memory stays
+    bounded on very large documents.
+    """
+
+    if LXML_AVAILABLE:
+        return etree.iterparse(source, events=events, resolve_entities=False, no_network=True, remove_blank_text=False)
+    return _iterparse(source, events=events)
+
+
 def dump_xml(root: Element) -> bytes:
     """Serialise *root* into UTF-8 encoded bytes."""
 
@@ -62,48 +77,71 @@ def deep_copy_element(element: Element) -> Element:
     return fromstring(etree.tostring(element))
 
 
+_NUMBERED_ID = re.compile(r"^(.*?)(\d+)$")
+
+
 @dataclass
 class IdRegistry:
     """Track identifiers that appear in the workbook.
 
     Tableau mixes GUID like identifiers with simple string identifiers. The
-    registry keeps a set of all identifiers that have been observed and can
-    generate a new identifier based on a preferred prefix.
+    registry keeps a set of all identifiers that have been observed plus, for
+    every prefix, the highest numeric suffix seen so far, so new identifiers
+    are allocated in O(1) instead of probing ``z1, z2, ...``.
     """
 
     known_ids: set[str]
+    counters: Dict[str, int]
 
-    def __init__(self, elements: Iterable[Element]) -> None:
+    def __init__(self, elements: Iterable[Element] = ()) -> None:
         self.known_ids = set()
+        self.counters = {}
         for element in elements:
-            self._register_element(element)
+            self.register(element)
 
-    def _register_element(self, element: Element) -> None:
-        id_attr = element.get("id")
-        if id_attr:
-            self.known_ids.add(id_attr)
-        for child in element:
-            self._register_element(child)
+    def register(self, element: Element) -> None:
+        """Record the identifiers of *element* and all of its descendants."""
 
-    def reserve(self, identifier: str) -> None:
+        for node in element.iter():
+            id_attr = node.get("id")
+            if id_attr:
+                self._observe(id_attr)
+
+    def _observe(self, identifier: str) -> None:
         self.known_ids.add(identifier)
+        match = _NUMBERED_ID.match(identifier)
+        if match is not None:
+            prefix, number = match.group(1), int(match.group(2))
+            if number > self.counters.get(prefix, 0):
+                self.counters[prefix] = number
+
+    def reserve(self, identifier: str) -> None:
+        self._observe(identifier)
 
     def ensure(self, identifier: str, prefix: str = "z") -> str:
         if identifier in self.known_ids:
             return self.new(prefix)
-        self.known_ids.add(identifier)
+        self._observe(identifier)
         return identifier
 
     def new(self, prefix: str = "z") -> str:
-        index = 1
+        index = self.counters.get(prefix, 0) + 1
         candidate = f"{prefix}{index}"
+        # Only ids such as "z01" that normalise to a higher counter can clash.
         while candidate in self.known_ids:
             index += 1
             candidate = f"{prefix}{index}"
-        self.known_ids.add(candidate)
+        self._observe(candidate)
         return candidate
 
 
+def id_prefix(identifier: str, default: str = "z") -> str:
+    """Return the non-numeric prefix of ``identifier`` (``"z"`` for ``"z12"``), or *default*."""
+
+    match = _NUMBERED_ID.match(identifier)
+    return match.group(1) if match is not None else default
+
+
 def ensure_unique_id(element: Element, registry: IdRegistry, prefix: str = "z") -> str:
     current = element.get("id")
     if current:
@@ -0,0 +1,70 @@
+from __future__ import annotations
+
+import asyncio
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+import pytest
+
+from tableau_workbook_editor import AsyncWorkbook, open_workbook
+from tableau_workbook_editor.core.aio import AsyncRunner, run_operations
+from tableau_workbook_editor.core.operations import OperationError
+
+
+FIXTURE = Path(__file__).parent / "fixtures" / "sample_workbook.twb"
+
+
+def test_open_limit_and_save(tmp_path: Path) -> None:
+    target = tmp_path / "edited.twb"
+
+    async def scenario() -> None:
+        async with AsyncRunner(limit=1) as runner:
+            first = await AsyncWorkbook.open(FIXTURE, runner=runner)
+            second = asyncio.create_task(AsyncWorkbook.open(FIXTURE, runner=runner))
+            await asyncio.sleep(0.05)
+            assert not second.done()
+            async with first:
+                assert await first.apply([{"op": "rename-field", "datasource": "Orders", "from": "Profit", "to": "Net Profit"}]) == 1
+                assert await first.save(path=target) == target
+            assert first.closed
+            async with await second as wb:
+                assert not (await wb.validate()).errors
+            with pytest.raises(RuntimeError):
+                await first.validate()
+
+    asyncio.run(scenario())
+    assert "Net Profit" in open_workbook(target).list_columns("Orders")
+
+
+def test_cancelled_step_keeps_its_slot_until_it_finishes() -> None:
+    release = threading.Event()
+
+    async def scenario() -> None:
+        async with AsyncRunner(limit=1) as runner:
+            async with await AsyncWorkbook.open(FIXTURE, runner=runner) as wb:
+                blocked = asyncio.create_task(runner.run(release.wait))
+                await asyncio.sleep(0.05)
+                blocked.cancel()
+                await asyncio.sleep(0.05)
+                assert not blocked.done()
+                release.set()
+                with pytest.raises(asyncio.CancelledError):
+                    await blocked
+
+    asyncio.run(scenario())
+
+
+def test_run_operations_in_process_pool(tmp_path: Path) -> None:
+    target = tmp_path / "sample.twb"
+    target.write_bytes(FIXTURE.read_bytes())
+
+    async def scenario() -> None:
+        with ProcessPoolExecutor(max_workers=1) as pool:
+            async with AsyncRunner(process_executor=pool) as runner:
+                result = await run_operations(target, [{"op": "set-parameter", "name": "Region", "type": "string", "value": "West"}], runner=runner)
+                assert result.ok, result.error
+                with pytest.raises(OperationError):
+                    await run_operations(target, [{"op": "nope"}], runner=runner)
+
+    asyncio.run(scenario())
@@ -0,0 +1,85 @@
+from __future__ import annotations
+
+import os
+import shutil
+from pathlib import Path
+
+from tableau_workbook_editor import open_workbook
+from tableau_workbook_editor.core import cache as cache_module
+from tableau_workbook_editor.core.cache import MetadataCache
+
+FIXTURE = Path(__file__).parent / "fixtures" / "sample_workbook.twb"
+
+
+def _copy(tmp_path: Path, name: str = "sample.twb") -> Path:
+    target = tmp_path / name
+    shutil.copyfile(FIXTURE, target)
+    return target
+
+
+def _count_scans(monkeypatch) -> list:
+    calls = []
+    original = cache_module.scan_workbook
+
+    def counting(path):
+        calls.append(path)
+        return original(path)
+
+    monkeypatch.setattr(cache_module, "scan_workbook", counting)
+    return calls
+
+
+def test_cache_hit_skips_scan(tmp_path: Path, monkeypatch) -> None:
+    workbook = _copy(tmp_path)
+    scans = _count_scans(monkeypatch)
+    cache = MetadataCache(tmp_path / "cache")
+    first = open_workbook(workbook, mode="scan", cache=cache)
+    second = open_workbook(workbook, mode="scan", cache=cache)
+    assert len(scans) == 1
+    assert second == first
+    assert second.list_columns("Orders") == first.list_columns("Orders")
+
+
+def test_cache_invalidated_by_content_change(tmp_path: Path, monkeypatch) -> None:
+    workbook = _copy(tmp_path)
+    scans = _count_scans(monkeypatch)
+    cache = MetadataCache(tmp_path / "cache")
+    cache.summary(workbook)
+    data = workbook.read_text(encoding="utf-8").replace('name="Summary"', 'name="Overview"')
+    workbook.write_text(data, encoding="utf-8")
+    summary = cache.summary(workbook)
+    assert len(scans) == 2
+    assert "Overview" in summary.list_worksheets()
+
+
+def test_digest_fallback_survives_touch_and_copy(tmp_path: Path, monkeypatch) -> None:
+    workbook = _copy(tmp_path)
+    scans = _count_scans(monkeypatch)
+    cache = MetadataCache(tmp_path / "cache")
+    cache.summary(workbook)
+    stat = workbook.stat()
+    os.utime(workbook, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**9))
+    copy = _copy(tmp_path, "copy.twb")
+    assert cache.summary(workbook).path == workbook.resolve()
+    assert cache.summary(copy).path == copy.resolve()
+    assert len(scans) == 1
+
+
+def test_cache_evicts_least_recently_used(tmp_path: Path) -> None:
+    cache = MetadataCache(tmp_path / "cache")
+    first, second = _copy(tmp_path, "a.twb"), tmp_path / "b.twb"
+    second.write_text(FIXTURE.read_text(encoding="utf-8").replace("Summary", "Other"), encoding="utf-8")
+    cache.summary(first)
+    cache.max_bytes = cache._connection.execute("SELECT payload_size FROM entries").fetchone()[0]
+    cache.summary(second)
+    assert cache.get(second) is not None
+    assert cache._connection.execute("SELECT COUNT(*) FROM entries").fetchone()[0] == 1
+
+
+def test_unusable_cache_directory_falls_back_to_scan(tmp_path: Path) -> None:
+    blocker = tmp_path / "blocker"
+    blocker.write_text("not a directory")
+    cache = MetadataCache(blocker / "cache")
+    summary = cache.summary(FIXTURE)
+    assert summary.list_datasources() == ["Orders"]
+    assert cache.get(FIXTURE) is None
@@ -3,7 +3,14 @@ from __future__ import annotations
 import pytest
 
 from tableau_workbook_editor import open_workbook
-from tableau_workbook_editor.core.calc_utils import lint_calculation
+from tableau_workbook_editor.core.calc_utils import (
+    clear_parse_cache,
+    extract_references,
+    lint_calculation,
+    parse_cache_info,
+    parse_calculation,
+    rename_references,
+)
 from tableau_workbook_editor.core.xml_utils import xpath
 
 from pathlib import Path
@@ -28,3 +35,32 @@ def test_add_calculation_rejects_invalid_formula() -> None:
     wb = open_workbook(FIXTURE)
     with pytest.raises(ValueError):
         wb.add_calculation(datasource="Orders", name="Broken", formula="SUM([Profit]")
+
+
+def test_parser_handles_tableau_syntax() -> None:
+    formula = (
+        "// margin per region\n"
+        "IF {FIXED [Region] : SUM([Sales])} > 0 THEN SUM([Orders].[Profit]) / SUM([Sales]) "
+        "ELSEIF [Category] IN ('A', 'B') THEN 0 ELSE NULL END"
+    )
+    parsed = parse_calculation(formula)
+    assert parsed.ok
+    assert extract_references(formula) == ["[Region]", "[Sales]", "[Orders].[Profit]", "[Sales]", "[Category]"]
+    assert lint_calculation(formula).ok
+    assert lint_calculation("FOO([Sales])").warnings == ["Unknown function 'FOO'"]
+    assert lint_calculation("IF [Sales] > 0 THEN 1").message == "Expected END but found end of calculation"
+
+
+def test_rename_references_skips_strings_and_comments() -> None:
+    formula = "[Profit] + [Orders].[Profit] + [Other].[Profit] + 'label [Profit]' // [Profit]"
+    renamed = rename_references(formula, {"[Profit]": "[Net Profit]"}, qualifier="[Orders]")
+    assert renamed == "[Net Profit] + [Orders].[Net Profit] + [Other].[Profit] + 'label [Profit]' // [Profit]"
+
+
+def test_parse_cache_reuses_identical_formulas() -> None:
+    clear_parse_cache()
+    for _ in range(50):
+        lint_calculation("SUM([Sales]) * 2")
+    hits, misses, _, size = parse_cache_info()
+    assert (misses, size) == (1, 1)
+    assert hits == 49
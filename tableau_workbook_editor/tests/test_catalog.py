@@ -0,0 +1,61 @@
+from __future__ import annotations
+
+import json
+import os
+from pathlib import Path
+
+from click.testing import CliRunner
+
+from tableau_workbook_editor import open_workbook
+from tableau_workbook_editor.cli import main
+from tableau_workbook_editor.core.catalog import Catalog
+
+
+FIXTURE = Path(__file__).parent / "fixtures" / "sample_workbook.twb"
+
+
+def _workbooks(directory: Path) -> Path:
+    (directory / "team").mkdir(parents=True)
+    wb = open_workbook(FIXTURE)
+    wb.add_calculation(datasource="Orders", name="Net Revenue", formula="SUM([Sales]) - SUM([Profit])", data_type="float")
+    wb.save_as(directory / "team" / "revenue.twb")
+    wb = open_workbook(FIXTURE)
+    wb.add_calculation(datasource="Orders", name="Margin", formula="[Net Revenue] / SUM([Sales])", data_type="float")
+    wb.set_connection(datasource="Orders", server="warehouse.example.com")
+    wb.save_as(directory / "margin.twbx", package_assets=True)
+    return directory
+
+
+def test_catalog_search_and_incremental_build(tmp_path: Path) -> None:
+    root = _workbooks(tmp_path / "workbooks")
+    with Catalog(tmp_path / "catalog.db") as catalog:
+        stats = catalog.build(root, jobs=1)
+        assert (stats.indexed, stats.unchanged, stats.removed, stats.failed) == (2, 0, 0, [])
+        hits = catalog.search("[Net Revenue]")
+        assert {(Path(hit.path).name, hit.kind) for hit in hits} == {("revenue.twb", "calculation"), ("margin.twbx", "calculation")}
+        [hit] = catalog.search("warehouse.example.com", kind="connection")
+        assert Path(hit.path).name == "margin.twbx" and "dbname=sample" in hit.detail
+        assert [hit.name for hit in catalog.search("Executive", kind="dashboard")] == ["Executive", "Executive"]
+
+        revenue = root / "team" / "revenue.twb"
+        stat = revenue.stat()
+        os.utime(revenue, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000_000))
+        (root / "margin.twbx").unlink()
+        stats = catalog.build(root, jobs=1)
+        assert (stats.indexed, stats.unchanged, stats.removed) == (1, 0, 1)
+        assert len(catalog) == 1
+        assert catalog.search("warehouse.example.com") == []
+
+
+def test_catalog_commands(tmp_path: Path) -> None:
+    root = _workbooks(tmp_path / "workbooks")
+    database = str(tmp_path / "catalog.db")
+    runner = CliRunner()
+    result = runner.invoke(main, ["--json", "catalog", "build", str(root), "--db", database, "--jobs", "2"])
+    assert result.exit_code == 0, result.output
+    assert json.loads(result.output)["indexed"] == 2
+    result = runner.invoke(main, ["--json", "catalog", "search", "Net Revenue", "--kind", "calculation", "--db", database])
+    assert result.exit_code == 0
+    assert sorted(hit["name"] for hit in json.loads(result.output)) == ["Margin", "Net Revenue"]
+    result = runner.invoke(main, ["catalog", "search", "x", "--kind", "sheet", "--db", database])
+    assert result.exit_code == 2
@@ -0,0 +1,28 @@
+from __future__ import annotations
+
+import json
+import subprocess
+import sys
+from pathlib import Path
+
+from click.testing import CliRunner
+
+from tableau_workbook_editor.cli import main
+
+FIXTURE = Path(__file__).parent / "fixtures" / "sample_workbook.twb"
+
+
+def test_cli_import_defers_rich_and_lxml() -> None:
+    code = "import sys, tableau_workbook_editor.cli; print(sorted({m.split('.')[0] for m in sys.modules} & {'rich', 'lxml'}))"
+    completed = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, check=True)
+    assert completed.stdout.strip() == "[]"
+
+
+def test_json_and_plain_output_modes() -> None:
+    runner = CliRunner()
+    result = runner.invoke(main, ["--json", "list", "--sheets", "--no-cache", str(FIXTURE)])
+    assert result.exit_code == 0
+    assert json.loads(result.output) == [{"type": "worksheet", "name": "Summary"}, {"type": "worksheet", "name": "Detail"}]
+    result = runner.invoke(main, ["--plain", "inspect", "--no-cache", str(FIXTURE)])
+    assert result.exit_code == 0
+    assert result.output.splitlines()[:4] == ["Workbook: sample_workbook.twb", "Worksheets", "  Summary", "  Detail"]
@@ -1,9 +1,15 @@
 from __future__ import annotations
 
+import json
 from pathlib import Path
 
+import pytest
+from click.testing import CliRunner
+
 from tableau_workbook_editor import open_workbook
-from tableau_workbook_editor.core.xml_utils import xpath
+from tableau_workbook_editor.cli import main
+from tableau_workbook_editor.core.operations import OperationError
+from tableau_workbook_editor.core.xml_utils import etree, xpath
 
 
 FIXTURE = Path(__file__).parent / "fixtures" / "sample_workbook.twb"
@@ -32,3 +38,76 @@ def test_set_connection_updates_connection_node() -> None:
     assert connection.get("dbname") == "warehouse"
     assert connection.get("schema") == "analytics"
     assert connection.get("table") == "orders"
+
+
+def test_rename_fields_applies_chained_renames_simultaneously() -> None:
+    wb = open_workbook(FIXTURE)
+    wb.add_calculation(datasource="Orders", name="Margin", formula="[Profit] / [Sales]")
+    wb.rename_fields(datasource="Orders", mapping={"Profit": "Sales", "Sales": "Revenue", "Region": "Geography"})
+
+    captions = [column.get("caption") for column in xpath(wb.root, "./datasources/datasource/column")]
+    assert captions[:4] == ["Sales", "Revenue", "Geography", "Category"]
+    assert xpath(wb.root, ".//worksheet//column[@ref='[Sales]']")
+    assert not xpath(wb.root, ".//worksheet//column[@ref='[Profit]']")
+    formula = xpath(wb.root, "./datasources/datasource/column[@caption='Margin']/calculation")[0].get("formula")
+    assert formula == "[Sales] / [Revenue]"
+    action = xpath(wb.root, "./actions/action[@name='Action1']")[0]
+    assert action.get("mapping") == "Geography=Geography"
+
+
+def test_rename_fields_rejects_collisions() -> None:
+    wb = open_workbook(FIXTURE)
+    with pytest.raises(ValueError):
+        wb.rename_fields(datasource="Orders", mapping={"Profit": "Sales"})
+
+
+def _add_federated(wb) -> None:
+    datasources = wb.root.find("datasources")
+    federated = etree.SubElement(datasources, "datasource", name="federated.1", caption="Returns")
+    connection = etree.SubElement(federated, "connection", {"class": "federated"})
+    named = etree.SubElement(etree.SubElement(connection, "named-connections"), "named-connection", name="postgres.1")
+    etree.SubElement(named, "connection", {"class": "postgres", "server": "localhost", "port": "5432", "dbname": "returns"})
+    etree.SubElement(connection, "relation", connection="postgres.1", name="returns", table="[legacy].[returns]", type="table")
+
+
+def test_rewrite_connections_covers_federated_datasources() -> None:
+    wb = open_workbook(FIXTURE)
+    _add_federated(wb)
+    report = wb.rewrite_connections(
+        [
+            {"attribute": "server", "pattern": "^localhost$", "replacement": "db.example.com"},
+            {"attribute": "port", "pattern": "5432", "replacement": "6432", "class": "postgres"},
+            {"attribute": "table", "pattern": r"^\[legacy\]\.", "replacement": "[archive].", "datasource": "^Returns$"},
+        ]
+    )
+    summary = {name: [(c.element, c.attribute, c.after) for c in changes] for name, changes in report.by_datasource().items()}
+    assert summary == {
+        "Orders": [("connection", "server", "db.example.com")],
+        "federated.1": [
+            ("connection", "server", "db.example.com"),
+            ("connection", "port", "6432"),
+            ("relation", "table", "[archive].[returns]"),
+        ],
+    }
+    assert wb.dirty
+    with pytest.raises(OperationError, match="Rule 1: missing replacement"):
+        wb.apply([{"op": "rewrite-connections", "rules": [{"attribute": "server", "pattern": "x"}]}])
+
+
+def test_rewrite_connections_command(tmp_path: Path) -> None:
+    rules = tmp_path / "rules.json"
+    rules.write_text(json.dumps({"rules": [{"attribute": "dbname", "pattern": "^sample$", "replacement": "sample_v2"}]}))
+    target = tmp_path / "out.twb"
+    runner = CliRunner()
+    result = runner.invoke(main, ["--no-daemon", "--json", "rewrite-connections", str(FIXTURE), "--rules", str(rules), "--as", str(target)])
+    assert result.exit_code == 0, result.output
+    assert json.loads(result.stdout)["changed"] == 1
+    assert xpath(open_workbook(target).root, ".//connection[@dbname='sample_v2']")
+    result = runner.invoke(main, ["--no-daemon", "--plain", "rewrite-connections", str(FIXTURE), "--rules", str(rules), "--dry-run"])
+    assert result.exit_code == 0, result.output
+    assert result.output.splitlines()[0] == "Orders"
+    broken = tmp_path / "rules.yaml"
+    broken.write_text("rules: [\n")
+    result = runner.invoke(main, ["--no-daemon", "rewrite-connections", str(FIXTURE), "--rules", str(broken)])
+    assert result.exit_code == 1
+    assert "invalid YAML" in result.output
@@ -1,8 +1,14 @@
 from __future__ import annotations
 
+import json
 from pathlib import Path
 
+from click.testing import CliRunner
+
 from tableau_workbook_editor import open_workbook
+from tableau_workbook_editor.cli import main
+from tableau_workbook_editor.core.diffs import Change, diff_trees
+from tableau_workbook_editor.core.xml_utils import load_xml
 
 
 FIXTURE = Path(__file__).parent / "fixtures" / "sample_workbook.twb"
@@ -12,5 +18,67 @@ def test_diff_reports_modifications() -> None:
     wb = open_workbook(FIXTURE)
     assert wb.diff() == []
     wb.rename_field(datasource="Orders", old="Profit", new="Net Profit")
-    diff = wb.diff()
-    assert diff == ["Workbook modified"]
+    changes = wb.changes()
+    datasource = "/workbook/datasources/datasource[@name='Orders']"
+    assert Change("removed", f"{datasource}/column[@name='[Profit]']") in changes
+    assert Change("added", f"{datasource}/column[@name='[Net Profit]']") in changes
+    assert {change.kind for change in changes} == {"added", "removed"}
+    assert wb.diff() == [change.describe() for change in changes]
+
+
+def test_diff_trees_matches_by_identity() -> None:
+    before = load_xml(
+        b"<workbook><worksheets><worksheet name='A'/><worksheet name='B'/><worksheet name='C'/></worksheets>"
+        b"<zones><zone id='1' x='0'/><zone id='2'/><zone id='3'/></zones><style><rule/><rule a='1'/></style></workbook>"
+    )
+    after = load_xml(
+        b"<workbook><worksheets><worksheet name='C'/><worksheet name='A'/><worksheet name='B'/></worksheets>"
+        b"<zones><zone id='2'/><zone id='3'/><zone id='4'/><zone id='1' x='5'>t</zone></zones><style><rule/><rule a='2'/></style></workbook>"
+    )
+    assert diff_trees(before, after) == [
+        Change("moved", "/workbook/worksheets/worksheet[@name='C']", before="3", after="1"),
+        Change("added", "/workbook/zones/zone[@id='4']"),
+        Change("moved", "/workbook/zones/zone[@id='1']", before="1", after="4"),
+        Change("attribute-changed", "/workbook/zones/zone[@id='1']", "x", "0", "5"),
+        Change("text-changed", "/workbook/zones/zone[@id='1']", before="", after="t"),
+        Change("attribute-changed", "/workbook/style/rule[2]", "a", "1", "2"),
+    ]
+    assert diff_trees(before, before) == []
+
+
+def test_diff_command_json(tmp_path: Path) -> None:
+    wb = open_workbook(FIXTURE)
+    wb.move_zone(dashboard="Executive", zone_id="z1", x=10)
+    wb.save_as(tmp_path / "moved.twb")
+    result = CliRunner().invoke(main, ["diff", str(FIXTURE), str(tmp_path / "moved.twb"), "--format", "json"])
+    assert result.exit_code == 0
+    payload = json.loads(result.output)
+    assert payload["summary"]["attribute-changed"] == 1
+    assert payload["changes"] == [
+        {
+            "kind": "attribute-changed",
+            "path": "/workbook/dashboards/dashboard[@name='Executive']/zones/zone[@id='z1']",
+            "attribute": "x",
+            "before": "0",
+            "after": "10",
+        }
+    ]
+
+
+def test_journal_records_mutations() -> None:
+    wb = open_workbook(FIXTURE)
+    assert not wb.dirty
+    wb.move_zone(dashboard="Executive", zone_id="z1", x=10)
+    wb.set_parameter(name="Threshold", data_type="integer", value="5")
+    assert wb.dirty
+    assert [entry.operation for entry in wb.journal] == ["move_zone", "set_parameter"]
+    touched = wb.journal.touched_elements()
+    assert any(element.get("id") == "z1" for element in touched)
+    assert any(element.get("name") == "Threshold" for element in touched)
+
+
+def test_noop_rename_is_not_recorded() -> None:
+    wb = open_workbook(FIXTURE)
+    wb.rename_field(datasource="Orders", old="Profit", new="Profit")
+    assert not wb.dirty
+    assert wb.diff() == []
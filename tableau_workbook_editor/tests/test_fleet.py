@@ -0,0 +1,79 @@
+from __future__ import annotations
+
+import shutil
+from pathlib import Path
+
+import pytest
+from click.testing import CliRunner
+
+from tableau_workbook_editor import open_workbook
+from tableau_workbook_editor.cli import main
+from tableau_workbook_editor.core.fleet import expand_paths, run_batch
+from tableau_workbook_editor.core.operations import OperationError
+from tableau_workbook_editor.core.xml_utils import xpath
+
+
+FIXTURE = Path(__file__).parent / "fixtures" / "sample_workbook.twb"
+
+
+def _fleet(tmp_path: Path) -> None:
+    (tmp_path / "nested").mkdir()
+    shutil.copy(FIXTURE, tmp_path / "a.twb")
+    shutil.copy(FIXTURE, tmp_path / "nested" / "b.twb")
+    (tmp_path / "nested" / "broken.twb").write_text("<workbook")
+    (tmp_path / "notes.txt").write_text("not a workbook")
+
+
+def test_batch_continues_past_failures(tmp_path: Path) -> None:
+    _fleet(tmp_path)
+    paths = expand_paths([str(tmp_path / "**" / "*.twb*")])
+    assert len(paths) == 3
+    results = list(run_batch(paths, "set-connection", {"datasource": "Orders", "server": "new-host"}, jobs=2))
+    assert sorted(result.ok for result in results) == [False, True, True]
+    connection = xpath(open_workbook(tmp_path / "nested" / "b.twb").root, ".//connection")[0]
+    assert connection.get("server") == "new-host"
+
+
+def test_batch_inspection_returns_metadata(tmp_path: Path) -> None:
+    _fleet(tmp_path)
+    results = list(run_batch([tmp_path / "a.twb"], "inspect", jobs=1))
+    assert results[0].result["worksheets"] == ["Summary", "Detail"]
+
+
+def test_batch_list_and_export_json_use_the_scan(tmp_path: Path) -> None:
+    _fleet(tmp_path)
+    [listed] = run_batch([tmp_path / "a.twb"], "list", {"dashboards": "true"}, jobs=1)
+    assert listed.result == {"items": [{"type": "dashboard", "name": "Executive"}]}
+    [exported] = run_batch([tmp_path / "a.twb"], "export-json", jobs=1)
+    assert exported.result["columns"]["Orders"][0] == "Profit"
+    with pytest.raises(OperationError, match="inspect, list, export-json, validate"):
+        run_batch([tmp_path / "a.twb"], "summarise", jobs=1)
+
+
+def test_batch_rejects_bad_arguments_up_front(tmp_path: Path) -> None:
+    with pytest.raises(OperationError):
+        run_batch([tmp_path / "a.twb"], "move-zone", {"colour": "red"}, jobs=1)
+    report = tmp_path / "report.jsonl"
+    report.write_text("previous run\n")
+    shutil.copy(FIXTURE, tmp_path / "a.twb")
+    result = CliRunner().invoke(main, ["batch", "move-zone", "--glob", str(tmp_path / "*.twb"), "--arg", "colour=red", "--report", str(report)])
+    assert result.exit_code != 0
+    assert report.read_text() == "previous run\n"
+    for command in (["batch", "inspect", "--glob", str(tmp_path / "*.twb")], ["catalog", "build", str(tmp_path)]):
+        result = CliRunner().invoke(main, [*command, "--jobs", "0"])
+        assert result.exit_code == 2 and "--jobs" in result.output
+
+
+def test_batch_cli_keeps_numeric_arguments_as_strings(tmp_path: Path) -> None:
+    shutil.copy(FIXTURE, tmp_path / "a.twb")
+    pattern = str(tmp_path / "*.twb")
+    for args in (
+        ["set-parameter", "--arg", "name=Threshold", "--arg", "type=string", "--arg", "value=5"],
+        ["set-connection", "--arg", "datasource=Orders", "--arg", "db=2024"],
+        ["move-zone", "--arg", "dashboard=Executive", "--arg", "zone-id=z1", "--arg", "x=30"],
+    ):
+        result = CliRunner().invoke(main, ["batch", args[0], "--glob", pattern, "--jobs", "1", *args[1:]])
+        assert result.exit_code == 0, result.output
+    root = open_workbook(tmp_path / "a.twb").root
+    assert xpath(root, ".//connection")[0].get("dbname") == "2024"
+    assert xpath(root, ".//zone[@id='z1']")[0].get("x") == "30"
@@ -0,0 +1,36 @@
+from __future__ import annotations
+
+from pathlib import Path
+
+from tableau_workbook_editor import open_workbook
+from tableau_workbook_editor.core.xml_utils import IdRegistry, etree
+
+
+FIXTURE = Path(__file__).parent / "fixtures" / "sample_workbook.twb"
+
+
+def test_registry_allocates_above_high_water_mark() -> None:
+    root = etree.fromstring('<zones><zone id="z3"/><zone id="z7"><zone id="ws2"/></zone><zone id="{GUID-1}"/></zones>')
+    registry = IdRegistry([root])
+    assert registry.new("z") == "z8"
+    assert registry.new("z") == "z9"
+    assert registry.new("ws") == "ws3"
+    assert registry.new("q") == "q1"
+    assert registry.ensure("z3") == "z10"
+
+
+def test_registry_handles_deep_trees() -> None:
+    root = current = etree.Element("zones")
+    for depth in range(5000):
+        current = etree.SubElement(current, "zone")
+        current.set("id", f"z{depth}")
+    assert IdRegistry([root]).new("z") == "z5000"
+
+
+def test_registry_is_lazy_and_takes_later_ids() -> None:
+    wb = open_workbook(FIXTURE)
+    assert wb._id_registry is None
+    zone = etree.SubElement(wb.root.find("dashboards/dashboard/zones"), "zone")
+    zone.set("id", "z41")
+    wb.id_registry.register(zone)
+    assert wb.id_registry.new("z") == "z42"
@@ -0,0 +1,37 @@
+from __future__ import annotations
+
+from pathlib import Path
+
+from tableau_workbook_editor import open_workbook
+from tableau_workbook_editor.core import parameters
+from tableau_workbook_editor.core.xml_utils import etree
+
+
+FIXTURE = Path(__file__).parent / "fixtures" / "sample_workbook.twb"
+
+
+def test_index_resolves_names_and_captions() -> None:
+    wb = open_workbook(FIXTURE)
+    assert wb.index.worksheet("Detail").get("name") == "Detail"
+    assert wb.index.dashboard("Executive") is not None
+    assert wb.index.datasource("Orders") is not None
+    assert wb.index.worksheet("Missing") is None
+
+
+def test_index_tracks_created_parameters() -> None:
+    wb = open_workbook(FIXTURE)
+    assert wb.index.parameter("Threshold") is None
+    wb.set_parameter(name="Threshold", data_type="integer", value="5")
+    assert wb.index.parameter("Threshold").get("current-value") == "5"
+
+
+def test_index_notices_direct_tree_edits() -> None:
+    wb = open_workbook(FIXTURE)
+    assert wb.index.worksheet("Summary") is not None
+    sheet = etree.SubElement(wb.root.find("worksheets"), "worksheet")
+    sheet.set("name", "Added Directly")
+    assert wb.index.worksheet("Added Directly") is sheet
+    parameters.find_parameter(wb.root, "RegionParam").set("name", "Renamed")
+    assert wb.index.parameter("RegionParam") is None
+    wb.index.invalidate()
+    assert wb.index.parameter("Renamed") is not None
@@ -1,9 +1,15 @@
 from __future__ import annotations
 
+import json
 from pathlib import Path
 
+import pytest
+from click.testing import CliRunner
+
 from tableau_workbook_editor import open_workbook
-from tableau_workbook_editor.core.xml_utils import xpath
+from tableau_workbook_editor.cli import main
+from tableau_workbook_editor.core.layouts import ZoneTree, list_layout_zones
+from tableau_workbook_editor.core.xml_utils import load_xml, xpath
 
 
 FIXTURE = Path(__file__).parent / "fixtures" / "sample_workbook.twb"
@@ -24,3 +30,83 @@ def test_add_sheet_creates_new_zone() -> None:
     wb.add_sheet_to_dashboard(dashboard="Executive", sheet="Detail", floating=True, container="root", index=10)
     zones = xpath(wb.root, "./dashboards/dashboard[@name='Executive']/zones/zone[@worksheet='Detail']")
     assert zones
+
+
+NESTED = load_xml(
+    b"<workbook><dashboards><dashboard name='Ops'><size maxwidth='1000' maxheight='800'/><zones>"
+    b"<zone id='1' type='layout-basic' x='0' y='0' w='1000' h='800'>"
+    b"<zone id='2' type='layout-flow' x='0' y='0' w='500' h='800'>"
+    b"<zone id='3' type='worksheet' x='0' y='0' w='500' h='400'/>"
+    b"<zone id='4' type='worksheet' x='0' y='300' w='500' h='500'/>"
+    b"</zone>"
+    b"<zone id='5' type='worksheet' x='500' y='0' w='600' h='800'/>"
+    b"<zone id='6' type='text' floating='true' x='100' y='100' w='50' h='50'/>"
+    b"<zone id='7' type='text' x='a' y='0' w='1' h='1'/>"
+    b"</zone>"
+    b"</zones></dashboard></dashboards></workbook>"
+)
+
+
+def test_zone_tree_queries_nested_zones() -> None:
+    dashboard = NESTED.find("dashboards/dashboard")
+    assert [zone.get("id") for zone in list_layout_zones(dashboard)] == ["1", "2", "3", "4", "5", "6", "7"]
+    tree = ZoneTree(dashboard)
+    assert tree.parent("4").get("id") == "2" and tree.parent("1") is None
+    assert [zone.get("id") for zone in tree.children("1")] == ["2", "5", "6", "7"]
+    assert tree.depth("3") == 2
+    assert [zone.get("id") for zone in tree.hit_test(120, 350)] == ["1", "2", "3", "4"]
+    assert [zone.get("id") for zone in tree.hit_test(120, 120)] == ["1", "2", "3", "6"]
+    assert [(issue.kind, issue.zones) for issue in tree.check()] == [
+        ("invalid-geometry", ("7",)),
+        ("out-of-bounds", ("5",)),
+        ("overlap", ("3", "4")),
+    ]
+
+    tree.update({"4": {"y": 400, "h": 400}, "5": {"w": 500}})
+    assert tree.check() == [tree.check()[0]]
+    assert [zone.get("id") for zone in tree.intersecting((0, 390, 10, 410))] == ["1", "2", "3", "4"]
+    with pytest.raises(ValueError, match="Zone\\(s\\) 9 not found"):
+        tree.update({"3": {"x": 1}, "9": {"x": 1}})
+    assert tree.find("3").get("x") == "0"
+
+
+def test_layout_check_uses_tableau_zone_coordinates() -> None:
+    # Zones are laid out in a 0..100000 space, independent of the pixel size.
+    root = load_xml(
+        b"<workbook><dashboards><dashboard name='Fixed'><size maxwidth='1000' maxheight='800'/><zones>"
+        b"<zone id='3' type='layout-basic' x='0' y='0' w='100000' h='100000'>"
+        b"<zone id='4' type='layout-flow' param='vert' x='800' y='1000' w='48400' h='98000'>"
+        b"<zone id='5' name='Sales' x='800' y='1000' w='48400' h='49000'/>"
+        b"<zone id='6' name='Profit' x='800' y='50000' w='48400' h='49000'/>"
+        b"</zone>"
+        b"<zone id='7' name='Map' x='50000' y='1000' w='49200' h='98000'/>"
+        b"</zone>"
+        b"<zone id='8' type='text' floating='true' x='90000' y='95000' w='20000' h='8000'/>"
+        b"</zones></dashboard></dashboards></workbook>"
+    )
+    tree = ZoneTree(root.find("dashboards/dashboard"))
+    assert [(issue.zones, issue.message) for issue in tree.check()] == [
+        (("8",), "zone '8' extends past the edge of the dashboard"),
+    ]
+    tree.move("8", w=10000, h=5000)
+    assert tree.check() == []
+
+
+def test_move_zone_reaches_nested_zones(tmp_path: Path) -> None:
+    wb = open_workbook(FIXTURE)
+    dashboard = wb.index.dashboard("Executive")
+    container = xpath(dashboard, "./zones/zone[@id='root']")[0]
+    container.append(load_xml(b"<zone id='z9' type='text' x='0' y='0' w='10' h='10'/>"))
+    wb.move_zone(dashboard="Executive", zone_id="z9", x=5)
+    wb.move_zones(dashboard="Executive", zones={"z1": {"w": 300}, "z9": {"y": 7}})
+    assert (container[0].get("x"), container[0].get("y")) == ("5", "7")
+    assert wb.zone_tree("Executive").bounds("z1") == (0, 0, 300, 300)
+
+    output = tmp_path / "layout.twb"
+    wb.save(path=output)
+    runner = CliRunner()
+    result = runner.invoke(main, ["layout", "check", str(output), "--format", "json", "--at", "6", "8"])
+    assert result.exit_code == 1
+    [report] = json.loads(result.output)
+    assert report["hits"] == ["z9", "z1"]
+    assert [issue["zones"] for issue in report["issues"]] == [["z9", "z1"]]
@@ -0,0 +1,66 @@
+from __future__ import annotations
+
+import json
+from pathlib import Path
+
+import pytest
+from click.testing import CliRunner
+
+from tableau_workbook_editor import open_workbook
+from tableau_workbook_editor.cli import main
+from tableau_workbook_editor.core.lineage import LineageCycleError, LineageGraph
+from tableau_workbook_editor.core.xml_utils import load_xml
+
+
+FIXTURE = Path(__file__).parent / "fixtures" / "sample_workbook.twb"
+
+
+def test_lineage_tracks_calculations_incrementally() -> None:
+    wb = open_workbook(FIXTURE)
+    graph = wb.lineage
+    assert graph.downstream("[Orders].[Profit]") == ["worksheet:Detail", "worksheet:Summary"]
+    wb.add_calculation(datasource="Orders", name="Ratio", formula="SUM([Profit])/SUM([Sales])", data_type="float")
+    wb.add_calculation(datasource="Orders", name="Flagged", formula="[Ratio] > 0 AND [Parameters].[RegionParam] = 'East'")
+    wb.rename_field(datasource="Orders", old="Profit", new="Net Profit")
+    assert wb.lineage is graph
+    assert list(graph.walk("[Orders].[Net Profit]")) == [
+        ("[Orders].[Ratio]", 1),
+        ("worksheet:Detail", 1),
+        ("worksheet:Summary", 1),
+        ("[Orders].[Flagged]", 2),
+    ]
+    assert graph.upstream("[Orders].[Flagged]") == ["[Orders].[Ratio]", "[Parameters].[RegionParam]", "[Orders].[Net Profit]", "[Orders].[Sales]"]
+    assert graph.resolve("Net Profit") == ["[Orders].[Net Profit]"]
+    order = graph.topological_order()
+    assert order.index("[Orders].[Ratio]") < order.index("[Orders].[Flagged]")
+
+    fresh = LineageGraph.build(wb.root)
+    assert fresh.kinds == graph.kinds
+    assert {node: fresh.dependencies(node) for node in fresh.kinds} == {node: graph.dependencies(node) for node in graph.kinds}
+
+
+def test_lineage_reports_cycles_and_unknown_fields() -> None:
+    root = load_xml(
+        b"<workbook><datasources><datasource name='DS'>"
+        b"<column name='[A]'><calculation formula='[B] + 1'/></column>"
+        b"<column name='[B]'><calculation formula='[A] * [Missing]'/></column>"
+        b"<column name='[C]'><calculation formula='[C]'/></column>"
+        b"</datasource></datasources></workbook>"
+    )
+    graph = LineageGraph.build(root)
+    assert graph.cycles() == [["[DS].[A]", "[DS].[B]"], ["[DS].[C]"]]
+    assert graph.kinds["[DS].[Missing]"] == "unknown"
+    assert graph.downstream("[DS].[Missing]") == ["[DS].[B]", "[DS].[A]"]
+    with pytest.raises(LineageCycleError):
+        graph.topological_order()
+
+
+def test_lineage_command() -> None:
+    runner = CliRunner()
+    result = runner.invoke(main, ["lineage", str(FIXTURE), "--field", "[Profit]", "--format", "json"])
+    assert result.exit_code == 0
+    [trace] = json.loads(result.output)
+    assert trace["field"] == "[Orders].[Profit]"
+    assert [item["node"] for item in trace["downstream"]] == ["Detail", "Summary"]
+    result = runner.invoke(main, ["lineage", str(FIXTURE), "--field", "[Nope]"])
+    assert result.exit_code == 1
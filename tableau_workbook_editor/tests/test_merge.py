@@ -0,0 +1,80 @@
+from __future__ import annotations
+
+import json
+from pathlib import Path
+
+from click.testing import CliRunner
+
+from tableau_workbook_editor import open_workbook
+from tableau_workbook_editor.cli import main
+from tableau_workbook_editor.core.merge import merge_trees
+from tableau_workbook_editor.core.xml_utils import dump_xml, load_xml
+
+
+FIXTURE = Path(__file__).parent / "fixtures" / "sample_workbook.twb"
+
+
+def _edited(tmp_path: Path, name: str, *edits) -> Path:
+    wb = open_workbook(FIXTURE)
+    for method, arguments in edits:
+        getattr(wb, method)(**arguments)
+    wb.save_as(tmp_path / name)
+    return tmp_path / name
+
+
+def test_merge_applies_changes_from_both_sides(tmp_path: Path) -> None:
+    theirs = _edited(
+        tmp_path,
+        "theirs.twb",
+        ("move_zone", {"dashboard": "Executive", "zone_id": "z1", "x": 10}),
+        ("set_connection", {"datasource": "Orders", "server": "new-host"}),
+    )
+    ours = open_workbook(FIXTURE)
+    ours.add_calculation(datasource="Orders", name="Ratio", formula="SUM([Profit])/SUM([Sales])", data_type="float")
+    result = ours.merge(open_workbook(FIXTURE), open_workbook(theirs))
+    assert result.ok and result.applied == 2
+    assert "Ratio" in ours.list_columns("Orders")
+    assert ours.index.datasource("Orders").find("connection").get("server") == "new-host"
+    assert [entry.operation for entry in ours.journal][-1] == "merge"
+
+
+def test_merge_reports_conflicts_and_renumbers_zones(tmp_path: Path) -> None:
+    base = load_xml(
+        b"<workbook><worksheets><worksheet name='A'/><worksheet name='B'/></worksheets>"
+        b"<zones><zone id='1' x='0'/><zone id='2'/></zones></workbook>"
+    )
+    ours = load_xml(
+        b"<workbook><worksheets><worksheet name='B' tab='1'/></worksheets>"
+        b"<zones><zone id='1' x='5'/><zone id='2'/><zone id='3' w='1'/></zones></workbook>"
+    )
+    theirs = load_xml(
+        b"<workbook><worksheets><worksheet name='B'/><worksheet name='A' hidden='true'/><worksheet name='C'/></worksheets>"
+        b"<zones><zone id='1' x='7'/><zone id='2' h='4'/><zone id='3' w='2'/></zones></workbook>"
+    )
+    result = merge_trees(base, ours, theirs)
+    assert [(conflict.kind, conflict.path) for conflict in result.conflicts] == [
+        ("delete-modify", "/workbook/worksheets/worksheet[@name='A']"),
+        ("attribute", "/workbook/zones/zone[@id='1']"),
+    ]
+    assert result.renumbered == {"3": "4"}
+    merged = load_xml(dump_xml(ours))
+    assert [ws.get("name") for ws in merged.iter("worksheet")] == ["B", "C"]
+    assert [(zone.get("id"), zone.get("x"), zone.get("h"), zone.get("w")) for zone in merged.iter("zone")] == [
+        ("1", "5", None, None),
+        ("2", None, "4", None),
+        ("3", None, None, "1"),
+        ("4", None, None, "2"),
+    ]
+
+
+def test_merge_command_json(tmp_path: Path) -> None:
+    ours = _edited(tmp_path, "ours.twb", ("move_zone", {"dashboard": "Executive", "zone_id": "z1", "x": 10}))
+    theirs = _edited(tmp_path, "theirs.twb", ("move_zone", {"dashboard": "Executive", "zone_id": "z1", "x": 20, "y": 5}))
+    merged = tmp_path / "merged.twb"
+    result = CliRunner().invoke(main, ["merge", str(FIXTURE), str(ours), str(theirs), "-o", str(merged), "--format", "json"])
+    assert result.exit_code == 1
+    payload = json.loads(result.output)
+    assert payload["applied"] == 1
+    assert [(conflict["attribute"], conflict["ours"], conflict["theirs"]) for conflict in payload["conflicts"]] == [("x", "10", "20")]
+    zone = next(zone for zone in load_xml(merged.read_bytes()).iter("zone") if zone.get("id") == "z1")
+    assert (zone.get("x"), zone.get("y")) == ("10", "5")
@@ -0,0 +1,64 @@
+from __future__ import annotations
+
+import json
+from pathlib import Path
+
+import pytest
+
+from tableau_workbook_editor import open_workbook
+from tableau_workbook_editor.core.operations import OperationError, load_operations
+from tableau_workbook_editor.core.xml_utils import xpath
+
+
+FIXTURE = Path(__file__).parent / "fixtures" / "sample_workbook.twb"
+
+
+def test_apply_runs_operations_in_order() -> None:
+    wb = open_workbook(FIXTURE)
+    count = wb.apply(
+        [
+            {"op": "rename-field", "datasource": "Orders", "from": "Profit", "to": "Net Profit"},
+            {"op": "add-calc", "datasource": "Orders", "name": "Ratio", "formula": "[Net Profit] / [Sales]", "type": "float"},
+            {"op": "move_zone", "dashboard": "Executive", "zone-id": "z1", "x": 25},
+        ]
+    )
+    assert count == 3
+    assert xpath(wb.root, "./datasources/datasource/column[@caption='Ratio']")
+    assert xpath(wb.root, ".//zone[@id='z1']")[0].get("x") == "25"
+    assert [entry.operation for entry in wb.journal] == ["rename_field", "add_calculation", "move_zone"]
+
+
+def test_apply_validates_before_running() -> None:
+    wb = open_workbook(FIXTURE)
+    with pytest.raises(OperationError) as info:
+        wb.apply([{"op": "move-zone", "dashboard": "Executive", "zone-id": "z1", "x": 5}, {"op": "explode"}])
+    assert info.value.index == 1
+    assert not wb.dirty
+
+
+def test_load_operations_from_yaml_and_json(tmp_path: Path) -> None:
+    yaml_path = tmp_path / "ops.yaml"
+    yaml_path.write_text("operations:\n  - op: set-parameter\n    name: Threshold\n    type: integer\n    value: '5'\n")
+    json_path = tmp_path / "ops.json"
+    json_path.write_text(json.dumps([{"op": "set-connection", "datasource": "Orders", "server": "db"}]))
+    assert load_operations(yaml_path)[0].arguments == {"name": "Threshold", "data_type": "integer", "value": "5"}
+    assert load_operations(json_path)[0].method == "set_connection"
+
+
+def test_operation_values_are_checked_against_annotations(tmp_path: Path) -> None:
+    yaml_path = tmp_path / "ops.yaml"
+    yaml_path.write_text("- op: set-parameter\n  name: Threshold\n  type: integer\n  value: 5\n- op: move-zone\n  dashboard: Executive\n  zone-id: z1\n  x: '40'\n")
+    wb = open_workbook(FIXTURE)
+    assert wb.apply(load_operations(yaml_path)) == 2
+    assert xpath(wb.root, ".//zone[@id='z1']")[0].get("x") == "40"
+    assert [entry.details["value"] for entry in wb.journal if entry.operation == "set_parameter"] == ["5"]
+    with pytest.raises(OperationError, match="argument 'x'"):
+        wb.apply([{"op": "rename-field", "datasource": "Orders", "from": "Sales", "to": "Revenue"}, {"op": "move-zone", "dashboard": "Executive", "zone-id": "z1", "x": "left"}])
+    assert not xpath(wb.root, ".//column[@caption='Revenue']")
+
+
+def test_load_operations_rejects_malformed_files(tmp_path: Path) -> None:
+    yaml_path = tmp_path / "ops.yaml"
+    yaml_path.write_text("ops: [\n")
+    with pytest.raises(ValueError, match="invalid YAML"):
+        load_operations(yaml_path)
@@ -0,0 +1,33 @@
+from __future__ import annotations
+
+from pathlib import Path
+
+from tableau_workbook_editor import open_workbook
+from tableau_workbook_editor.core.references import rewrite_formula, rewrite_mapping
+from tableau_workbook_editor.core.xml_utils import xpath
+
+
+FIXTURE = Path(__file__).parent / "fixtures" / "sample_workbook.twb"
+
+
+def test_index_lists_reference_sites() -> None:
+    wb = open_workbook(FIXTURE)
+    sites = wb.references.sites("[Profit]")
+    assert {site.attribute for site in sites} == {"ref"}
+    assert len(sites) == 3
+    assert [site.element.get("mapping") for site in wb.references.mapping_sites("Region")] == ["Region=Region"]
+
+
+def test_rename_reindexes_sites_in_place() -> None:
+    wb = open_workbook(FIXTURE)
+    wb.add_calculation(datasource="Orders", name="Ratio", formula="SUM([Profit]) / SUM([Sales])")
+    wb.rename_field(datasource="Orders", old="Profit", new="Net Profit")
+    assert wb.references.sites("[Profit]") == []
+    assert len(wb.references.sites("[Net Profit]")) == 4
+    formula = xpath(wb.root, "./datasources/datasource/column[@caption='Ratio']/calculation")[0].get("formula")
+    assert formula == "SUM([Net Profit]) / SUM([Sales])"
+
+
+def test_rewrite_helpers_respect_boundaries() -> None:
+    assert rewrite_formula("[A] + [AB] + [B]", {"[A]": "[B]", "[B]": "[C]"}) == "[B] + [AB] + [C]"
+    assert rewrite_mapping("Region=Region; Regional=Regional", {"Region": "Geo"}) == "Geo=Geo; Regional=Regional"
@@ -0,0 +1,34 @@
+from __future__ import annotations
+
+from pathlib import Path
+
+from tableau_workbook_editor import WorkbookSummary, open_workbook
+
+
+FIXTURE = Path(__file__).parent / "fixtures" / "sample_workbook.twb"
+
+
+def test_scan_matches_full_inspection() -> None:
+    full = open_workbook(FIXTURE)
+    summary = open_workbook(FIXTURE, mode="scan")
+    assert isinstance(summary, WorkbookSummary)
+    assert summary.list_worksheets() == full.list_worksheets()
+    assert summary.list_dashboards() == full.list_dashboards()
+    assert summary.list_datasources() == full.list_datasources()
+    assert summary.list_parameters() == full.list_parameters()
+    assert summary.list_actions() == full.list_actions()
+    assert summary.list_columns("Orders") == full.list_columns("Orders")
+
+
+def test_summary_round_trips_through_dict() -> None:
+    summary = open_workbook(FIXTURE, mode="scan")
+    restored = WorkbookSummary.from_dict(FIXTURE, summary.to_dict())
+    assert restored == summary
+
+
+def test_scan_reads_packaged_workbooks(tmp_path: Path) -> None:
+    packaged = tmp_path / "sample.twbx"
+    open_workbook(FIXTURE).save(path=packaged, package_assets=True)
+    summary = open_workbook(packaged, mode="scan")
+    assert summary.list_worksheets() == ["Summary", "Detail"]
+    assert summary.list_datasources() == ["Orders"]
@@ -0,0 +1,98 @@
+from __future__ import annotations
+
+import socket
+import shutil
+import threading
+from pathlib import Path
+
+import pytest
+
+from tableau_workbook_editor import open_workbook
+from tableau_workbook_editor.core.server import ServerError, WorkbookPool, WorkbookServer, connect
+
+FIXTURE = Path(__file__).parent / "fixtures" / "sample_workbook.twb"
+
+pytestmark = pytest.mark.skipif(not hasattr(socket, "AF_UNIX"), reason="Unix domain sockets required")
+
+
+@pytest.fixture
+def server(tmp_path: Path):
+    server = WorkbookServer(tmp_path / "serve.sock")
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+    thread.join()
+
+
+def _copy(tmp_path: Path, name: str = "sample.twb") -> Path:
+    target = tmp_path / name
+    shutil.copyfile(FIXTURE, target)
+    return target
+
+
+def test_server_edits_and_saves_cached_workbook(tmp_path: Path, server: WorkbookServer) -> None:
+    workbook = _copy(tmp_path)
+    with connect(server.socket_path) as client:
+        assert client.call("call", path=str(workbook), method="list_worksheets") == ["Summary", "Detail"]
+        result = client.call(
+            "run", path=str(workbook), operations=[{"op": "rename-field", "datasource": "Orders", "from": "Profit", "to": "Margin"}]
+        )
+        assert result["count"] == 1 and result["path"] == str(workbook.resolve())
+        assert client.call("call", path=str(workbook), method="list_columns", arguments={"datasource": "Orders"})[0] == "Margin"
+        stats = client.call("stats")
+    assert [entry["hits"] for entry in stats["entries"]] == [4]
+    assert open_workbook(workbook).list_columns("Orders")[0] == "Margin"
+
+
+def test_server_reloads_workbook_changed_on_disk(tmp_path: Path, server: WorkbookServer) -> None:
+    workbook = _copy(tmp_path)
+    with connect(server.socket_path) as client:
+        client.call("call", path=str(workbook), method="list_worksheets")
+        workbook.write_text(FIXTURE.read_text(encoding="utf-8").replace('name="Summary"', 'name="Overview"'), encoding="utf-8")
+        assert "Overview" in client.call("call", path=str(workbook), method="list_worksheets")
+
+
+def test_server_reports_errors_and_discards_failed_edits(tmp_path: Path, server: WorkbookServer) -> None:
+    workbook = _copy(tmp_path)
+    with connect(server.socket_path) as client:
+        with pytest.raises(ServerError, match="not available"):
+            client.call("call", path=str(workbook), method="save")
+        with pytest.raises(ServerError) as error:
+            client.call("call", path=str(workbook), method="rename_field", arguments={"datasource": "Missing", "old": "a", "new": "b"})
+        assert error.value.kind == "ValueError"
+        assert client.call("stats")["entries"] == []
+        with pytest.raises(ServerError) as error:
+            client.call("nope")
+        assert error.value.code == -32601
+
+
+def test_server_separates_invalid_params_from_application_errors(tmp_path: Path, server: WorkbookServer) -> None:
+    workbook = _copy(tmp_path)
+    with connect(server.socket_path) as client:
+        with pytest.raises(ServerError) as error:
+            client.call("stats", verbose=True)
+        assert error.value.code == -32602
+        with pytest.raises(ServerError) as error:
+            client.call("call", path=str(workbook), method="move_zone", arguments={"dashboard": "Executive", "zone": "z1"})
+        assert error.value.code == -32602
+        # Numbers are converted for string arguments rather than failing in lxml.
+        client.call("call", path=str(workbook), method="set_parameter", arguments={"name": "Threshold", "data_type": "integer", "value": 5})
+        with pytest.raises(ServerError) as error:
+            client.call("call", path=str(workbook), method="rewrite_connections", arguments={"rules": 5})
+        assert (error.value.code, error.value.kind) == (-32000, "TypeError")
+
+
+def test_pool_evicts_least_recently_used_within_budget(tmp_path: Path) -> None:
+    first, second, third = (_copy(tmp_path, f"{name}.twb") for name in "abc")
+    pool = WorkbookPool(max_bytes=1)
+    pool.workbook(first)
+    pool.entry(second).pending = True
+    pool.workbook(third)
+    assert first not in pool and second in pool and third in pool
+    assert pool.workbook(third) is pool.workbook(third)
+
+
+def test_connect_returns_none_without_server(tmp_path: Path) -> None:
+    assert connect(tmp_path / "missing.sock") is None
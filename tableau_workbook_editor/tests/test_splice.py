@@ -0,0 +1,78 @@
+from __future__ import annotations
+
+from pathlib import Path
+
+from tableau_workbook_editor import open_workbook
+from tableau_workbook_editor.benchmarks import synthetic
+from tableau_workbook_editor.core import splice
+from tableau_workbook_editor.core.xml_utils import etree, load_xml
+
+
+FIXTURE = Path(__file__).parent / "fixtures" / "sample_workbook.twb"
+
+
+def _normalized(data: bytes) -> bytes:
+    root = load_xml(data)
+    for element in root.iter():
+        if element.text is not None and not element.text.strip():
+            element.text = None
+        if element.tail is not None and not element.tail.strip():
+            element.tail = None
+    return etree.tostring(root)
+
+
+def _edit(wb) -> None:
+    wb.rename_field(datasource="Orders", old="Profit", new="Net Profit")
+    wb.add_calculation(datasource="Orders", name="Profit Ratio", formula="SUM([Profit])/SUM([Sales])", data_type="float")
+    wb.set_parameter(name="RegionParam", data_type="string", value="West", allowable_values=["East", "West"])
+    wb.add_sheet_to_dashboard(dashboard="Executive", sheet="Detail", floating=False, container="root", index=1)
+
+
+def test_unmodified_splice_save_is_byte_identical(tmp_path: Path) -> None:
+    output = open_workbook(FIXTURE).save(path=tmp_path / "copy.twb", splice=True)
+    assert output.read_bytes() == FIXTURE.read_bytes()
+
+
+def test_splice_matches_full_serialisation(tmp_path: Path) -> None:
+    wb = open_workbook(FIXTURE)
+    _edit(wb)
+    spliced = wb.save(path=tmp_path / "spliced.twb", splice=True).read_bytes()
+    full = wb.save(path=tmp_path / "full.twb").read_bytes()
+    assert spliced != FIXTURE.read_bytes()
+    assert _normalized(spliced) == _normalized(full)
+
+
+def test_splice_keeps_untouched_bytes(tmp_path: Path) -> None:
+    source = synthetic.write_workbook(tmp_path / "wb.twb", synthetic.SCALES["small"])
+    wb = open_workbook(source)
+    wb.set_parameter(name="Param 1", data_type="string", value="B")
+    original = source.read_bytes()
+    spliced = wb.save(path=tmp_path / "out.twb", splice=True).read_bytes()
+    changed = [line for line in spliced.splitlines() if line not in original.splitlines()]
+    assert changed == [b'    <parameter name="Param 1" datatype="string" current-value="B">']
+    assert _normalized(spliced) == _normalized(wb.save(path=tmp_path / "full.twb").read_bytes())
+
+
+def test_splice_falls_back_to_tokenizer_and_full_dump(tmp_path: Path) -> None:
+    flat = tmp_path / "flat.twb"
+    root = load_xml(FIXTURE.read_bytes())
+    for element in root.iter():
+        element.tail = None
+    flat.write_bytes(etree.tostring(root, xml_declaration=True, encoding="utf-8"))
+    wb = open_workbook(flat)
+    _edit(wb)
+    spliced = splice.splice_xml(wb.root, wb._snapshot, flat.read_bytes(), wb.journal.touched_elements())
+    assert spliced is not None
+    assert _normalized(spliced) == _normalized(wb.save(path=tmp_path / "full.twb").read_bytes())
+    assert splice.splice_xml(wb.root, wb._snapshot, b"<workbook/>", wb.journal.touched_elements()) is None
+
+
+def test_splice_save_of_packaged_workbook(tmp_path: Path) -> None:
+    packaged = synthetic.write_workbook(tmp_path / "wb.twbx", synthetic.SCALES["tiny"])
+    wb = open_workbook(packaged)
+    original = wb.source.packaged.workbook_xml
+    wb.rename_field(datasource=synthetic.datasource_name(0), old=synthetic.field_name(1), new="Renamed")
+    wb.save(splice=True)
+    reopened = open_workbook(packaged)
+    assert reopened.source.packaged.workbook_xml.count(b"[Renamed]") == original.count(b"[Field 1]")
+    assert reopened.source.packaged.other_files.keys() == wb.source.packaged.other_files.keys()
@@ -0,0 +1,36 @@
+from __future__ import annotations
+
+from pathlib import Path
+
+from tableau_workbook_editor import open_workbook
+from tableau_workbook_editor.benchmarks import suite, synthetic
+
+
+def test_synthetic_workbooks_open(tmp_path: Path) -> None:
+    spec = synthetic.SCALES["tiny"].scaled(extract_bytes=4096)
+    twb = synthetic.write_workbook(tmp_path / "tiny.twb", spec)
+    twbx = synthetic.write_workbook(tmp_path / "tiny.twbx", spec)
+    for path in (twb, twbx):
+        wb = open_workbook(path)
+        assert len(wb.list_worksheets()) == spec.worksheets
+        assert len(wb.list_dashboards()) == spec.dashboards
+        assert wb.list_datasources() == [synthetic.datasource_name(0)]
+        assert wb.validate().ok
+
+
+def test_suite_runs_and_compares() -> None:
+    results = suite.run_suite(synthetic.SCALES["tiny"], repeat=1, measure_memory=False)
+    assert set(results) == {case.name for case in suite.CASES} | set(suite.IMPORT_CASES)
+    baseline = {name: {"seconds": 1.0} for name in results}
+    assert suite.compare(results, baseline) == []
+    results["save"].seconds = 0.1
+    assert suite.compare(results, {"save": {"seconds": 0.01}}) == ["save: 0.1000s vs baseline 0.0100s"]
+    assert suite.compare(results, {"save": {"seconds": 0.01}}, tolerance=20) == []
+
+
+def test_memory_baselines_of_zero_are_compared() -> None:
+    results = {"diff": suite.BenchmarkResult("diff", 0.01, peak_bytes=16 * 1024 * 1024)}
+    assert suite.compare(results, {"diff": {"peak_bytes": 0}}) == [f"diff: peak {16 * 1024 * 1024} bytes vs baseline 0 bytes"]
+    results["diff"].peak_bytes = 300 * 1024
+    assert suite.compare(results, {"diff": {"peak_bytes": 0}}) == []
+
@@ -0,0 +1,153 @@
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+import tracemalloc
+from io import BytesIO
+from pathlib import Path
+from zipfile import ZIP_DEFLATED, ZIP_STORED, ZipFile
+
+from click.testing import CliRunner
+
+from tableau_workbook_editor import open_workbook
+from tableau_workbook_editor.cli import main
+from tableau_workbook_editor.core import hyper_utils, twbx_utils
+
+
+FIXTURE = Path(__file__).parent / "fixtures" / "sample_workbook.twb"
+EXTRACT = "Data/Extracts/orders.hyper"
+
+
+def _make_package(path: Path) -> bytes:
+    extract = os.urandom(4096) + b"\0" * 65536
+    with ZipFile(path, "w") as zf:
+        zf.writestr("sample_workbook.twb", FIXTURE.read_bytes(), compress_type=ZIP_DEFLATED)
+        zf.writestr(EXTRACT, extract, compress_type=ZIP_DEFLATED)
+        zf.writestr("Image/logo.png", b"\x89PNG fake", compress_type=ZIP_STORED)
+    return extract
+
+
+def test_extract_keeps_members_lazy(tmp_path: Path) -> None:
+    packaged = tmp_path / "sample.twbx"
+    extract = _make_package(packaged)
+    package = twbx_utils.extract_twbx(packaged)
+    member = package.other_files[EXTRACT]
+    assert isinstance(member, twbx_utils.PackagedMember)
+    assert not member.is_modified
+    assert member.size == len(extract)
+    assert member.read() == extract
+
+
+def test_pack_copies_untouched_members_raw(tmp_path: Path) -> None:
+    packaged = tmp_path / "sample.twbx"
+    extract = _make_package(packaged)
+    wb = open_workbook(packaged)
+    wb.rename_field(datasource="Orders", old="Profit", new="Net Profit")
+    output = tmp_path / "renamed.twbx"
+    wb.save(path=output)
+
+    with ZipFile(packaged) as before, ZipFile(output) as after:
+        for name in (EXTRACT, "Image/logo.png"):
+            old_info, new_info = before.getinfo(name), after.getinfo(name)
+            assert new_info.compress_type == old_info.compress_type
+            assert new_info.compress_size == old_info.compress_size
+            assert new_info.CRC == old_info.CRC
+        assert after.read(EXTRACT) == extract
+        assert after.testzip() is None
+
+
+def test_replaced_member_spills_and_survives_in_place_save(tmp_path: Path) -> None:
+    packaged = tmp_path / "sample.twbx"
+    _make_package(packaged)
+    wb = open_workbook(packaged)
+    member = wb.source.packaged.other_files[EXTRACT]
+    member.memory_limit = 1024
+    replacement = b"new extract" * 1000
+    member.replace(BytesIO(replacement))
+    assert member.spilled
+    wb.save()
+
+    assert not member.is_modified
+    assert member.read() == replacement
+    wb.save()
+    with ZipFile(packaged) as zf:
+        assert zf.read(EXTRACT) == replacement
+        assert zf.testzip() is None
+
+
+def test_compression_policy_per_extension(tmp_path: Path) -> None:
+    packaged = tmp_path / "sample.twbx"
+    extract = _make_package(packaged)
+    wb = open_workbook(packaged)
+    wb.source.packaged.other_files["Data/notes.csv"] = b"region,sales\n" * 1000
+    wb.save(compression=twbx_utils.CompressionPolicy(level=9, recompress=True))
+
+    with ZipFile(packaged) as zf:
+        assert zf.getinfo("sample_workbook.twb").compress_type == ZIP_DEFLATED
+        assert zf.getinfo("Data/notes.csv").compress_type == ZIP_DEFLATED
+        # Deflated in the source archive, but extracts are stored by default.
+        assert zf.getinfo(EXTRACT).compress_type == ZIP_STORED
+        assert zf.getinfo("Image/logo.png").compress_type == ZIP_STORED
+        assert zf.read(EXTRACT) == extract
+        assert zf.testzip() is None
+
+
+def test_parallel_block_compression_round_trips(tmp_path: Path) -> None:
+    data = b"".join(os.urandom(64) + b"abc" * 200 for _ in range(2000))
+    package = twbx_utils.PackagedWorkbook(workbook_xml=FIXTURE.read_bytes(), inner_path="wb.twb", other_files={"Data/big.csv": data})
+    policy = twbx_utils.CompressionPolicy(workers=3, parallel_threshold=64 * 1024, block_size=16 * 1024)
+    target = tmp_path / "parallel.twbx"
+    twbx_utils.pack_twbx(target, package, policy=policy)
+    with ZipFile(target) as zf:
+        info = zf.getinfo("Data/big.csv")
+        assert info.compress_type == ZIP_DEFLATED
+        assert info.compress_size < len(data) // 2
+        assert zf.read("Data/big.csv") == data
+        assert zf.read("wb.twb") == FIXTURE.read_bytes()
+        assert zf.testzip() is None
+
+
+def test_extracts_stream_in_bounded_memory(tmp_path: Path) -> None:
+    packaged = tmp_path / "sample.twbx"
+    extract = _make_package(packaged)
+    [info] = hyper_utils.list_extracts(packaged, checksum=True)
+    assert (info.member, info.size, info.sha256) == (EXTRACT, len(extract), hashlib.sha256(extract).hexdigest())
+
+    replacement = tmp_path / "new.hyper"
+    with replacement.open("wb") as out:
+        for _ in range(24):
+            out.write(os.urandom(twbx_utils.CHUNK_SIZE))
+    (tmp_path / "out").mkdir()
+    tracemalloc.start()
+    try:
+        replaced = hyper_utils.replace_extract(packaged, "orders.hyper", replacement)
+        exported = hyper_utils.export_extract(packaged, EXTRACT, tmp_path / "out")
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    assert peak < 8 * twbx_utils.CHUNK_SIZE
+    expected = hyper_utils.describe_hyper(replacement, checksum=True)
+    assert (replaced.size, replaced.sha256) == (exported.size, exported.sha256) == (expected.size, expected.sha256)
+    assert exported.path == tmp_path / "out" / "orders.hyper"
+    with ZipFile(packaged) as zf:
+        assert zf.getinfo(EXTRACT).compress_type == ZIP_STORED
+        assert zf.getinfo("sample_workbook.twb").compress_type == ZIP_DEFLATED
+        assert zf.read("Image/logo.png") == b"\x89PNG fake"
+        assert zf.testzip() is None
+
+
+def test_extracts_commands(tmp_path: Path) -> None:
+    packaged = tmp_path / "sample.twbx"
+    _make_package(packaged)
+    replacement = tmp_path / "new.hyper"
+    replacement.write_bytes(b"hyper" * 100)
+    runner = CliRunner()
+    result = runner.invoke(main, ["--json", "extracts", "replace", str(packaged), "orders.hyper", str(replacement), "--as", str(tmp_path / "copy.twbx")])
+    assert result.exit_code == 0, result.output
+    assert json.loads(result.output)["sha256"] == hashlib.sha256(b"hyper" * 100).hexdigest()
+    result = runner.invoke(main, ["--json", "extracts", "list", str(tmp_path / "copy.twbx")])
+    assert [(item["member"], item["size"]) for item in json.loads(result.output)] == [(EXTRACT, 500)]
+    result = runner.invoke(main, ["extracts", "export", str(packaged), "missing.hyper", "-o", str(tmp_path / "out")])
+    assert result.exit_code == 1
+    assert "not found" in result.output
@@ -0,0 +1,77 @@
+from __future__ import annotations
+
+import json
+from pathlib import Path
+
+from click.testing import CliRunner
+
+from tableau_workbook_editor import open_workbook
+from tableau_workbook_editor.cli import main
+from tableau_workbook_editor.core.validators import Rule, validate_workbook
+
+FIXTURE = Path(__file__).parent / "fixtures" / "sample_workbook.twb"
+
+
+def _broken(tmp_path: Path) -> Path:
+    text = FIXTURE.read_text(encoding="utf-8")
+    for old, new in [
+        ('worksheet="Summary"', 'worksheet="Gone"'),
+        ('id="z1"', 'id="ws1"'),
+        ('target="Detail"', 'target="Nowhere"'),
+        ('<column ref="[Region]" />', '<column ref="[Regoin]" /><calculation formula="[Parameters].[Missing] + [Orders].[Nope]" />'),
+        ('<column ref="[Profit]" />\n          </columns>', '<column ref="[Orders].[sum:Sales:qk]" />\n          </columns>'),
+    ]:
+        assert old in text
+        text = text.replace(old, new)
+    path = tmp_path / "broken.twb"
+    path.write_text(text, encoding="utf-8")
+    return path
+
+
+def test_sample_workbook_is_valid() -> None:
+    report = open_workbook(FIXTURE).validate()
+    assert report.ok and report.issues == []
+
+
+def test_rules_report_each_problem(tmp_path: Path) -> None:
+    report = open_workbook(_broken(tmp_path)).validate()
+    found = {(issue.rule, issue.message) for issue in report.issues}
+    assert found == {
+        ("missing-dashboard-worksheet", "Dashboard 'Executive' references missing worksheet 'Gone'"),
+        ("duplicate-zone-id", "Zone id 'ws1' is already used in worksheet 'Summary'"),
+        ("action-target", "Action 'Action1' target 'Nowhere' is not a worksheet or dashboard"),
+        ("dangling-field-reference", "Worksheet 'Summary' references unknown field [Regoin]"),
+        ("unknown-calculation-field", "Calculation in 'Summary' references unknown field [Nope] of datasource 'Orders'"),
+        ("undefined-parameter", "Calculation references undefined parameter 'Missing'"),
+    }
+    zone = next(issue for issue in report.issues if issue.rule == "missing-dashboard-worksheet")
+    assert zone.path == "/workbook/dashboards/dashboard[@name='Executive']/zones/zone[@id='ws1']"
+    assert not report.ok
+
+
+def test_custom_rules_share_one_traversal() -> None:
+    class CountColumns(Rule):
+        name = "count-columns"
+        severity = "warning"
+        tags = ("column",)
+
+        def __init__(self) -> None:
+            self.count = 0
+
+        def visit(self, element, context) -> None:
+            self.count += 1
+
+        def finish(self, context) -> None:
+            context.report(self, f"{self.count} columns in {sorted(context.worksheets)}", [])
+
+    report = validate_workbook(open_workbook(FIXTURE).root, rules=[CountColumns])
+    assert [issue.message for issue in report.issues] == ["8 columns in ['Detail', 'Summary']"]
+    assert report.ok and report.warnings
+
+
+def test_validate_command_json(tmp_path: Path) -> None:
+    result = CliRunner().invoke(main, ["validate", "--format", "json", str(_broken(tmp_path))])
+    assert result.exit_code == 1
+    data = json.loads(result.output)
+    assert data["ok"] is False
+    assert {"message", "rule", "severity", "path"} <= set(data["issues"][0])